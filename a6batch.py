@@ -0,0 +1,172 @@
+"""
+Batches of same-size images for our imager application.
+
+Editing a burst of frames one Editor at a time means one history, one copy of every
+buffer and one Python loop per frame.  An ImageBatch instead stacks the frames, one
+after the other, in a single pixel buffer.  The batch is an Image that is as wide as
+each frame and count times as tall, so an Editor made from it edits every frame at
+once, with one history for the whole batch.
+
+The Editor knows how many frames the batch has (see Editor.getFrameCount), and runs
+each operation the cheapest way that gives the same result as editing every frame on
+its own:
+
+    * The point operations (invert, monochromify, the lookup tables) and reflectHori
+      treat each pixel or row on its own, so they are one pass over the whole buffer.
+    * The geometric operations and the neighbourhood filters (vignette, pixellate,
+      blur, highPass) run their kernel on each frame in turn (see a6tiles.runKernel).
+      The vignette mask is computed once and shared by all of the frames.
+    * encode, decode, encodeBytes and decodeBytes take or give one message per frame.
+"""
+import pickle
+
+import a6buffer
+import a6image
+
+
+class ImageBatch(a6image.Image):
+    """
+    A class for a batch of images of the same size, stacked into one pixel buffer.
+
+    Frame k is the rows k*getFrameHeight() up to (k+1)*getFrameHeight() of the batch.
+    Everything that works on an Image works on a batch, as if it were one tall image.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _count: The number of frames     [int > 0]
+    The height of the batch is always a multiple of _count.
+    """
+
+    # GETTERS
+    def getCount(self):
+        """
+        Returns: The number of frames in this batch
+        """
+        return self._count
+
+
+    def getFrameHeight(self):
+        """
+        Returns: The height of each frame
+        """
+        return self._height//self._count
+
+
+    def getFrame(self, k):
+        """
+        Returns: A copy of frame k, as a new Image
+
+        Parameter k: The frame number
+        Precondition: k is an int >= 0 and < count
+        """
+        assert type(k) == int and 0 <= k < self._count
+        rows = self.getFrameHeight()
+        data = bytearray(self.getRegion(k*rows,0,rows,self._width))
+        return a6image.Image(a6buffer.PixelBuffer(data),self._width)
+
+
+    def setFrame(self, k, image):
+        """
+        Copies the pixels of image into frame k.
+
+        Parameter k: The frame number
+        Precondition: k is an int >= 0 and < count
+
+        Parameter image: The new frame
+        Precondition: image is an Image object the same size as each frame
+        """
+        assert type(k) == int and 0 <= k < self._count
+        assert isinstance(image,a6image.Image)
+        rows = self.getFrameHeight()
+        assert image.getWidth() == self._width and image.getHeight() == rows
+        self.setRegion(k*rows,0,rows,self._width,image.getData())
+
+
+    def getFrames(self):
+        """
+        Returns: A copy of every frame, as a list of Image objects
+        """
+        return [self.getFrame(k) for k in range(self._count)]
+
+    # INITIALIZER AND OPERATORS
+    def __init__(self, data, width, count):
+        """
+        Initializer: Creates a batch of count frames from the given pixel buffer.
+
+        The buffer is used directly (it is not copied).
+
+        Parameter data: The pixels of every frame, one frame after the other
+        Precondition: data is a PixelBuffer object
+
+        Parameter width: The width of each frame
+        Precondition: width is an int > 0, and width*count evenly divides the length
+        of data
+
+        Parameter count: The number of frames
+        Precondition: count is an int > 0
+        """
+        assert isinstance(data,a6buffer.PixelBuffer)
+        assert type(count) == int and count > 0
+        assert isinstance(width,int) and width > 0 and len(data)%(width*count) == 0
+        a6image.Image.__init__(self,data,width)
+        self._count = count
+
+
+    def __reduce_ex__(self, protocol):
+        """
+        Returns: The information needed to pickle this batch
+
+        The batch is pickled like an Image (see Image.__reduce_ex__), plus its count.
+
+        Parameter protocol: The pickle protocol
+        Precondition: protocol is an int >= 0
+        """
+        data = self.getData()
+        if protocol >= 5:
+            data = pickle.PickleBuffer(data)
+        return (_restore, (data, self._width, self._count))
+
+    # ADDITIONAL METHODS
+    def copy(self):
+        """
+        Returns: A copy of this batch (a single copy of the whole buffer)
+        """
+        return ImageBatch(self._pixels.copy(),self._width,self._count)
+
+
+# BATCH FUNCTIONS
+def stack(images):
+    """
+    Returns: A new batch holding a copy of each image, in order
+
+    The pixels are copied once, straight into the buffer of the batch.
+
+    Parameter images: The frames
+    Precondition: images is a non-empty sequence of Image objects, all the same size
+    """
+    assert len(images) > 0
+    width  = images[0].getWidth()
+    height = images[0].getHeight()
+    for image in images:
+        assert isinstance(image,a6image.Image)
+        assert image.getWidth() == width and image.getHeight() == height
+    data = bytearray(b''.join(image.getData() for image in images))
+    return ImageBatch(a6buffer.PixelBuffer(data),width,len(images))
+
+
+# HELPER FUNCTIONS
+def _restore(data, width, count):
+    """
+    Returns: The batch unpickled from its pixel bytes, width and count
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytes-like object whose length is a multiple of 3*width*count
+
+    Parameter width: The frame width
+    Precondition: width is an int > 0
+
+    Parameter count: The number of frames
+    Precondition: count is an int > 0
+    """
+    if not isinstance(data,bytearray):
+        data = bytearray(data)
+    return ImageBatch(a6buffer.PixelBuffer(data),width,count)
@@ -0,0 +1,497 @@
+"""
+Benchmarks for the Editor, Image and ImageHistory operations of our imager application.
+
+This module times each operation on synthetic images of several sizes, from a
+thumbnail up to 50 megapixels.  For each operation and size it records the best wall
+time of a few runs, the throughput in pixels per second and the peak memory allocated
+while the operation runs.  For example
+
+    python a6bench.py --sizes thumb,vga,hd --output results.json
+
+writes the results to results.json.  With --compare, the results are checked against
+a stored baseline, and any operation that got slower by more than the tolerance is
+reported as a regression (and the exit status is 1):
+
+    python a6bench.py --sizes thumb,vga,hd --compare baseline.json
+
+With --check, every fast backend (the kernels, deferred mode, the tile scheduler and
+memory-mapped images) is run on small images and compared byte for byte with the
+original pixel-at-a-time versions in the module a6reference.
+
+Peak memory is measured with tracemalloc in a separate (untimed) run, so the tracing
+does not slow down the timed runs.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import a6buffer
+import a6editor
+import a6history
+import a6image
+import a6mapped
+import a6reference
+import a6tiles
+
+
+# The image sizes (width, height) that can be benchmarked, by name
+SIZES = {'thumb':(160,120), 'vga':(640,480), 'hd':(1920,1080), '12mp':(4000,3000),
+         '50mp':(8660,5774)}
+
+# The sizes benchmarked when none are given
+DEFAULT_SIZES = ('thumb', 'vga', 'hd')
+
+# The version of the JSON results format
+FORMAT_VERSION = 1
+
+# The slowdown (as a fraction) that compare reports as a regression
+TOLERANCE = 0.10
+
+# Times below this (in seconds) are too noisy to report as regressions
+MIN_SECONDS = 0.001
+
+# The image sizes used by the differential check
+CHECK_SIZES = ((64,48), (127,33), (33,70))
+
+
+# SYNTHETIC IMAGES
+def makeImage(width, height, seed=0):
+    """
+    Returns: A new image of the given size with pseudo-random pixels
+
+    The same size and seed always give the same pixels.
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter seed: The random seed
+    Precondition: seed is an int
+    """
+    data = bytearray(random.Random(seed).randbytes(3*width*height))
+    return a6image.Image(a6buffer.PixelBuffer(data),width)
+
+
+# BENCHMARKED OPERATIONS
+def _editor_operation(name, *args):
+    """
+    Returns: The (setup, run) pair that benchmarks the Editor method name
+
+    Parameter name: The Editor method
+    Precondition: name is a public method of Editor
+
+    Parameter args: The method arguments
+    Precondition: args are valid arguments for that method
+    """
+    def run(editor):
+        getattr(editor,name)(*args)
+    return (a6editor.Editor,run)
+
+
+def _message(image):
+    """
+    Returns: The message hidden by the encode and decode benchmarks
+
+    The message fills about a tenth of the image (at most 100000 characters).
+
+    Parameter image: The image the message is for
+    Precondition: image is an Image object
+    """
+    return ('benchmark '*10000)[:max(1,min(100000,image.getLength()//10))]
+
+
+def _setup_encode(image):
+    """
+    Returns: An editor for image, with values that the encode format can hold
+
+    Editor.encode (like the original) fails on color values 26..99, since it appends a
+    digit to their first two digits.  These values are moved up by 100.
+
+    Parameter image: The image to start from
+    Precondition: image is an Image object
+    """
+    data = image.getPixels().getData()
+    data[:] = data.translate(bytes(v+100 if 26 <= v <= 99 else v for v in range(256)))
+    return a6editor.Editor(image)
+
+
+def _setup_decode(image):
+    """
+    Returns: An editor whose current image holds an encoded message
+
+    Parameter image: The image to start from
+    Precondition: image is an Image object
+    """
+    editor = _setup_encode(image)
+    editor.encode(_message(image))
+    return editor
+
+
+def _setup_increment(image):
+    """
+    Returns: A history whose current image has been inverted since the last increment
+
+    Parameter image: The image to start from
+    Precondition: image is an Image object
+    """
+    history = a6history.ImageHistory(image)
+    history.increment()
+    a6tiles.runKernel(history.getCurrent(),'invert',())
+    return history
+
+
+def _setup_undo(image):
+    """
+    Returns: A history that has two edits to undo
+
+    Parameter image: The image to start from
+    Precondition: image is an Image object
+    """
+    history = _setup_increment(image)
+    history.increment()
+    a6tiles.runKernel(history.getCurrent(),'monochromify',(False,))
+    return history
+
+
+# Each benchmark is a pair (setup, run).  setup(image) makes the object to time, and
+# run(object) does the operation.  Only run is timed.
+OPERATIONS = {
+    'invert':      _editor_operation('invert'),
+    'transpose':   _editor_operation('transpose'),
+    'rotateRight': _editor_operation('rotateRight'),
+    'rotateLeft':  _editor_operation('rotateLeft'),
+    'reflectHori': _editor_operation('reflectHori'),
+    'reflectVert': _editor_operation('reflectVert'),
+    'greyscale':   _editor_operation('monochromify',False),
+    'sepia':       _editor_operation('monochromify',True),
+    'vignette':    _editor_operation('vignette'),
+    'pixellate':   _editor_operation('pixellate',8),
+    'blur':        _editor_operation('blur',4),
+    'jail':        _editor_operation('jail'),
+    'encode':      (_setup_encode,
+                    lambda editor: editor.encode(_message(editor.getCurrent()))),
+    'decode':      (_setup_decode,lambda editor: editor.decode()),
+    'copy':        (lambda image: image,lambda image: image.copy()),
+    'increment':   (_setup_increment,lambda history: history.increment()),
+    'undo':        (_setup_undo,lambda history: history.undo()),
+}
+
+
+# RUNNING BENCHMARKS
+def timeOperation(name, width, height, repeat=3, memory=True):
+    """
+    Returns: The result of benchmarking operation name at the given size, as a dictionary
+
+    The dictionary has the keys 'operation', 'width', 'height', 'pixels', 'seconds'
+    (the best of repeat runs), 'pixelsPerSecond' and 'peakBytes' (None if memory is
+    False).  Each run starts from a fresh copy of the same synthetic image.
+
+    Parameter name: The operation to benchmark
+    Precondition: name is a key of OPERATIONS
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter repeat: The number of timed runs
+    Precondition: repeat is an int > 0
+
+    Parameter memory: Whether to measure the peak memory (in one extra run)
+    Precondition: memory is a bool
+    """
+    setup, run = OPERATIONS[name]
+    image = makeImage(width,height)
+    best = None
+    for attempt in range(repeat):
+        target = setup(image.copy())
+        start = time.perf_counter()
+        run(target)
+        elapsed = time.perf_counter()-start
+        best = elapsed if best is None else min(best,elapsed)
+        del target
+
+    peak = None
+    if memory:
+        target = setup(image.copy())
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        run(target)
+        peak = tracemalloc.get_traced_memory()[1]-before
+        tracemalloc.stop()
+        del target
+
+    pixels = width*height
+    return {'operation':name, 'width':width, 'height':height, 'pixels':pixels,
+            'seconds':best, 'pixelsPerSecond':pixels/best if best else None,
+            'peakBytes':peak}
+
+
+def runBenchmarks(sizes=DEFAULT_SIZES, operations=None, repeat=3, memory=True,
+                  report=None):
+    """
+    Returns: The results of benchmarking every operation at every size, as a dictionary
+
+    The dictionary has the keys 'version' (FORMAT_VERSION), 'python', 'platform' and
+    'results'.  The value for 'results' is a list with one dictionary per operation
+    and size (see timeOperation), each with an extra key 'size' (the size name).
+
+    If report is not None, it is called with each result as soon as it is ready.
+
+    Parameter sizes: The names of the sizes to use
+    Precondition: sizes is a sequence of keys of SIZES
+
+    Parameter operations: The operations to benchmark (None for all of them)
+    Precondition: operations is None or a sequence of keys of OPERATIONS
+
+    Parameter repeat: The number of timed runs of each operation
+    Precondition: repeat is an int > 0
+
+    Parameter memory: Whether to measure the peak memory
+    Precondition: memory is a bool
+
+    Parameter report: The function to call with each result
+    Precondition: report is None or a function of one argument
+    """
+    results = []
+    for size in sizes:
+        width, height = SIZES[size]
+        for name in (operations or OPERATIONS):
+            result = timeOperation(name,width,height,repeat,memory)
+            result['size'] = size
+            results.append(result)
+            if report is not None:
+                report(result)
+    return {'version':FORMAT_VERSION, 'python':platform.python_version(),
+            'platform':platform.platform(), 'results':results}
+
+
+def compare(baseline, current, tolerance=TOLERANCE):
+    """
+    Returns: The list of regressions of current against baseline
+
+    A regression is an operation and size in both sets of results that got slower by
+    more than tolerance (as a fraction of the baseline time).  Times below MIN_SECONDS
+    in both are ignored as noise.  Each regression is a dictionary with the keys
+    'operation', 'size', 'baseline', 'current' (both in seconds) and 'ratio'.
+
+    Parameter baseline: The stored results
+    Precondition: baseline is a dictionary returned by runBenchmarks (or read from JSON)
+
+    Parameter current: The new results
+    Precondition: current is a dictionary returned by runBenchmarks
+
+    Parameter tolerance: The allowed slowdown
+    Precondition: tolerance is a number >= 0
+    """
+    assert baseline.get('version') == FORMAT_VERSION, 'the baseline format is not supported'
+    before = {(result['operation'],result['size']):result['seconds']
+              for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = (result['operation'],result['size'])
+        if key not in before:
+            continue
+        old, new = before[key], result['seconds']
+        if max(old,new) < MIN_SECONDS:
+            continue
+        if new > old*(1+tolerance):
+            regressions.append({'operation':key[0], 'size':key[1], 'baseline':old,
+                                'current':new, 'ratio':new/old if old else float('inf')})
+    return regressions
+
+
+# DIFFERENTIAL CHECK
+def _outcome(function, image, args):
+    """
+    Returns: The pair (result, pixel bytes) of running function, or the exception name
+
+    If function raises an exception, the result is the pair ('error', name) with the
+    name of the exception class.  Both versions of an operation must fail the same way
+    on the same input.
+
+    Parameter function: The operation to run (modifying image)
+    Precondition: function is a function of image and args
+
+    Parameter image: The image to run it on
+    Precondition: image is an Image object
+
+    Parameter args: The operation arguments
+    Precondition: args is a tuple
+    """
+    try:
+        value = function(image,*args)
+    except Exception as e:
+        return ('error',type(e).__name__)
+    return (value,image.getWidth(),bytes(image.getPixels().getData()[:]))
+
+
+def _editor_backend(mode):
+    """
+    Returns: A function that runs an Editor operation with the given backend
+
+    The function is called as function(image, name, *args) and returns the result of
+    the operation.  It leaves the edited pixels in image.
+
+    Parameter mode: The backend
+    Precondition: mode is one of 'kernels', 'deferred', 'tiles' or 'mapped'
+    """
+    def run(image, name, *args):
+        if mode == 'mapped':
+            folder = tempfile.mkdtemp()
+            path = os.path.join(folder,'check.rgb')
+            a6mapped.saveRaw(image,path)
+            source = a6mapped.openImage(path,image.getWidth())
+        else:
+            source = image
+        editor = a6editor.Editor(source)
+        if mode == 'deferred':
+            editor.setDeferred(True)
+        elif mode == 'tiles':
+            editor.setScheduler(a6tiles.TileScheduler(2,'thread'))
+        try:
+            value = getattr(editor,name)(*args)
+            current = editor.getCurrent()
+            data = bytearray(current.getPixels().getData()[:])
+            image.getPixels().getData()[:] = data
+            image.setWidth(current.getWidth())
+        finally:
+            if editor.getScheduler() is not None:
+                editor.getScheduler().shutdown()
+            if mode == 'mapped':
+                source.close()
+                shutil.rmtree(folder,ignore_errors=True)
+        return value
+    return run
+
+
+# The operations checked against a6reference, as (name, args) pairs
+CHECKS = (('invert',()), ('transpose',()), ('rotateRight',()), ('rotateLeft',()),
+          ('reflectHori',()), ('reflectVert',()), ('monochromify',(False,)),
+          ('monochromify',(True,)), ('vignette',()), ('pixellate',(5,)),
+          ('jail',()), ('encode',('Hello, World!',)))
+
+# The backends checked against a6reference
+BACKENDS = ('kernels', 'deferred', 'tiles', 'mapped')
+
+
+def checkBackends(sizes=CHECK_SIZES, backends=BACKENDS, seed=0):
+    """
+    Returns: The list of mismatches between the backends and a6reference
+
+    Every operation in CHECKS is run with every backend on a synthetic image of each
+    size, and compared with the reference version: the return value, the width and
+    every byte of the pixels must be the same (or both must raise the same kind of
+    exception).  decode is checked on the encoded images too.  Each mismatch is a
+    triple (operation, backend, (width, height)).
+
+    Parameter sizes: The image sizes to check
+    Precondition: sizes is a sequence of (width, height) pairs of ints > 0
+
+    Parameter backends: The backends to check
+    Precondition: backends is a sequence of names in BACKENDS
+
+    Parameter seed: The random seed for the images
+    Precondition: seed is an int
+    """
+    mismatches = []
+    for width, height in sizes:
+        image = makeImage(width,height,seed)
+        for name, args in CHECKS:
+            expected = _outcome(getattr(a6reference,name),image.copy(),args)
+            for mode in backends:
+                run = _editor_backend(mode)
+                actual = _outcome(lambda target, *rest: run(target,name,*rest),
+                                  image.copy(),args)
+                if actual != expected:
+                    mismatches.append((name,mode,(width,height)))
+                if name == 'encode' and expected[0] is True:
+                    encoded = a6image.Image(a6buffer.PixelBuffer(bytearray(expected[2])),
+                                            width)
+                    want = _outcome(a6reference.decode,encoded.copy(),())
+                    got  = _outcome(lambda target: run(target,'decode'),encoded.copy(),())
+                    if got != want:
+                        mismatches.append(('decode',mode,(width,height)))
+    return mismatches
+
+
+# COMMAND LINE
+def main(argv=None):
+    """
+    Returns: The exit status of the benchmark (0 on success)
+
+    The status is 1 if --compare finds a regression or --check finds a mismatch.
+
+    Parameter argv: The command line arguments (None for sys.argv[1:])
+    Precondition: argv is None or a list of str
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the imager operations.')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                        help='sizes to run, from: '+', '.join(SIZES))
+    parser.add_argument('--operations', default=None,
+                        help='operations to run (default: all), from: '+', '.join(OPERATIONS))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs of each operation (default: 3)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not measure peak memory')
+    parser.add_argument('-o','--output', help='file to write the JSON results to')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed slowdown before a regression (default: 0.10)')
+    parser.add_argument('--check', action='store_true',
+                        help='only check the backends against the reference versions')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = checkBackends()
+        for name, mode, size in mismatches:
+            print('MISMATCH  %s  %s  %dx%d' % (name,mode,size[0],size[1]))
+        print('%d mismatches' % len(mismatches))
+        return 1 if mismatches else 0
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    operations = None
+    if args.operations:
+        operations = [name.strip() for name in args.operations.split(',') if name.strip()]
+    for name in sizes:
+        if name not in SIZES:
+            parser.error('unknown size %s' % repr(name))
+    for name in operations or ():
+        if name not in OPERATIONS:
+            parser.error('unknown operation %s' % repr(name))
+
+    def report(result):
+        peak = result['peakBytes']
+        print('%-12s %-6s %10.4fs %10.2f Mpx/s %s' % (result['operation'],result['size'],
+              result['seconds'],(result['pixelsPerSecond'] or 0)/1e6,
+              '' if peak is None else '%8.1f MB peak' % (peak/2**20)))
+
+    results = runBenchmarks(sizes,operations,args.repeat,not args.no_memory,report)
+    if args.output:
+        with open(args.output,'w') as file:
+            json.dump(results,file,indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline,results,args.tolerance)
+        for item in regressions:
+            print('REGRESSION  %s  %s  %.4fs -> %.4fs (x%.2f)' % (item['operation'],
+                  item['size'],item['baseline'],item['current'],item['ratio']))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Compact pixel storage for our imager application.
+
+This module contains a single class.  Instances of this class store an image as one
+contiguous buffer of bytes, with the red, green and blue values of each pixel stored
+one after the other (interleaved RGB).  This takes 3 bytes per pixel, instead of one
+tuple and three int objects per pixel like a list of tuples.
+
+Instances act like the pixel lists from the pixels module.  You can get and set pixels
+as (r,g,b) tuples by position, take the length, iterate and slice.  But they also
+expose the raw bytes (see getBuffer), so other code (including NumPy, when it is 
+installed) can work on the pixels without copying them.
+
+getBuffer is the supported way to get the raw bytes.  The class also defines
+__buffer__, so memoryview(buffer) works too, but only on Python 3.12 or later (earlier
+versions ignore __buffer__ on Python classes, and raise a TypeError).
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class PixelBuffer(object):
+    """
+    A class that stores a list of pixels as a flat buffer of bytes.
+
+    Pixel n is stored in the bytes 3*n, 3*n+1 and 3*n+2 of the buffer (red, green and
+    blue in that order).  As with the Pixels class, pixels are read and written as
+    3-element tuples, with each element in the range 0..255.
+
+    The buffer is a bytearray, so memoryview(buffer.getBuffer()) and numpy.frombuffer
+    both give views of the pixels and not copies.
+
+    The buffer also counts the ways its pixels could have been changed from outside:
+    every pixel set and every raw buffer handed out (see getExposures).  An image uses
+    this count to tell whether its dirty pixels can still be trusted.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _data:   The raw pixel bytes               [bytearray, len(_data) == 3*_length]
+        _length: The number of pixels in the list   [int >= 0]
+
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _exposures: The number of pixel sets and raw buffers handed out [int >= 0]
+    """
+
+    # GETTERS
+    def getBuffer(self):
+        """
+        Returns: A memoryview of the raw interleaved RGB bytes.
+
+        The view shares memory with this object, so writes to the view change the
+        pixels (and the other way around).
+        """
+        self._exposures += 1
+        return memoryview(self._data)
+
+
+    def getData(self):
+        """
+        Returns: The underlying bytearray of interleaved RGB bytes.
+
+        This is for the bulk pixel operations, which work on the whole buffer at once.
+        The bytearray must never be resized.
+        """
+        self._exposures += 1
+        return self._data
+
+
+    def getExposures(self):
+        """
+        Returns: The number of times the pixels of this buffer could have been changed
+
+        This counts every call to __setitem__, getData, getBuffer, asArray and the
+        buffer protocol.  If the number has not changed, neither have the pixels (except
+        through a buffer handed out before).
+        """
+        return self._exposures
+
+
+    def asArray(self):
+        """
+        Returns: A NumPy view of the pixels with shape (length, 3), or None
+
+        The array has type uint8 and shares memory with this object.  If NumPy is not
+        installed, this method returns None.
+        """
+        if numpy is None:
+            return None
+        self._exposures += 1
+        return numpy.frombuffer(self._data,dtype=numpy.uint8).reshape(self._length,3)
+
+    # INITIALIZER AND OPERATORS
+    def __init__(self, data):
+        """
+        Initializer: Creates a pixel buffer from the given data.
+
+        If data is an int, the buffer has that many pixels, all of them black.  If data
+        is a bytearray, the buffer uses it directly WITHOUT copying it.  Any other bytes-
+        like object is copied.  Otherwise, data is treated as a sequence of (r,g,b)
+        tuples (such as a Pixels object) and the pixels are copied into the buffer.
+
+        Parameter data: The pixel data
+        Precondition: data is an int >= 0, a bytes-like object whose length is a multiple
+        of 3, or a sequence of 3-element tuples (r,g,b) where each value is 0..255
+        """
+        if isinstance(data,int):
+            assert data >= 0
+            self._data = bytearray(3*data)
+        elif isinstance(data,bytearray):
+            self._data = data
+        elif isinstance(data,PixelBuffer):
+            self._data = data._data[:]
+        elif isinstance(data,(bytes,memoryview)):
+            self._data = bytearray(data)
+        else:
+            self._data = bytearray(value for pixel in data for value in pixel)
+        assert len(self._data) % 3 == 0
+        self._length = len(self._data)//3
+        self._exposures = 0
+
+
+    def __len__(self):
+        """
+        Returns: The number of pixels in this buffer
+        """
+        return self._length
+
+
+    def __getitem__(self, n):
+        """
+        Returns: Pixel n as an (r,g,b) tuple, or a new PixelBuffer if n is a slice
+
+        Negative positions count from the end, as with lists.  A slice returns a copy
+        of the selected pixels, so buffer[:] is a copy of the whole buffer.
+
+        Parameter n: The pixel position (or slice of positions)
+        Precondition: n is an int with -length <= n < length, or a slice
+        """
+        if isinstance(n,slice):
+            start, stop, step = n.indices(self._length)
+            if step == 1:
+                return PixelBuffer(self._data[3*start:3*max(start,stop)])
+            result = bytearray()
+            for pos in range(start,stop,step):
+                result += self._data[3*pos:3*pos+3]
+            return PixelBuffer(result)
+        k = 3*self._index(n)
+        data = self._data
+        return (data[k],data[k+1],data[k+2])
+
+
+    def __setitem__(self, n, pixel):
+        """
+        Sets pixel n to the given pixel value.
+
+        Parameter n: The pixel position
+        Precondition: n is an int with -length <= n < length
+
+        Parameter pixel: The pixel value
+        Precondition: pixel is a 3-element tuple (r,g,b) where each value is 0..255
+        """
+        if len(pixel) != 3:
+            raise ValueError('pixel %s does not have 3 elements' % repr(pixel))
+        k = 3*self._index(n)
+        self._data[k:k+3] = bytes(pixel)
+        self._exposures += 1
+
+
+    def __iter__(self):
+        """
+        Returns: An iterator over the pixels as (r,g,b) tuples
+        """
+        data = self._data
+        for k in range(0,len(data),3):
+            yield (data[k],data[k+1],data[k+2])
+
+
+    def __eq__(self, other):
+        """
+        Returns: True if other is a PixelBuffer with the same pixels, False otherwise
+
+        Parameter other: The object to compare with
+        Precondition: NONE
+        """
+        return isinstance(other,PixelBuffer) and self._data == other._data
+
+
+    def __buffer__(self, flags):
+        """
+        Returns: A memoryview of the raw bytes (the Python 3.12 buffer protocol)
+
+        This is what memoryview(buffer) calls, on Python 3.12 or later only.  Earlier
+        versions raise a TypeError instead; use getBuffer, which works on all of them.
+
+        Parameter flags: The buffer request flags
+        Precondition: flags is an int
+        """
+        self._exposures += 1
+        return memoryview(self._data)
+
+    # ADDITIONAL METHODS
+    def copy(self):
+        """
+        Returns: A copy of this pixel buffer.
+
+        The copy has its own bytearray, so changing one does not change the other.
+        """
+        return PixelBuffer(self._data[:])
+
+    # HELPER METHODS
+    def _index(self, n):
+        """
+        Returns: The non-negative pixel position for n
+
+        This raises an IndexError if n is out of range, like a list would.
+
+        Parameter n: The pixel position
+        Precondition: n is an int
+        """
+        if n < 0:
+            n += self._length
+        if n < 0 or n >= self._length:
+            raise IndexError('pixel position %s out of range' % repr(n))
+        return n
@@ -0,0 +1,250 @@
+"""
+A result cache for the Editor operations of our imager application.
+
+Users often apply the same filter to the same image again and again (sepia on, undo,
+sepia on again).  This module remembers the images that operations produced, so that
+the Editor can copy a result back instead of running the filter again.
+
+Results are content-addressed.  The key of an image is a hash of its pixels, and the
+key of a result is a hash of the key of the image it was computed from, the operation
+name and its arguments.  So a result is found no matter which Editor (or history
+state) the image came from.  Only the first image of a chain of operations has to be
+hashed in full; each result key is derived from the one before it, in constant time
+(see the method Editor._resultKey).
+
+The cache is an LRU cache with a byte budget.  When the stored results take up more
+than the budget, the least recently used ones are deleted.
+"""
+import collections
+import hashlib
+import threading
+
+import a6lut
+
+
+# The default byte budget of a ResultCache
+DEFAULT_BUDGET = 256*1024*1024
+
+# The size (in bytes) of the hash keys
+KEY_BYTES = 16
+
+# The number of pixel bytes hashed at a time
+HASH_BYTES = 16*1024*1024
+
+
+class ResultCache(object):
+    """
+    A class that stores the results of image operations, by key.
+
+    Each entry is the raw pixel bytes and width of a result image.  Entries are kept
+    in least-recently-used order, and the oldest are deleted when the total size goes
+    over the budget.  A result bigger than the whole budget is never stored.
+
+    A cache can be shared by several Editor objects, and by several threads.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _budget:    The most pixel bytes the cache may hold     [int >= 0]
+        _entries:   The results, least recently used first       [OrderedDict of bytes to (bytes, int)]
+        _lock:      Guards all of the mutable attributes         [threading.Lock]
+
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _bytes:     The total pixel bytes of the entries         [int >= 0]
+        _hits:      The number of lookups that found a result    [int >= 0]
+        _misses:    The number of lookups that did not           [int >= 0]
+        _evictions: The number of entries deleted for space      [int >= 0]
+    """
+
+    # GETTERS
+    def getBudget(self):
+        """
+        Returns: The most pixel bytes this cache may hold
+        """
+        return self._budget
+
+
+    def getBytes(self):
+        """
+        Returns: The pixel bytes currently held by this cache
+        """
+        return self._bytes
+
+
+    def getStats(self):
+        """
+        Returns: The statistics of this cache, as a dictionary
+
+        The keys are 'hits', 'misses', 'evictions', 'entries', 'bytes' and 'hitRate'
+        (the fraction of lookups that were hits, or 0.0 if there were none).
+        """
+        with self._lock:
+            lookups = self._hits+self._misses
+            return {'hits':self._hits, 'misses':self._misses,
+                    'evictions':self._evictions, 'entries':len(self._entries),
+                    'bytes':self._bytes, 'hitRate':self._hits/lookups if lookups else 0.0}
+
+    # INITIALIZER AND OPERATORS
+    def __init__(self, budget=DEFAULT_BUDGET):
+        """
+        Initializer: Creates an empty cache with the given byte budget.
+
+        Parameter budget: The most pixel bytes the cache may hold
+        Precondition: budget is an int >= 0
+        """
+        assert type(budget) == int and budget >= 0
+        self._budget    = budget
+        self._entries   = collections.OrderedDict()
+        self._lock      = threading.Lock()
+        self._bytes     = 0
+        self._hits      = 0
+        self._misses    = 0
+        self._evictions = 0
+
+
+    def __len__(self):
+        """
+        Returns: The number of results in this cache
+        """
+        return len(self._entries)
+
+
+    def __contains__(self, key):
+        """
+        Returns: True if there is a result for key, False otherwise
+
+        This does not count as a lookup, and does not change the LRU order.
+
+        Parameter key: The result key
+        Precondition: key is a bytes object
+        """
+        return key in self._entries
+
+    # ADDITIONAL METHODS
+    def restore(self, key, image):
+        """
+        Returns: True if there was a result for key (now copied into image); False otherwise
+
+        On a hit, the pixels of the result are copied into image (all of them are marked
+        dirty) and its width is set, and the entry becomes the most recently used.
+
+        Parameter key: The result key
+        Precondition: key is a bytes object
+
+        Parameter image: The image to copy the result into
+        Precondition: image is an Image object with the same length as the result
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return False
+            self._hits += 1
+            self._entries.move_to_end(key)
+        data, width = entry
+        image.getData()[:] = data
+        image.setWidth(width)
+        image.markDirty()
+        return True
+
+
+    def store(self, key, image):
+        """
+        Stores a copy of the pixels of image as the result for key.
+
+        The least recently used entries are deleted until the cache is within budget.
+
+        Parameter key: The result key
+        Precondition: key is a bytes object
+
+        Parameter image: The result image
+        Precondition: image is an Image object
+        """
+        size = 3*image.getLength()
+        if size > self._budget:
+            return
+        data = bytes(image.getData())
+        with self._lock:
+            old = self._entries.pop(key,None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (data,image.getWidth())
+            self._bytes += size
+            while self._bytes > self._budget:
+                evicted = self._entries.popitem(last=False)[1]
+                self._bytes -= len(evicted[0])
+                self._evictions += 1
+
+
+    def clear(self):
+        """
+        Deletes every result, and sets the statistics back to 0.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes     = 0
+            self._hits      = 0
+            self._misses    = 0
+            self._evictions = 0
+
+
+# KEY FUNCTIONS
+def contentKey(image):
+    """
+    Returns: The key of image, a hash of its size and pixels
+
+    The pixels are hashed HASH_BYTES at a time with BLAKE2b, straight from the pixel
+    buffer.
+
+    Parameter image: The image to hash
+    Precondition: image is an Image object
+    """
+    digest = hashlib.blake2b(digest_size=KEY_BYTES)
+    digest.update(b'%d,%d;' % (image.getWidth(),image.getHeight()))
+    with memoryview(image.getData()) as view:
+        for pos in range(0,len(view),HASH_BYTES):
+            digest.update(view[pos:pos+HASH_BYTES])
+    return digest.digest()
+
+
+def deriveKey(key, name, args):
+    """
+    Returns: The key of the result of operation name with args on the image with key
+
+    The result is None if some argument has no stable representation (see _token),
+    since then equal arguments might not get equal keys.
+
+    Parameter key: The key of the image the operation starts from
+    Precondition: key is a bytes object
+
+    Parameter name: The operation (Editor method) name
+    Precondition: name is a str
+
+    Parameter args: The operation arguments
+    Precondition: args is a tuple
+    """
+    token = _token((name,)+tuple(args))
+    if token is None:
+        return None
+    return hashlib.blake2b(key+token.encode('utf-8'),digest_size=KEY_BYTES).digest()
+
+
+# HELPER FUNCTIONS
+def _token(value):
+    """
+    Returns: A string that identifies value, or None if there is none
+
+    Numbers, strings, bytes, bools and None are identified by their repr, tuples and
+    lists by their elements, and PointLUT objects by their stages.
+
+    Parameter value: The value to identify
+    Precondition: NONE
+    """
+    if value is None or isinstance(value,(bool,int,float,str,bytes)):
+        return type(value).__name__+':'+repr(value)
+    if isinstance(value,(tuple,list)):
+        parts = [_token(item) for item in value]
+        if None in parts:
+            return None
+        return '('+','.join(parts)+')'
+    if isinstance(value,a6lut.PointLUT):
+        return 'lut:'+repr(value.getStages())
+    return None
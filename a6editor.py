@@ -0,0 +1,1303 @@
+"""
+The primary controller module for the Imager application
+
+This module provides all of the image processing operations that are called whenever you 
+press a button. Some of these are provided for you and others you are expected to write
+on your own.
+
+Based on an original file by Dexter Kozen (dck10) and Walker White (wmw2)
+
+Author: Walker M. White (wmw2)
+Date:    October 20, 2017 (Python 3 Version)
+
+Kartikay Jain kj295
+11/15/2017
+"""
+import functools
+import threading
+import time
+import weakref
+from concurrent import futures
+
+import a6batch
+import a6cache
+import a6history
+import a6lazy
+import a6lut
+import a6stego
+import a6tiles
+
+
+# The logged call running on each thread (see _logged)
+_CALL = threading.local()
+
+
+def _logged(method):
+    """
+    Returns: A wrapper of the editing method that takes it out of the log if it raises
+
+    An editing method logs itself (see Editor._logOperation) before it runs, so that 
+    redo can replay it.  If it then raises an error, the wrapper undoes the logging:
+    the entry is removed and the redo stack is put back if the pixels did not change, 
+    and otherwise the log of the current state is emptied (as its changes are no longer
+    known, so undo keeps a keyframe of it).  Only the outermost logged method of a call 
+    does this, as the methods that it calls are part of the same call.
+
+    Parameter method: The editing method
+    Precondition: method is a method of Editor that calls _logOperation
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwds):
+        if getattr(_CALL,'active',False):
+            return method(self,*args,**kwds)
+        _CALL.active = True
+        _CALL.state = None
+        try:
+            return method(self,*args,**kwds)
+        except BaseException:
+            if _CALL.state is not None:
+                self._forgetOperation(*_CALL.state)
+            raise
+        finally:
+            _CALL.active = False
+            _CALL.state = None
+    return wrapper
+
+
+class Editor(a6history.ImageHistory):
+    """
+    A class that contains a collection of image processing methods
+    
+    This class is a subclass of ImageHistory.  That means it inherits all of the methods
+    and attributes of that class.  We do that (1) to put all of the image processing
+    methods in one easy-to-read place and (2) because we might want to change how we 
+    implement the undo functionality later.
+    
+    This class is broken up into three parts (1) implemented non-hidden methods, (2)
+    non-implemented non-hidden methods and (3) hidden methods.  The non-hidden methods
+    each correspond to a button press in the main application.  The hidden methods are
+    all helper functions.
+    
+    Each one of the non-hidden functions should edit the most recent image in the
+    edit history (which is inherited from ImageHistory).
+    
+    In deferred mode (see setDeferred), the point and geometric operations are not run
+    right away.  They are recorded in an OperationGraph (see the module a6lazy), which
+    is simplified and run when the pixels are next needed, i.e. the next time 
+    getCurrent is called.  In this mode, all of the operations recorded between two
+    runs of the graph make up a single step of the edit history.
+    
+    The filters that work on each pixel or on bands of rows (see the module a6tiles)
+    can be run on several cores at once, by setting a TileScheduler with setScheduler.
+    
+    If the image is memory-mapped (see the module a6mapped), every operation streams it
+    one band of rows at a time, so images bigger than memory can be edited.
+    
+    The results of the filters and geometric operations can be remembered in a 
+    ResultCache (see the module a6cache and setCache).  Running the same operation on
+    the same pixels again then copies the result instead of computing it.  The key of
+    the current image is derived from its operation log, so only the first image of a
+    chain is ever hashed in full.
+    
+    In preview mode (see setPreview), the filters and the point and geometric
+    operations are first run on the level of the image pyramid (see Image.getLevel)
+    that matches the display size, which getPreview returns right away.  The whole
+    call (at full resolution) is then run on a background thread, in order with the
+    calls before it.  When it is done, getPreview shows the full resolution result 
+    (scaled down) instead.  Anything that needs the full resolution pixels, such as
+    getCurrent, undo or the other operations, waits for the background thread first.
+    
+    If the original image is an ImageBatch (see the module a6batch), every operation
+    edits all of its frames at once, as if each frame had an Editor of its own.  The
+    encoding methods then take and return one message per frame.  Batches are never
+    previewed.
+    
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _deferred:  Whether point and geometric operations are deferred [bool]
+        _graph:     The deferred operations not yet run   [OperationGraph object]
+        _scheduler: Runs filters in parallel bands        [TileScheduler, or None]
+        _cache:     Remembers operation results           [ResultCache, or None]
+        _keys:      The known keys of history images      [WeakKeyDictionary of Image
+                    to (position, key, version)]
+        _display:   The preview display size              [(int, int), or None if not previewing]
+        _previewImage:  The preview of the latest edit    [Image, or None if not computed]
+        _previewFactor: The scale of the preview          [int, a power of 2]
+        _executor:  Runs the full resolution calls        [ThreadPoolExecutor, or None]
+        _jobs:      The full resolution calls, in order   [list of Future objects]
+        _latencies: The latency of each previewed call    [list of [str, float, float or None]]
+        _frames:    The number of frames in each image    [int > 0]
+    A key in _keys is the key of the image once the first position operations of its
+    log had been applied, when the image had the given version (see Image.getVersion).
+    If the version has changed since, the image may have been edited in a way that the
+    log does not show, so the key is no longer used.  _keys is None if _cache is None.  Each latency is the
+    method name, the seconds until the preview was ready, and the seconds until the
+    full resolution result was (None while it is still running).
+    """
+    
+    # Operations are run right away unless setDeferred(True) is called
+    _deferred = False
+    
+    # Filters run in this thread unless setScheduler is called
+    _scheduler = None
+    
+    # The deferred operations are created by clear
+    _graph = None
+    
+    # Results are not cached unless setCache is called
+    _cache = None
+    _keys  = None
+    
+    # Operations run at full resolution right away unless setPreview is called
+    _display   = None
+    _previewImage  = None
+    _previewFactor = 1
+    _executor  = None
+    _jobs      = ()
+    _latencies = ()
+    
+    # Images are single frames unless the original is an ImageBatch
+    _frames = 1
+    
+    # The seconds a preview should take to stay interactive (see getLatencies)
+    PREVIEW_BUDGET = 0.1
+    
+    # The operations that can be previewed, with how to scale their arguments down
+    # to a pyramid level (the factor is 2**level)
+    PREVIEW_SCALING = {'pixellate':lambda args, factor: (max(1,args[0]//factor),),
+                       'blur':lambda args, factor: (args[0]//factor,),
+                       'highPass':lambda args, factor: (args[0]//factor,)}
+    
+    # DEFERRED MODE
+    def isDeferred(self):
+        """
+        Returns: True if point and geometric operations are deferred, False otherwise
+        """
+        return self._deferred
+    
+    
+    def setDeferred(self, value):
+        """
+        Turns deferred mode on or off.
+        
+        Turning deferred mode off runs any operations that are still pending.
+        
+        Parameter value: Whether to defer point and geometric operations
+        Precondition: value is a bool
+        """
+        assert type(value) == bool
+        if not value:
+            self.flush()
+        self._deferred = value
+    
+    
+    def flush(self):
+        """
+        Runs all of the deferred operations on the current image.
+        
+        This does nothing if there are no deferred operations.
+        """
+        self._wait()
+        if self._graph.isEmpty():
+            return
+        current = a6history.ImageHistory.getCurrent(self)
+        for name in self._graph.execute(current,self._frames):
+            self._recordOperation(name)
+    
+    # BATCHES
+    def getFrameCount(self):
+        """
+        Returns: The number of frames edited at once (1 unless the original is a batch)
+        """
+        return self._frames
+    
+    # PARALLEL EXECUTION
+    def getScheduler(self):
+        """
+        Returns: The tile scheduler used to run filters, or None
+        """
+        return self._scheduler
+    
+    
+    def setScheduler(self, scheduler):
+        """
+        Sets the tile scheduler used to run filters.
+        
+        If scheduler is None, the filters run in this thread, on the whole image at once.
+        
+        Parameter scheduler: The tile scheduler to use
+        Precondition: scheduler is None or a TileScheduler object
+        """
+        assert scheduler is None or isinstance(scheduler,a6tiles.TileScheduler)
+        self._scheduler = scheduler
+    
+    # RESULT CACHE
+    def getCache(self):
+        """
+        Returns: The result cache used by the operations, or None
+        """
+        return self._cache
+    
+    
+    def setCache(self, cache):
+        """
+        Sets the result cache used by the operations.
+        
+        If cache is None, every operation is computed.  A cache may be shared by 
+        several editors.  Memory-mapped images are never cached.
+        
+        The keys of the history images are derived from their operation logs, so they
+        do not see changes made directly to the pixels of getCurrent.  Calling this
+        method again forgets the keys, so the images are hashed again.
+        
+        Parameter cache: The result cache to use
+        Precondition: cache is None or a ResultCache object
+        """
+        assert cache is None or isinstance(cache,a6cache.ResultCache)
+        self._cache = cache
+        self._keys  = None if cache is None else weakref.WeakKeyDictionary()
+    
+    # PREVIEW MODE
+    def getPreviewSize(self):
+        """
+        Returns: The display size (width, height) for previews, or None if not previewing
+        """
+        return self._display
+    
+    
+    def setPreview(self, size):
+        """
+        Turns preview mode on (for a display of the given size) or off.
+        
+        Turning preview mode off waits for the background thread to finish.
+        
+        Parameter size: The display size, or None to turn preview mode off
+        Precondition: size is None or a tuple (width, height) of ints > 0
+        """
+        assert size is None or (len(size) == 2 and all(type(x) == int and x > 0 
+                                                       for x in size))
+        self._wait()
+        self._display = None if size is None else tuple(size)
+        if size is not None and self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(1,'a6editor-preview')
+            self._jobs = []
+            self._latencies = []
+    
+    
+    def getPreview(self):
+        """
+        Returns: The latest edit, at the pyramid level for the display size
+        
+        While full resolution calls are still running, this is the preview computed
+        from the earlier previews.  Once they are all done, the preview is replaced by
+        the pyramid level of the full resolution image.  If preview mode is off, this
+        is the current image.
+        
+        The result must not be modified.
+        """
+        if self._display is None:
+            return self.getCurrent()
+        if self._previewImage is not None and not self.isPending():
+            self._wait()
+        if self._previewImage is not None:
+            return self._previewImage
+        current = a6history.ImageHistory.getCurrent(self)
+        return current.getLevel(current.findLevel(*self._display))
+    
+    
+    def isPending(self):
+        """
+        Returns: True if full resolution calls are still running, False otherwise
+        """
+        return any(not job.done() for job in self._jobs)
+    
+    
+    def getLatencies(self):
+        """
+        Returns: The latencies of the previewed calls, oldest first
+        
+        Each is a tuple (name, preview, full) of the method name, the seconds until its
+        preview was ready, and the seconds until its full resolution result was ready
+        (None if it is still running).  Compare preview with PREVIEW_BUDGET.
+        """
+        return [tuple(latency) for latency in self._latencies]
+    
+    # HISTORY METHODS
+    def getCurrent(self):
+        """
+        Returns: The most recent edit
+        
+        Any deferred operations are run first, so the pixels are always up to date.
+        """
+        self.flush()
+        return a6history.ImageHistory.getCurrent(self)
+    
+    
+    def increment(self):
+        """
+        Adds a new copy of the image to the edit history.
+        
+        In deferred mode, if there are operations still pending, this does nothing: 
+        the pending operations and the ones that follow share one history step (and
+        one copy of the image).
+        """
+        if self._preview('increment'):
+            return
+        if self._deferred and not self._graph.isEmpty():
+            return
+        a6history.ImageHistory.increment(self)
+        if self._keys is not None and self._previous in self._keys:
+            position, key, version = self._keys[self._previous]
+            if position == len(self._log[-2]) and version == self._previous.getVersion():
+                self._keys[self._current] = (0,key,self._current.getVersion())
+    
+    
+    def undo(self):
+        """
+        Returns: True if the latest edit can be undone, False otherwise.
+        
+        Any deferred operations are part of the latest edit, so they are run first.  That
+        way the undone state matches its operation log, and redo can bring it back.
+        """
+        self.flush()
+        return a6history.ImageHistory.undo(self)
+    
+    
+    def redo(self):
+        """
+        Returns: True if an undone edit was restored, False otherwise.
+        
+        The logged operations of the restored state are replayed right away, even in
+        deferred or preview mode.  (Queued as previews, they would be logged later, as
+        new edits, and throw away the rest of the redo stack.)
+        """
+        self.flush()
+        deferred = self._deferred
+        display  = self._display
+        self._deferred = False
+        self._display  = None
+        try:
+            return a6history.ImageHistory.redo(self)
+        finally:
+            self._deferred = deferred
+            self._display  = display
+    
+    
+    def clear(self):
+        """
+        Deletes the entire edit history, retoring the original image.
+        
+        Any deferred operations are run first, since they are part of the latest edit
+        (which can be redone afterwards).
+        """
+        if self._graph is not None:
+            self.flush()
+        self._graph = a6lazy.OperationGraph()
+        if isinstance(self._original,a6batch.ImageBatch):
+            self._frames = self._original.getCount()
+        a6history.ImageHistory.clear(self)
+    
+    
+    def rollback(self):
+        """
+        Returns: True if the latest edit was discarded, False otherwise.
+        
+        Any deferred operations are part of the latest edit, so they are thrown away
+        with it instead of being run.  Any full resolution calls still running in
+        preview mode are waited for first.
+        """
+        self._wait()
+        self._graph.clear()
+        return a6history.ImageHistory.rollback(self)
+    
+    
+    @_logged
+    def adoptResult(self, name, args, image):
+        """
+        Replaces the current image with image, the result of calling method name.
+        
+        This is for results computed somewhere else, such as in another process (see
+        the module a6jobs), from a copy of the current image.  The call is logged as if
+        it had run here, so it can be redone, but its pixels are just copied.
+        
+        Parameter name: The method name
+        Precondition: name is a str naming an editing method of this object
+        
+        Parameter args: The method arguments
+        Precondition: args is a tuple of valid arguments for that method
+        
+        Parameter image: The result of the call on a copy of the current image
+        Precondition: image is an Image object with the same length as the current image
+        """
+        self._logOperation(name,*args)
+        current = self.getCurrent()
+        assert image.getLength() == current.getLength()
+        current.getData()[:] = image.getData()
+        current.setWidth(image.getWidth())
+        current.markDirty()
+        self._recordOperation(name)
+    
+    # PROVIDED ACTIONS (STUDY THESE)
+    @_logged
+    def invert(self):
+        """
+        Inverts the current image, replacing each element with its color complement
+        
+        This works on the whole pixel buffer in one pass, instead of getting and
+        setting each pixel in turn.
+        """
+        if self._preview('invert'):
+            return
+        self._logOperation('invert')
+        if self._defer('invert'):
+            return
+        self._runKernel('invert')
+        self._recordOperation('invert')
+    
+    
+    @_logged
+    def transpose(self):
+        """
+        Transposes the current image
+        
+        Transposing is tricky, as it is hard to remember which values have been changed 
+        and which have not.  Square images are transposed in place, swapping each row
+        with the matching column.  Other images are rebuilt column by column from the
+        raw pixel buffer (see the module a6kernels).
+        
+        The transposed image will be drawn on the screen immediately afterwards.
+        """
+        if self._preview('transpose'):
+            return
+        self._logOperation('transpose')
+        if self._defer('transpose'):
+            return
+        self._runTransform('transpose')
+        self._recordOperation('transpose')
+    
+    
+    @_logged
+    def reflectHori(self):
+        """
+        Reflects the current image around the horizontal middle.
+        
+        Each row is reversed in place with whole-row slices.
+        """
+        if self._preview('reflectHori'):
+            return
+        self._logOperation('reflectHori')
+        if self._defer('reflectHori'):
+            return
+        self._runTransform('reflectHori')
+        self._recordOperation('reflectHori')
+    
+    
+    @_logged
+    def rotateRight(self):
+        """
+        Rotates the current image left by 90 degrees.
+        
+        Square images are rotated in place via a transpose followed by a horizontal
+        reflection.  Other images are rebuilt by reading each column from the bottom up.
+        """
+        if self._preview('rotateRight'):
+            return
+        self._logOperation('rotateRight')
+        if self._defer('rotateRight'):
+            return
+        self._runTransform('rotateRight')
+        self._recordOperation('rotateRight')
+    
+    
+    @_logged
+    def rotateLeft(self):
+        """
+        Rotates the current image left by 90 degrees.
+        
+        Square images are rotated in place via a transpose followed by a vertical
+        reflection.  Other images are rebuilt by reading the columns from right to left.
+        """
+        if self._preview('rotateLeft'):
+            return
+        self._logOperation('rotateLeft')
+        if self._defer('rotateLeft'):
+            return
+        self._runTransform('rotateLeft')
+        self._recordOperation('rotateLeft')
+    
+    
+    # ASSIGNMENT METHODS (IMPLEMENT THESE)
+    @_logged
+    def reflectVert(self):
+        """ 
+        Reflects the current image around the vertical middle.
+        
+        Whole rows are swapped in place, one row at a time.
+        """
+        if self._preview('reflectVert'):
+            return
+        self._logOperation('reflectVert')
+        if self._defer('reflectVert'):
+            return
+        self._runTransform('reflectVert')
+        self._recordOperation('reflectVert')
+    
+    
+    @_logged
+    def monochromify(self, sepia):
+        """
+        Converts the current image to monochrome, using either greyscale or sepia tone.
+        
+        If `sepia` is False, then this function uses greyscale.  It removes all color 
+        from the image by setting the three color components of each pixel to that pixel's 
+        overall brightness, defined as 
+            
+            0.3 * red + 0.6 * green + 0.1 * blue.
+        
+        If sepia is True, it makes the same computations as before but sets green to
+        0.6 * brightness and blue to 0.4 * brightness.
+        
+        The values are truncated with int, and the whole pixel buffer is converted in
+        one pass (see the module a6kernels).
+        
+        Parameter sepia: Whether to use sepia tone instead of greyscale.
+        Precondition: sepia is a bool
+        """
+        if self._preview('monochromify',sepia):
+            return
+        self._logOperation('monochromify',sepia)
+        if self._defer('monochromify',sepia):
+            return
+        self._runKernel('monochromify',sepia)
+    
+    
+    @_logged
+    def brightness(self, amount):
+        """
+        Changes the brightness of the current image by adding amount to every value.
+        
+        The results are clamped to 0..255.  Like all of the lookup table filters, this
+        costs the same as invert: one table lookup per value.
+        
+        Parameter amount: The change in brightness
+        Precondition: amount is an int
+        """
+        self.applyLUT(a6lut.brightnessLUT(amount),'brightness',amount)
+    
+    
+    @_logged
+    def contrast(self, factor):
+        """
+        Changes the contrast of the current image.
+        
+        Each value v becomes round(128 + factor*(v-128)), clamped to 0..255.
+        
+        Parameter factor: The contrast factor (above 1 for more contrast)
+        Precondition: factor is a number >= 0
+        """
+        self.applyLUT(a6lut.contrastLUT(factor),'contrast',factor)
+    
+    
+    @_logged
+    def gamma(self, value):
+        """
+        Applies gamma correction to the current image.
+        
+        Each value v becomes round(255 * (v/255) ** (1/value)).
+        
+        Parameter value: The gamma (above 1 to brighten the dark areas)
+        Precondition: value is a number > 0
+        """
+        self.applyLUT(a6lut.gammaLUT(value),'gamma',value)
+    
+    
+    @_logged
+    def levels(self, low, high):
+        """
+        Stretches the values low..high of the current image to the full range 0..255.
+        
+        Parameter low: The value that becomes black
+        Precondition: low is an int in 0..254
+        
+        Parameter high: The value that becomes white
+        Precondition: high is an int in low+1..255
+        """
+        self.applyLUT(a6lut.levelsLUT(low,high),'levels',low,high)
+    
+    
+    @_logged
+    def applyLUT(self, lut, *operation):
+        """
+        Applies the lookup table lut to the current image.
+        
+        In deferred mode, lut is fused with the other deferred point operations.  The 
+        optional operation (a name and arguments) is what is recorded in the deferred
+        graph; by default it is ('applyLUT', lut).
+        
+        Parameter lut: The lookup table to apply
+        Precondition: lut is a PointLUT object (see the module a6lut)
+        
+        Parameter operation: The operation name and arguments that lut stands for
+        Precondition: operation is empty, or a name in a6lazy.POINT_OPERATIONS 
+        followed by its arguments
+        """
+        if not operation:
+            operation = ('applyLUT',lut)
+        if self._preview(*operation):
+            return
+        self._logOperation(*operation)
+        if self._defer(*operation):
+            return
+        self._runKernel('applyLUT',lut)
+        self._recordOperation('invert' if lut.isInvert() else operation[0])
+    
+    
+    @_logged
+    def jail(self):
+        """
+        Puts jail bars on the current image
+        
+        The jail should be built as follows:
+        * Put 3-pixel-wide horizontal bars across top and bottom,
+        * Put 4-pixel vertical bars down left and right, and
+        * Put n 4-pixel vertical bars inside, where n is (number of columns - 8) // 50.
+        
+        The n+2 vertical bars should be as evenly spaced as possible.  Each bar is
+        one rectangle fill (see Image.fillRegion), so the bounds are checked once per
+        bar rather than once per pixel.  In a batch, each vertical bar goes down every
+        frame at once.
+        """
+        self._logOperation('jail')
+        current=self.getCurrent()
+        self._drawVBar(0, (255,0,0))
+        self._drawVBar(current.getWidth()-4, (255,0,0))
+        rows=current.getHeight()//self._frames
+        for top in range(0,current.getHeight(),rows):
+            self._drawHBar(top, (255,0,0))
+            self._drawHBar(top+rows-3, (255,0,0))
+        n=(current.getWidth()-8)//50
+        x=(current.getWidth()-8-4*n)/n
+        for y in range(n):
+            h=round((4*(y+1)+(y+1)*x))
+            self._drawVBar(h, (255,0,0))
+        
+    
+    @_logged
+    def vignette(self):
+        """
+        Modifies the current image to simulates vignetting (corner darkening).
+        
+        Vignetting is a characteristic of antique lenses. This plus sepia tone helps
+        give a photo an antique feel.
+        
+        To vignette, darken each pixel in the image by the factor
+        
+            1 - (d / hfD)^2
+        
+        where d is the distance from the pixel to the center of the image and hfD 
+        (for half diagonal) is the distance from the center of the image to any of 
+        the corners.
+        
+        The factors only depend on the image size, so they are computed once per size
+        and cached (see a6kernels.vignetteMask).  The image is then scaled by the mask
+        in one pass, truncating each value with int.
+        """
+        if self._preview('vignette'):
+            return
+        self._logOperation('vignette')
+        self._runKernel('vignette')
+    
+    
+    @_logged
+    def pixellate(self,step):
+        """
+        Pixellates the current image to give it a blocky feel.
+        
+        To pixellate an image, start with the top left corner (e.g. the first row and
+        column).  Average the colors of the step x step block to the right and down
+        from this corner (if there are less than step rows or step columns, go to the
+        edge of the image). Then assign that average to ALL of the pixels in that block.
+        
+        When you are done, skip over step rows and step columns to go to the next 
+        corner pixel.  Repeat this process again.  The result will be a pixellated image.
+        
+        The block sums come from a summed-area table, so each block costs the same no
+        matter how big step is.  As in pixelavg, the sums are divided by step**2 even
+        for the smaller blocks at the edge.  Each band of step rows is then built once
+        and written as one region (see Image.setRegion).
+        
+        Parameter step: The number of pixels in a pixellated block
+        Precondition: step is an int > 0
+        """
+        if self._preview('pixellate',step):
+            return
+        self._logOperation('pixellate',step)
+        self._runKernel('pixellate',step)
+    
+    
+    @_logged
+    def blur(self, radius):
+        """
+        Blurs the current image with a box filter.
+        
+        Each pixel is replaced by the average color of the (2*radius+1) x (2*radius+1)
+        square centered on it, rounded to the nearest int.  At the edge of the image, 
+        only the part of the square inside the image is averaged.  This uses a 
+        summed-area table, so the time does not depend on radius.
+        
+        Parameter radius: The blur radius
+        Precondition: radius is an int >= 0
+        """
+        if self._preview('blur',radius):
+            return
+        self._logOperation('blur',radius)
+        self._runKernel('blur',radius)
+    
+    
+    @_logged
+    def highPass(self, radius):
+        """
+        Subtracts the local mean from the current image, keeping only fine detail.
+        
+        Each color value becomes 128 + value - mean, clamped to 0..255, where mean is
+        the local mean used by blur.  Flat areas become grey and edges stand out.  The
+        time does not depend on radius.
+        
+        Parameter radius: The radius of the local mean
+        Precondition: radius is an int >= 0
+        """
+        if self._preview('highPass',radius):
+            return
+        self._logOperation('highPass',radius)
+        self._runKernel('highPass',radius)
+                
+                
+    @_logged
+    def pixelavg(self, x, y,step):
+        """
+        Procedure: Assigns average of the colors of the pixels within a block to each pixel in the block.
+        
+        Parameter step: The number of pixels in a pixellated block
+        Precondition: step is an int 3> 0
+        
+        Parameter x: The pixel row (of each frame, in a batch)
+        Precondition: x is an int >= 0 and < height
+        
+        Parameter y: The pixel column
+        Precondition: y is an int >= 0 and < width
+        """
+        self._logOperation('pixelavg',x,y,step)
+        current = self.getCurrent()
+        rows   = current.getHeight()//self._frames
+        height = min(step,rows-x)
+        width  = min(step,current.getWidth()-y)
+        for top in range(0,current.getHeight(),rows):
+            block  = current.getRegion(top+x,y,height,width)
+            avgr=sum(block[0::3])/step**2
+            avgg=sum(block[1::3])/step**2
+            avgb=sum(block[2::3])/step**2
+            avgpixel=(round(avgr),round(avgg),round(avgb))
+            current.fillRegion(top+x,y,height,width,avgpixel)
+                
+                
+    @_logged
+    def encode(self, text):
+        """
+        Returns: True if it could hide the given text in the current image; False otherwise.
+        
+        This method attemps to hide the given message text in the current image.  It uses
+        the ASCII representation of the text's characters.  If successful, it returns
+        True.
+        
+        If the text has more than 999999 characters or the picture does not have enough
+        pixels to store the text, this method returns False without storing the message.
+        
+        A beginning marker has been added of 2 pixels length which is '}~' to
+        recognize that the image actually contains a message.
+        
+        An ending marker has been added of 2 pixels length which is '~}' to
+        recognize where the message ends.
+        
+        The digits of the whole message are stored in one pass over the start of the
+        pixel buffer (see the module a6stego), with the same results as calling
+        _encode_pixel on each pixel.
+        
+        In a batch, text is a sequence of messages, one per frame, and the result is
+        the list of what each frame returned.
+        
+        Parameter text: a message to hide
+        Precondition: text is a string (a sequence of getFrameCount() strings in a batch)
+        """
+        if self._frames > 1:
+            text = tuple(text)
+            assert len(text) == self._frames
+        self._logOperation('encode',text)
+        if self._frames > 1:
+            return self._encodeFrames(a6stego.encodeText,a6stego.textPixels,text)
+        current=self.getCurrent()
+        if not a6stego.encodeText(current.getData(),text):
+            return False
+        current.markFlatDirty(0,a6stego.textPixels(text))
+        return True
+    
+    
+    def decode(self):
+        """
+        Returns: The secret message stored in the current image. 
+        
+        If no message is detected, it returns None
+        
+        The end marker is found by searching the last digits of the pixels in bulk,
+        and the message is joined in one step (see the module a6stego).  In a batch,
+        this is the list of the messages of each frame.
+        """
+        if self._frames > 1:
+            return self._decodeFrames(a6stego.decodeText)
+        current=self.getCurrent()
+        return a6stego.decodeText(current.getData())
+
+
+    @_logged
+    def encodeBytes(self, payload, bits=2):
+        """
+        Returns: True if it could hide the given payload in the current image; False otherwise.
+
+        This method hides any bytes (not just ASCII text) in the lowest bits of the
+        color values, after a header with a checksum (see the module a6stego).  A
+        string is stored as its UTF-8 bytes.  More bits per value hold a bigger
+        payload, but change the image more.
+
+        If the payload does not fit, this method returns False without storing it.
+        In a batch, payload is a sequence of payloads, one per frame, and the result is
+        the list of what each frame returned.
+
+        Parameter payload: the data to hide
+        Precondition: payload is a bytes-like object or a string (a sequence of 
+        getFrameCount() of them in a batch)
+
+        Parameter bits: the number of low bits of each color value to use
+        Precondition: bits is 1, 2 or 4
+        """
+        if self._frames > 1:
+            payload = tuple(item.encode('utf-8') if isinstance(item,str) else bytes(item)
+                            for item in payload)
+            assert len(payload) == self._frames
+            self._logOperation('encodeBytes',payload,bits)
+            encode = lambda data, item: a6stego.encodeBytes(data,item,bits)
+            pixels = lambda item: a6stego.payloadPixels(item,bits)
+            return self._encodeFrames(encode,pixels,payload)
+        if isinstance(payload,str):
+            payload = payload.encode('utf-8')
+        self._logOperation('encodeBytes',payload,bits)
+        current=self.getCurrent()
+        if not a6stego.encodeBytes(current.getData(),payload,bits):
+            return False
+        current.markFlatDirty(0,a6stego.payloadPixels(payload,bits))
+        return True
+
+
+    def decodeBytes(self):
+        """
+        Returns: The binary payload stored in the current image.
+
+        If no payload is detected, or it does not match its checksum, it returns None.
+        An image without a payload is rejected after reading only its header pixels.
+        In a batch, this is the list of the payloads of each frame.
+        """
+        if self._frames > 1:
+            return self._decodeFrames(a6stego.decodeBytes)
+        current=self.getCurrent()
+        return a6stego.decodeBytes(current.getData())
+
+    
+    
+    # HELPER FUNCTIONS
+    def _logOperation(self, name, *args):
+        """
+        Logs that the method name was called with args on the current image.
+        
+        This waits for any full resolution calls still running first, and throws away
+        the pyramid of the current image, which the operation is about to change.  The
+        first time a logged call (see _logged) logs, this remembers the log, the version
+        of the current image and the redo stack, in case the call raises.
+        
+        Parameter name: The method name
+        Precondition: name is a str naming an editing method of this object
+        
+        Parameter args: The method arguments
+        Precondition: NONE
+        """
+        self._wait()
+        current = a6history.ImageHistory.getCurrent(self)
+        current.clearPyramid()
+        if getattr(_CALL,'active',False) and _CALL.state is None:
+            _CALL.state = (len(self._log[-1]),current.getVersion(),self._redo)
+        a6history.ImageHistory._logOperation(self,name,*args)
+    
+    
+    def _preview(self, name, *args):
+        """
+        Returns: True if the call was previewed (and queued), False if it should run now.
+        
+        In preview mode, this runs the operation on the preview (a copy of the right 
+        pyramid level, the first time), and queues the whole call to run at full 
+        resolution on the background thread.  It returns False when not in preview
+        mode, for batches, and on the background thread itself.
+        
+        Parameter name: The method name
+        Precondition: name is 'increment', or a method with a line that calls this
+        
+        Parameter args: The method arguments
+        Precondition: args are valid arguments for that method
+        """
+        if self._display is None or self._frames > 1 or getattr(_WORKER,'active',False):
+            return False
+        start = time.perf_counter()
+        if name != 'increment':
+            if self._previewImage is None:
+                current = a6history.ImageHistory.getCurrent(self)
+                level = current.findLevel(*self._display)
+                self._previewImage  = current.getLevel(level).copy()
+                self._previewFactor = 2**level
+            _run_preview(self._previewImage,name,args,self._previewFactor,
+                         self.PREVIEW_SCALING)
+        latency = [name,time.perf_counter()-start,None]
+        self._latencies.append(latency)
+        self._jobs.append(self._executor.submit(self._runJob,name,args,latency,start,
+                                                a6tiles.getProgress()))
+        return True
+    
+    
+    def _runJob(self, name, args, latency, start, progress):
+        """
+        Runs the method name at full resolution (on the background thread).
+        
+        The call reports to the progress function of the thread that made it (see
+        a6tiles.setProgress), so a job (see the module a6jobs) can still follow and
+        cancel it.
+        
+        Parameter name: The method name
+        Precondition: name is a method of this object
+        
+        Parameter args: The method arguments
+        Precondition: args are valid arguments for that method
+        
+        Parameter latency: The latency entry to finish
+        Precondition: latency is a list [name, float, None]
+        
+        Parameter start: The time of the original call (from time.perf_counter)
+        Precondition: start is a float
+        
+        Parameter progress: The progress function of the calling thread
+        Precondition: progress is None or a callable taking two ints
+        """
+        _WORKER.active = True
+        a6tiles.setProgress(progress)
+        try:
+            getattr(self,name)(*args)
+        finally:
+            _WORKER.active = False
+            a6tiles.setProgress(None)
+        latency[2] = time.perf_counter()-start
+    
+    
+    def _wait(self):
+        """
+        Waits for every full resolution call to finish, and drops the preview.
+        
+        This does nothing on the background thread.  If a call raised an error, it
+        is raised again here.
+        """
+        if not self._jobs or getattr(_WORKER,'active',False):
+            return
+        jobs = self._jobs
+        self._jobs = []
+        self._previewImage = None
+        for job in jobs:
+            job.result()
+    
+    
+    def _defer(self, name, *args):
+        """
+        Returns: True if the operation was deferred, False if it should run now.
+        
+        In deferred mode, this records the operation in the graph.
+        
+        Parameter name: The operation name
+        Precondition: name is in a6lazy.POINT_OPERATIONS or a6lazy.GEOMETRIC_OPERATIONS
+        
+        Parameter args: The operation arguments
+        Precondition: NONE
+        """
+        if not self._deferred:
+            return False
+        self._graph.add(name,args)
+        return True
+    
+    
+    def _runKernel(self, name, *args):
+        """
+        Runs the band kernel for operation name on the current image.
+        
+        The kernel runs on the scheduler if there is one, and directly on the whole
+        image otherwise.  Memory-mapped images are always streamed one band at a time,
+        so they never have to fit in memory.
+        
+        Parameter name: The operation name
+        Precondition: name is a key of a6tiles.KERNELS
+        
+        Parameter args: The operation arguments
+        Precondition: args are valid arguments for that operation
+        """
+        current = self.getCurrent()
+        key = self._resultKey(current)
+        if key is not None and self._cache.restore(key,current):
+            self._keys[current] = (len(self._log[-1]),key,current.getVersion())
+            return
+        if (self._scheduler is None or current.isMapped() or 
+            (self._frames > 1 and name not in a6tiles.POINTWISE)):
+            a6tiles.runKernel(current,name,args,self._frames)
+        else:
+            self._scheduler.run(current,name,args)
+        self._remember(current,key)
+    
+    
+    def _runTransform(self, name):
+        """
+        Runs the geometric operation name on the current image.
+        
+        Parameter name: The operation name
+        Precondition: name is in a6lazy.GEOMETRIC_OPERATIONS
+        """
+        current = self.getCurrent()
+        key = self._resultKey(current)
+        if key is not None and self._cache.restore(key,current):
+            self._keys[current] = (len(self._log[-1]),key,current.getVersion())
+            return
+        a6tiles.runTransform(current,name,frames=self._frames)
+        self._remember(current,key)
+    
+    
+    def _resultKey(self, current):
+        """
+        Returns: The cache key of the result of the operation just logged, or None
+        
+        The operation being run is the last one in the log of current, and the pixels
+        of current are the result of all of the others.  The key is derived from the 
+        last known key of current, one logged operation at a time.  If there is no
+        known key, the pixels of current have changed since it was known (see 
+        Image.getVersion), or the chain is broken by an argument with no stable key,
+        current is hashed in full.  The result is None if there is no cache, current is 
+        memory-mapped, or the last operation has no stable key.
+        
+        Parameter current: The current image
+        Precondition: current is the current Image object, with no deferred operations
+        """
+        if self._cache is None or current.isMapped():
+            return None
+        log = self._log[-1]
+        position, key, version = self._keys.get(current,(0,None,None))
+        if version != current.getVersion():
+            key = None
+        if key is not None:
+            for name, args in log[position:-1]:
+                key = a6cache.deriveKey(key,name,args)
+                if key is None:
+                    break
+        if key is None:
+            key = a6cache.contentKey(current)
+            if self._frames > 1:
+                key = a6cache.deriveKey(key,'frames',(self._frames,))
+        name, args = log[-1]
+        return a6cache.deriveKey(key,name,args)
+    
+    
+    def _remember(self, current, key):
+        """
+        Stores current as the cached result for key, and remembers that it is its key.
+        
+        This does nothing if key is None.
+        
+        Parameter current: The current image, just computed
+        Precondition: current is the current Image object
+        
+        Parameter key: The key from _resultKey
+        Precondition: key is a bytes object or None
+        """
+        if key is None:
+            return
+        self._cache.store(key,current)
+        self._keys[current] = (len(self._log[-1]),key,current.getVersion())
+    
+    
+    def _encodeFrames(self, encode, pixels, messages):
+        """
+        Returns: The list of the results of hiding each message in its frame
+        
+        Only the start of each frame that the message needs is copied out and back,
+        so a short message in a big frame is cheap.
+        
+        Parameter encode: Hides a message, called as encode(data,message)
+        Precondition: encode is a6stego.encodeText, or a6stego.encodeBytes with bits
+        
+        Parameter pixels: The pixels that encode changes, called as pixels(message)
+        Precondition: pixels matches encode (see a6stego.textPixels)
+        
+        Parameter messages: The message for each frame
+        Precondition: messages is a tuple of getFrameCount() valid messages for encode
+        """
+        current = self.getCurrent()
+        data    = current.getData()
+        length  = current.getLength()//self._frames
+        results = []
+        for k, message in enumerate(messages):
+            count = min(length,pixels(message))
+            start = k*length
+            head  = data[3*start:3*(start+count)]
+            results.append(encode(head,message))
+            if results[-1]:
+                data[3*start:3*(start+count)] = head
+                current.markFlatDirty(start,start+count)
+        return results
+    
+    
+    def _decodeFrames(self, decode):
+        """
+        Returns: The list of the messages decoded from each frame
+        
+        Parameter decode: Reads a message, called as decode(data)
+        Precondition: decode is a6stego.decodeText or a6stego.decodeBytes
+        """
+        current = self.getCurrent()
+        data    = current.getData()
+        size    = 3*current.getLength()//self._frames
+        return [decode(data[pos:pos+size]) for pos in range(0,len(data),size)]
+    
+    
+    def _drawVBar(self, col, pixel):
+        """
+        Draws a vertical bar on the current image at the given coloumn.
+        
+        This method draws a vertical 4-pixel-wide bar at the given coloumn of the current
+        image. This means that the bar includes the pixels coloumn, coloumn+1, coloumn+2 and coloumn+3.
+        The bar uses the color given by the pixel value.
+        
+        Parameter col: The start of the coloumn to draw the bar
+        Precondition: col is an int, with 0 <= col  &&  col+3 < image width
+        
+        Parameter pixel: The pixel color to use
+        Precondition: pixel is a 3-element tuple (r,g,b) where each value is 0..255
+        """
+        current = self.getCurrent()
+        current.fillRegion(0,col,current.getHeight(),4,pixel)
+        
+        
+    def _drawHBar(self, row, pixel):
+        """
+        Draws a horizontal bar on the current image at the given row.
+        
+        This method draws a horizontal 3-pixel-wide bar at the given row of the current
+        image. This means that the bar includes the pixels row, row+1, and row+2.
+        The bar uses the color given by the pixel value.
+        
+        Parameter row: The start of the row to draw the bar
+        Precondition: row is an int, with 0 <= row  &&  row+2 < image height
+        
+        Parameter pixel: The pixel color to use
+        Precondition: pixel is a 3-element tuple (r,g,b) where each value is 0..255
+        """
+        current = self.getCurrent()
+        current.fillRegion(row,0,3,current.getWidth(),pixel)
+    
+    
+    def _decode_pixel(self, pos):
+        """
+        Returns: the number n that is hidden in pixel pos of the current image.
+        
+        This function assumes that the value was a 3-digit number encoded as the
+        last digit in each color channel (e.g. red, green and blue).
+        
+        Parameter pos: a pixel position
+        Precondition: pos is an int with  0 <= p < image length (as a 1d list)
+        """
+        rgb = self.getCurrent().getFlatPixel(pos)
+        red   = rgb[0]
+        green = rgb[1]
+        blue  = rgb[2]
+        return  (red % 10) * 100  +  (green % 10) * 10  +  blue % 10
+    
+    
+    def _encode_pixel(self,letter,pos):
+        """
+        Procedure:encodes a letter into the pixel pos of the current image.
+        
+        This function assumes that the letter's ASCII value is a 3-digit number
+        
+        For the pixel overflow problem the issue will be solved as follows:
+        if the r,g or b value exceeds 255 through encoding then the new value-10
+        will be used to reassign the pixel value as the message encoded will still
+        be retained
+        
+        Parameter letter: the letter to encode
+        Precondition: letter is a string of length 1
+        
+        Parameter pos: a pixel position
+        Precondition: pos is an int with  0 <= p < image length (as a 1d list)
+        """
+        a=ord(letter)
+        b=str(a)
+        if len(b)==2:
+            b='0'+b
+        elif len(b)==1:
+            b='00'+b
+        rgb = self.getCurrent().getFlatPixel(pos)
+        v1=str(rgb[0])
+        v2=str(rgb[1])
+        v3=str(rgb[2])
+        n1=v1[0:2]+b[0]
+        n2=v2[0:2]+b[1]
+        n3=v3[0:2]+b[2]
+        if int(n1)>255:
+            n1=str(int(n1)-10)
+        if int(n2)>255:
+            n2=str(int(n2)-10)
+        if int(n3)>255:
+            n3=str(int(n3)-10)
+        pixel=(int(n1),int(n2),int(n3))
+        
+        self.getCurrent().setFlatPixel(pos,pixel)
+    
+
+# The state of the preview thread (active is True while it runs a call)
+_WORKER = threading.local()
+
+
+def _run_preview(image, name, args, factor, scaling):
+    """
+    Runs the operation name on the preview image.
+    
+    Point operations are applied as one lookup table.  Arguments measured in pixels
+    are scaled down to the pyramid level (see Editor.PREVIEW_SCALING).
+    
+    Parameter image: The preview image to modify
+    Precondition: image is an Image object
+    
+    Parameter name: The operation
+    Precondition: name is an Editor method that calls _preview
+    
+    Parameter args: The method arguments
+    Precondition: args are valid arguments for that method
+    
+    Parameter factor: How many times smaller the preview is than the full image
+    Precondition: factor is an int > 0
+    
+    Parameter scaling: How to scale the arguments
+    Precondition: scaling is Editor.PREVIEW_SCALING
+    """
+    if name in a6lazy.GEOMETRIC_OPERATIONS:
+        a6tiles.runTransform(image,name)
+    elif name in a6lazy.POINT_OPERATIONS:
+        a6tiles.runKernel(image,'applyLUT',(a6lut.operationLUT(name,args),))
+    else:
+        if name in scaling:
+            args = scaling[name](args,factor)
+        a6tiles.runKernel(image,name,args)
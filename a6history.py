@@ -3,7 +3,8 @@ The main class for our imager application.
 
 This modules contains a single class.  Instances of this class support an edit history.
 An edit history keeps track of all modifications of an original history.  It allows for 
-(step-by-step) undos of any changes.
+(step-by-step) undos and redos of any changes.  The older edits are stored compactly, as 
+ImageDelta objects (also defined in this module).
 
 Based on an original file by Dexter Kozen (dck10) and Walker White (wmw2)
 
@@ -14,26 +15,391 @@ Kartikay Jain kj295
 11/15/2017
 """
 import a6image
+import a6buffer
+import a6kernels
+import threading
+import zlib
+from concurrent import futures
+
+
+# The inverse of each operation that can be undone by applying another operation.
+# These operations are stored in the history as a name, not as pixel data.
+INVERSES = {'invert':'invert', 'transpose':'transpose', 'reflectHori':'reflectHori',
+            'reflectVert':'reflectVert', 'rotateRight':'rotateLeft',
+            'rotateLeft':'rotateRight'}
+
+
+class ImageDelta(object):
+    """
+    A class that stores the changes needed to restore an earlier image state.
+    
+    A delta is computed from an earlier image and the image that was edited from it.
+    Applying the delta to the edited image gives back (a copy of) the earlier one.  A 
+    delta is stored in one of four ways.  A memory-mapped earlier image is always a 
+    'snapshot'; otherwise the delta is whichever of the other three is smallest:
+    
+        'operation': The edit was a sequence of invertible operations (such as invert
+                     or transpose), so we just store their names.
+        'runs':      The changed bytes of the earlier image, in chunks of at most 
+                     TILE_BYTES (just the changed dirty pixels, when they are known).
+        'frame':     The whole earlier image (a keyframe).  This is also what is
+                     stored when there is no later image.
+        'snapshot':  The earlier image itself, when it is memory-mapped.  Its pixels
+                     are in a sibling file (see the module a6mapped), not in memory.
+    
+    The bytes of a 'runs' or 'frame' delta can be compressed with zlib by calling the
+    method compress.  This is safe to do from another thread; apply decompresses them
+    again as needed.
+    
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _kind:       The storage kind  [one of 'operation','runs','frame','snapshot']
+        _width:      The width of the earlier image   [int > 0]
+        _operations: The edits, in order              [tuple of str, empty if not 'operation']
+        _layout:     Where the stored bytes go        [list of (int offset, int length)]
+        _rawsize:    The total of the layout lengths  [int >= 0]
+        _lock:       Guards _chunks and _packed       [threading.Lock]
+        _snapshot:   The earlier image                [MappedImage, or None if not 'snapshot']
+    
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _chunks:     The stored bytes, one per layout entry [list of bytes, or None]
+        _packed:     The zlib compressed stored bytes       [bytes, or None]
+    Exactly one of _chunks and _packed is None.
+    """
+    
+    # The size (in bytes) of the chunks compared when computing a delta
+    TILE_BYTES = 3*4096
+    
+    # Changed chunks at most this many bytes apart are stored as one run
+    GAP_BYTES = 48
+    
+    # The zlib compression level used by compress
+    COMPRESSION_LEVEL = 1
+    
+    # GETTERS
+    def getKind(self):
+        """
+        Returns: The storage kind of this delta ('operation', 'runs', 'frame' or 'snapshot')
+        """
+        return self._kind
+    
+    
+    def getRawSize(self):
+        """
+        Returns: The number of pixel bytes stored by this delta, before compression
+        """
+        return self._rawsize
+    
+    
+    def getSize(self):
+        """
+        Returns: The number of bytes this delta currently takes up
+        
+        This is the compressed size if the delta has been compressed.
+        """
+        with self._lock:
+            if self._packed is not None:
+                return len(self._packed)
+            return self._rawsize
+    
+    
+    def isCompressed(self):
+        """
+        Returns: True if the bytes of this delta are currently compressed
+        """
+        return self._packed is not None
+    
+    # INITIALIZER
+    def __init__(self, earlier, later, operations=(), dirty=None):
+        """
+        Initializer: Creates the delta that restores earlier from later.
+        
+        If operations is not empty, it lists the edits that turned earlier into later.
+        When these are all invertible (see INVERSES), and undoing them really does give
+        back earlier, the delta just stores their names.  Otherwise, it compares the two
+        images and stores the chunks that changed, or the whole earlier image if the
+        sizes differ or most of the image changed.  If the pixels of later that can
+        differ are known (dirty), only those pixels are compared, and only those that
+        changed are stored, so a change to a few pixels in every row (such as a 
+        vertical bar) stores just those pixels.
+        
+        If earlier is memory-mapped, the delta just keeps earlier (a sibling file), so
+        that no pixels are ever loaded into memory.
+        
+        Parameter earlier: The image state to restore
+        Precondition: earlier is an Image object
+        
+        If later is None, the delta stores all of earlier (a 'frame', or a 'snapshot' if
+        earlier is memory-mapped), and can be applied to any image, or to None.
+        
+        Parameter later: The image state that was edited from earlier
+        Precondition: later is None or an Image object with the same length as earlier
+        
+        Parameter operations: The names of the edits applied to earlier
+        Precondition: operations is a sequence of str
+        
+        Parameter dirty: The flat pixel ranges outside of which later equals earlier
+        Precondition: dirty is None (for unknown) or a sorted list of (start, stop) 
+        pairs, as returned by Image.getDirtyRanges
+        """
+        self._kind = 'operation'
+        self._width = earlier.getWidth()
+        self._operations = ()
+        self._layout = []
+        self._chunks = []
+        self._packed = None
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._rawsize = 0
+        
+        if earlier.isMapped():
+            self._kind = 'snapshot'
+            self._snapshot = earlier
+            return
+        
+        old = earlier.getData()
+        if later is None:
+            self._kind = 'frame'
+            self._layout = [(0,len(old))]
+            self._chunks = [bytes(old)]
+            self._rawsize = len(old)
+            return
+        
+        new = later.getData()
+        operations = tuple(operations)
+        if operations and all(op in INVERSES for op in operations):
+            undone = _undo_operations(new,later.getWidth(),operations)
+            if undone == (old,self._width):
+                self._operations = operations
+                return
+        
+        self._kind = 'frame'
+        self._layout = [(0,len(old))]
+        if earlier.getWidth() == later.getWidth():
+            runs = []
+            for pos, stop in _spans(len(old),ImageDelta.TILE_BYTES,dirty):
+                if old[pos:stop] != new[pos:stop]:
+                    if runs and pos-runs[-1][1] <= ImageDelta.GAP_BYTES:
+                        runs[-1][1] = stop
+                    else:
+                        runs.append([pos,stop])
+            if sum(run[1]-run[0] for run in runs) <= len(old)//2:
+                self._kind = 'runs'
+                self._layout = [(start,stop-start) for start, stop in runs]
+        
+        self._chunks = [bytes(old[pos:pos+length]) for pos, length in self._layout]
+        self._rawsize = sum(length for pos, length in self._layout)
+    
+    # ADDITIONAL METHODS
+    def apply(self, image):
+        """
+        Returns: A new image equal to the earlier image state
+        
+        This method does not modify image.  If the delta is compressed, it is 
+        decompressed for the duration of this call only.  A 'snapshot' delta returns
+        the earlier image it kept, so it should only be applied once.
+        
+        Parameter image: The later image state (the one this delta was computed from)
+        Precondition: image is an Image object
+        """
+        if self._kind == 'snapshot':
+            return self._snapshot
+        if self._kind == 'operation':
+            data = _undo_operations(image.getData(),image.getWidth(),
+                                    self._operations)[0]
+            return a6image.Image(a6buffer.PixelBuffer(data),self._width)
+        
+        with self._lock:
+            chunks = self._chunks
+            packed = self._packed
+        if chunks is None:
+            whole = zlib.decompress(packed)
+            chunks = []
+            start = 0
+            for pos, length in self._layout:
+                chunks.append(whole[start:start+length])
+                start += length
+        
+        if self._kind == 'frame':
+            data = bytearray(chunks[0])
+        else:
+            data = image.getData()[:]
+            for (pos, length), chunk in zip(self._layout,chunks):
+                data[pos:pos+length] = chunk
+        return a6image.Image(a6buffer.PixelBuffer(data),self._width)
+    
+    
+    def compress(self):
+        """
+        Compresses the stored bytes of this delta with zlib.
+        
+        This does nothing if the delta is already compressed or stores no bytes.  The
+        compression itself happens outside of the lock (zlib releases the GIL), so it
+        can run on a background thread while the delta is still being used.
+        """
+        with self._lock:
+            chunks = self._chunks
+        if chunks is None or self._rawsize == 0:
+            return
+        packed = zlib.compress(b''.join(chunks),ImageDelta.COMPRESSION_LEVEL)
+        with self._lock:
+            self._packed = packed
+            self._chunks = None
+
+
+def _spans(length, size, dirty):
+    """
+    Returns: The byte spans (start, stop) to compare, in order
+    
+    These are all of the chunks of size bytes if dirty is None.  Otherwise they are the
+    bytes of the dirty ranges, with each range split into chunks of at most size bytes.
+    
+    Parameter length: The number of pixel bytes
+    Precondition: length is an int >= 0
+    
+    Parameter size: The chunk size
+    Precondition: size is an int > 0
+    
+    Parameter dirty: The flat pixel ranges that may have changed
+    Precondition: dirty is None or a sorted list of (start, stop) pairs
+    """
+    if dirty is None:
+        return [(pos,min(pos+size,length)) for pos in range(0,length,size)]
+    spans = []
+    for start, stop in dirty:
+        end = min(3*stop,length)
+        spans.extend((pos,min(pos+size,end)) for pos in range(3*start,end,size))
+    return spans
+
+
+def _compressor():
+    """
+    Returns: The thread pool used to compress deltas in the background
+    
+    The pool has a single worker thread, and is created the first time it is needed.
+    """
+    global _COMPRESSOR
+    if _COMPRESSOR is None:
+        _COMPRESSOR = futures.ThreadPoolExecutor(1,'a6history-compress')
+    return _COMPRESSOR
+
+# The background compression pool (see _compressor)
+_COMPRESSOR = None
+
+
+def _resident_bytes(image):
+    """
+    Returns: The number of pixel bytes of image held in memory
+    
+    This is 0 for a memory-mapped image, since its pixels are in a file.
+    
+    Parameter image: The image to measure
+    Precondition: image is an Image object
+    """
+    if image.isMapped():
+        return 0
+    return 3*image.getLength()
+
+
+def _undo_operations(data, width, operations):
+    """
+    Returns: The pair (bytes, width) after undoing the operations on a copy of data
+    
+    The bytes are a new bytearray, and width is the image width once the operations
+    are undone.
+    
+    Parameter data: The raw pixel bytes after the operations
+    Precondition: data is a bytearray of interleaved RGB bytes
+    
+    Parameter width: The image width after the operations
+    Precondition: width is an int > 0 that evenly divides len(data)//3
+    
+    Parameter operations: The operations that were applied, in order
+    Precondition: operations is a sequence of keys of INVERSES
+    """
+    data = data[:]
+    height = len(data)//(3*width)
+    for op in reversed(operations):
+        inverse = INVERSES[op]
+        if inverse == 'invert':
+            a6kernels.invert(data)
+        else:
+            getattr(a6kernels,inverse)(data,width,height)
+            if inverse not in ('reflectHori','reflectVert'):
+                width, height = height, width
+    return (data,width)
+
 
 class ImageHistory(object):
     """
     A class that keeps track of edits from an original image.
     
     This class is what allows us to implement the Undo functionality in our application.
-    The attribute _history stores all of the edits (up to a maximum of MAX_HISTORY edits)
-    in order.  So the last element of _history is the most recent edit.
+    It keeps track of all of the edits (up to a maximum of MAX_HISTORY states, including
+    the current one) in order.
+    
+    Each state also has an operation log: the Editor methods (and their arguments) that
+    were applied to it after it was added with increment.  Undone states are kept on a 
+    redo stack as just their logs, so redo replays the log on the current image.  Every
+    KEYFRAME_INTERVAL states, and for every state whose log is empty (its changes were
+    not made by logged methods), the undone image is kept too, as a compressed keyframe
+    that redo restores without replaying anything.  Clearing the history undoes every
+    state onto the redo stack, so the edits can all be redone afterwards.  Any new edit
+    (or increment) discards the redo stack.
+    
+    To save memory, only two states are kept as full images: the current image and the
+    one before it.  The older states are stored as ImageDelta objects, each of which
+    restores a state from the one after it.  So undo only ever has to apply one delta.
+    All but the newest UNCOMPRESSED_DELTAS deltas are compressed with zlib, on a 
+    background thread if COMPRESS_IN_BACKGROUND is True.
+    
+    The history is also limited by memory.  When the bytes used by the history (see
+    getResidentBytes and getCompressedBytes) are more than MAX_BYTES, the oldest deltas
+    are deleted.  The current and previous images are always kept.
+    
+    If the original image is memory-mapped (see the module a6mapped), every state is a
+    mapped sibling file, so the history takes up disk space rather than memory.
+    
+    The image added by increment starts with no dirty pixels (see Image.getDirtyRanges).
+    If nothing clears them before the next increment, and the image has kept track of
+    every change (see Image.isTracked), the delta for that state only compares the 
+    dirty pixels.  Otherwise it compares the whole image.
     
     IMMUTABLE ATTRIBUTES (Fixed after initialization)
-        _original: The original image [Image object]
-        _history:  The edit history   [non-empty list of Image objects]
-    In addition, the length of _history should never be longer than the class attribute 
-    MAX_HISTORY.
+        _original:   The original image                   [Image object]
+        _current:    The most recent edit                 [Image object]
+        _previous:   The state before the current one     [Image object, or None]
+        _deltas:     Restores the older states, in order  [list of ImageDelta objects]
+        _operations: The named edits since the last increment [list of str]
+        _pending:    Unfinished background compressions   [list of Future objects]
+        _log:        The operation log of each state      [list of lists of (str, tuple)]
+        _redo:       The undone states, the next one last [list of (tuple, ImageDelta or None)]
+        _tracked:    Whether the current image was copied from the previous one [bool]
+    If _previous is None, then _deltas is empty.  The number of states is 1 if _previous
+    is None and len(_deltas)+2 otherwise; this should never be more than the class 
+    attribute MAX_HISTORY.  There is one log per state, so len(_log) is the number of 
+    states.  The log of the oldest state includes the logs of the states deleted before 
+    it.  Each redo entry is the log of an undone state and its keyframe (if it has one).
+    If _tracked is True, the dirty pixels of the current image (unless they have been
+    cleared, or the image is no longer tracked) cover every change since the previous
+    state.
     """
     
     # The number of edits that we are allowed to keep track of.
     # (THIS GOES IN CLASS FOLDER)
     MAX_HISTORY = 20
     
+    # The number of bytes the history may use (None for no limit)
+    MAX_BYTES = 512*1024*1024
+    
+    # The number of newest deltas that are never compressed
+    UNCOMPRESSED_DELTAS = 1
+    
+    # Whether to compress the older deltas on a background thread
+    COMPRESS_IN_BACKGROUND = True
+    
+    # Undone states at positions that are multiples of this keep a keyframe for redo
+    KEYFRAME_INTERVAL = 4
+    
     # GETTERS
     def getOriginal(self):
         """
@@ -46,7 +412,68 @@ class ImageHistory(object):
         """
         Returns: The most recent edit
         """
-        return self._history[-1]
+        return self._current
+    
+    
+    def getDepth(self):
+        """
+        Returns: The number of states in the edit history, including the current one
+        """
+        if self._previous is None:
+            return 1
+        return len(self._deltas)+2
+    
+    
+    def getRedoDepth(self):
+        """
+        Returns: The number of undone states that redo can restore
+        """
+        return len(self._redo)
+    
+    
+    def getLog(self):
+        """
+        Returns: The operation log of every state, oldest first
+        
+        Each log is a tuple of (name, args) pairs, one for each logged Editor method 
+        applied to that state.  The log of the oldest state starts from the original
+        image.
+        """
+        return [tuple(log) for log in self._log]
+    
+    
+    def getResidentBytes(self):
+        """
+        Returns: The number of uncompressed pixel bytes held by this history
+        
+        This is the current image, the previous image (if any) and every delta that is
+        not compressed.  Memory-mapped images are in files, so they are not counted.
+        """
+        total = _resident_bytes(self._current)
+        if self._previous is not None:
+            total += _resident_bytes(self._previous)
+        for delta in self._stored():
+            if not delta.isCompressed():
+                total += delta.getSize()
+        return total
+    
+    
+    def getCompressedBytes(self):
+        """
+        Returns: The number of bytes held by the compressed deltas of this history
+        
+        This includes the keyframes on the redo stack.
+        """
+        return sum(delta.getSize() for delta in self._stored() if delta.isCompressed())
+    
+    
+    def getUncompressedBytes(self):
+        """
+        Returns: The number of bytes the compressed deltas would take uncompressed
+        
+        Comparing this to getCompressedBytes gives the compression ratio.
+        """
+        return sum(delta.getRawSize() for delta in self._stored() if delta.isCompressed())
     
     # INITIALIZER
     def __init__(self,original):
@@ -60,7 +487,8 @@ class ImageHistory(object):
         Precondition: original is an Image object
         """
         self._original=original
-        self._history=[original.copy()]
+        self._current=None
+        self.clear()
     
     # EDIT METHODS
     def undo(self):
@@ -68,15 +496,34 @@ class ImageHistory(object):
         Returns: True if the latest edit can be undone, False otherwise.
         
         This method attempts to undo the latest element by removing the last element
-        of the edit history.  However, the invariant of _history specifies that the
-        list can never be empty.  So in that case, it does not remove anything and
-        returns False instead.
+        of the edit history.  However, the history can never be empty.  So in that 
+        case, it does not remove anything and returns False instead.
+        
+        The state before the current one becomes the current image, and the newest
+        delta (if any) is applied to it to rebuild the state before that.  The undone
+        state goes on the redo stack.
         """
-        if len(self._history)>1:
-            self._history.pop(-1)
-            return True
-        else:
+        if self._previous is None:
             return False
+        self._pushRedo(self._current)
+        self._restorePrevious()
+        return True
+    
+    
+    def rollback(self):
+        """
+        Returns: True if the latest edit was discarded, False otherwise.
+        
+        This is like undo, except that the discarded state does not go on the redo
+        stack, so it can never be redone.  It is for backing out of an edit that did
+        not finish (see the module a6jobs), whose pixels are not worth keeping.  The
+        redo stack is left as it was.
+        """
+        if self._previous is None:
+            return False
+        self._log.pop()
+        self._restorePrevious()
+        return True
     
     
     def clear(self):
@@ -84,9 +531,32 @@ class ImageHistory(object):
         Deletes the entire edit history, retoring the original image.
         
         When this method completes, the object should have the same values that it did
-        when it was first initialized.
+        when it was first initialized, except that every state is on the redo stack.
+        The states are undone one at a time to get there, so the keyframes are made
+        from the images that undo rebuilds anyway.  The oldest state only goes on the
+        redo stack if it differs from the original image (because older states were
+        deleted, or it was edited before the first increment); otherwise redoing it
+        would just add a copy of the original.
         """
-        self._history=[self._original.copy()]
+        redo=[]
+        pending=[]
+        if self._current is not None:
+            while self.undo():
+                pass
+            current=self._current
+            if (current.getWidth()!=self._original.getWidth() or 
+                current.getPixels()!=self._original.getPixels()):
+                self._pushRedo(current)
+            redo=self._redo
+            pending=self._pending
+        self._current=self._original.copy()
+        self._previous=None
+        self._tracked=False
+        self._deltas=[]
+        self._operations=[]
+        self._pending=pending
+        self._log=[[]]
+        self._redo=redo
      
      
     def increment(self):
@@ -98,9 +568,243 @@ class ImageHistory(object):
         preserved. If this method causes the history to grow to larger (greater than 
         MAX_HISTORY), this method deletes the oldest edit to ensure the invariant is 
         satisfied.
+        
+        The state that was previous until now is replaced by a delta against the
+        most recent edit, using the operations recorded since the last increment.
+        This discards the redo stack.
+        """
+        self._redo=[]
+        self._push(self._current.copy(),[],True)
+    
+    
+    def redo(self):
+        """
+        Returns: True if an undone edit was restored, False otherwise.
+        
+        This method adds the most recently undone state back to the end of the history.
+        If that state has a keyframe, the keyframe is restored.  Otherwise, its logged
+        operations are replayed on a copy of the current image, which costs one step of
+        work.  If there is nothing to redo, this returns False.
+        
+        If replaying the log raises an error, the restored state is discarded again and
+        put back on the redo stack (with the rest of the stack) before the error is 
+        raised.
+        """
+        if not self._redo:
+            return False
+        redo=self._redo
+        log, keyframe=redo.pop()
+        try:
+            if keyframe is not None:
+                self._push(keyframe.apply(None),list(log),False)
+            else:
+                self._push(self._current.copy(),[],True)
+                try:
+                    for name, args in log:
+                        getattr(self,name)(*args)
+                except BaseException:
+                    ImageHistory.rollback(self)
+                    redo.append((log,keyframe))
+                    raise
+        finally:
+            self._redo=redo
+        return True
+    
+    
+    def waitForCompression(self):
+        """
+        Waits until all of the background compressions have finished.
+        
+        This is useful before reading getResidentBytes and getCompressedBytes, since 
+        those change as the background thread compresses deltas.
+        """
+        for future in self._pending:
+            future.result()
+        self._pending=[]
+    
+    # HELPER METHODS
+    def _logOperation(self, name, *args):
+        """
+        Logs that the method name was called with args on the current image.
+        
+        Redo replays the log by calling the methods again, so name must be a method of
+        this object.  A new edit discards the redo stack.
+        
+        Parameter name: The method name
+        Precondition: name is a str naming an editing method of this object
+        
+        Parameter args: The method arguments
+        Precondition: NONE
+        """
+        self._log[-1].append((name,args))
+        self._redo=[]
+    
+    
+    def _forgetOperation(self, length, version, redo):
+        """
+        Takes back the operations logged by a call that raised an error.
+        
+        If the pixels of the current image did not change, the log is cut back to what
+        it was before the call, and the redo stack (discarded by the logging) is put 
+        back.  Otherwise the call changed the image part way, which replaying the log
+        cannot do, so the log of the current state is emptied: its changes are no 
+        longer known (and undo keeps a keyframe of it).
+        
+        Parameter length: The length of the log of the current state before the call
+        Precondition: length is an int >= 0
+        
+        Parameter version: The version of the current image before the call
+        Precondition: version is an int (see Image.getVersion)
+        
+        Parameter redo: The redo stack before the call
+        Precondition: redo is a list of (tuple, ImageDelta or None)
+        """
+        if self._current.getVersion()==version:
+            del self._log[-1][length:]
+            self._redo=redo
+        else:
+            self._log[-1]=[]
+    
+    
+    def _push(self, image, log, tracked):
+        """
+        Adds image, with the given operation log, to the end of the history.
+        
+        The state that was previous until now is replaced by a delta against the
+        current one.  If the history is now too long, or uses too many bytes, the 
+        oldest states are deleted.
+        
+        Parameter image: The new current image
+        Precondition: image is an Image object
+        
+        Parameter log: The operation log of image
+        Precondition: log is a list of (str, tuple) pairs
+        
+        Parameter tracked: Whether image is a fresh copy of the current image
+        Precondition: tracked is a bool
+        """
+        if self._previous is not None:
+            dirty=None
+            current=self._current
+            if (self._tracked and current.getDirtyGeneration()==0 and 
+                current.isTracked()):
+                dirty=current.getDirtyRanges()
+            delta=ImageDelta(self._previous,self._current,self._operations,dirty)
+            self._deltas.append(delta)
+            self._compressOlder()
+        self._previous=self._current
+        self._current=image
+        self._tracked=tracked
+        self._operations=[]
+        self._log.append(log)
+        if self.getDepth()>ImageHistory.MAX_HISTORY:
+            if self._deltas:
+                self._deltas.pop(0)
+            else:
+                self._previous=None
+            self._dropLog()
+        if ImageHistory.MAX_BYTES is not None:
+            while self._deltas and (self.getResidentBytes()+self.getCompressedBytes()
+                                    >ImageHistory.MAX_BYTES):
+                self._deltas.pop(0)
+                self._dropLog()
+    
+    
+    def _restorePrevious(self):
+        """
+        Makes the previous state the current one, once the current one has been saved
+        (or thrown away) and its log removed.
+        
+        The newest delta (if any) is applied to rebuild the state before that.
+        """
+        self._current=self._previous
+        if self._deltas:
+            self._previous=self._deltas.pop().apply(self._current)
+        else:
+            self._previous=None
+        self._operations=[]
+        self._tracked=False
+    
+    
+    def _dropLog(self):
+        """
+        Merges the log of the oldest state (which was just deleted) into the next one.
+        
+        The merged log replays both states from the original image.  If either log is
+        empty, the merged log is empty too, since an empty log means the changes are
+        not known.
+        """
+        oldest=self._log.pop(0)
+        if oldest and self._log[0]:
+            self._log[0]=oldest+self._log[0]
+        else:
+            self._log[0]=[]
+    
+    
+    def _pushRedo(self, image):
+        """
+        Puts the current state, which is about to be undone, on the redo stack.
+        
+        The state gets a keyframe (the compressed image) if its position is a multiple
+        of KEYFRAME_INTERVAL, if its log is empty, or if it is memory-mapped (then the
+        keyframe is just the mapped file).
+        
+        Parameter image: The current image
+        Precondition: image is the current Image object
+        """
+        log=self._log.pop()
+        keyframe=None
+        if (not log or image.isMapped() or
+            len(self._log)%ImageHistory.KEYFRAME_INTERVAL==0):
+            keyframe=ImageDelta(image,None)
+            self._compress(keyframe)
+        self._redo.append((tuple(log),keyframe))
+    
+    
+    def _stored(self):
+        """
+        Returns: The deltas of this history and the keyframes on its redo stack
+        """
+        return self._deltas+[keyframe for log, keyframe in self._redo 
+                             if keyframe is not None]
+    
+    
+    def _recordOperation(self, name):
+        """
+        Records that the current image was edited by the given operation.
+        
+        Operations in INVERSES let increment store the edit by name instead of as
+        pixel data.  Other names are allowed, but just make increment compare pixels.
+        
+        Parameter name: The operation name
+        Precondition: name is a str
+        """
+        self._operations.append(name)
+    
+    
+    def _compressOlder(self):
+        """
+        Compresses the delta that just stopped being one of the UNCOMPRESSED_DELTAS.
+        
+        Each delta passes this point exactly once, so each is compressed at most once.
+        """
+        index=len(self._deltas)-1-ImageHistory.UNCOMPRESSED_DELTAS
+        if index<0:
+            return
+        self._compress(self._deltas[index])
+    
+    
+    def _compress(self, delta):
+        """
+        Compresses delta, on the background thread if COMPRESS_IN_BACKGROUND is True.
+        
+        Parameter delta: The delta to compress
+        Precondition: delta is an ImageDelta object
         """
-        self._history.append(self.getCurrent().copy())
-        if len(self._history)>ImageHistory.MAX_HISTORY:
-            self._history.pop(0)
+        if not ImageHistory.COMPRESS_IN_BACKGROUND:
+            delta.compress()
+            return
+        self._pending=[future for future in self._pending if not future.done()]
+        self._pending.append(_compressor().submit(delta.compress))
         
 
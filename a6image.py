@@ -4,6 +4,9 @@ The main class for our imager application.
 This modules contains a single class.  Instances of this class support an image that can 
 be modified.  This is the main class needed to display images in the viewer.
 
+The module also has functions to read back images written with Image.serialize and
+Image.writeTo, a compact binary format of a small header followed by the raw pixels.
+
 Based on an original file by Dexter Kozen (dck10) and Walker White (wmw2)
 
 Author: Walker M. White (wmw2)
@@ -12,7 +15,38 @@ Date:    October 20, 2017 (Python 3 Version)
 Kartikay Jain kj295
 11/15/2017
 """
-import pixels   # So we can manipulate pixel data
+import io
+import pickle
+import struct
+import zlib
+
+try:
+    import pixels   # So we can manipulate pixel data
+except ImportError:
+    pixels = None   # Images can still be made from a PixelBuffer (see the module a6io)
+import a6buffer # Compact storage for the pixel data
+import a6integral
+import a6kernels
+
+
+# The first bytes of a serialized image
+MAGIC = b'A6IM'
+
+# The version of the serialized format
+VERSION = 1
+
+# The header of a serialized image: MAGIC, VERSION, flags, width and height
+HEADER = struct.Struct('>4sBBII')
+
+# The flag for a compressed serialized image
+COMPRESSED = 1
+
+# The number of pixel bytes compressed or decompressed at a time
+CHUNK_BYTES = 1024*1024
+
+# The most dirty rectangles an image keeps before merging them into their bounds
+MAX_DIRTY = 1024
+
 
 class Image(object):
     """
@@ -30,15 +64,39 @@ class Image(object):
     If you want to treat the image like a 1D list you use the methods `getFlatPixel` and
     `setFlatPixel`.  These methods are used by the steganography methods.
     
+    The pixels are stored in a PixelBuffer, which keeps them as one contiguous buffer
+    of interleaved RGB bytes.  If you want to work on all of the pixels at once, use
+    `getBuffer` to get the raw bytes without copying them.
+    
     IMMUTABLE ATTRIBUTES (Fixed after initialization)
-        _pixels: The underlying list of pixels      [Pixel object]
+        _pixels: The underlying list of pixels      [PixelBuffer object]
         _length: The number of pixels in the list   [int >= 0]
     
     MUTABLE ATTRIBUTES (Can be changed at any time)
-        _width:  The image width, which is the number of columns [int > 0]
-        _height: The image height, which is the number of rows   [int > 0]
+        _width:   The image width, which is the number of columns [int > 0]
+        _height:  The image height, which is the number of rows   [int > 0]
+        _pyramid: The scaled-down levels built so far, level 1 first [list of Image, or None]
+        _dirty:   The rectangles changed since the last clearDirty [list of [row, col, height, width]]
+        _cleared: The number of times clearDirty was called      [int >= 0]
+        _exposures: The value of _pixels.getExposures() when the dirty pixels were
+                  last known to cover every change       [int >= 0]
+        _version: The number of changes marked, plus the exposures since untracked [int >= 0]
     There is an additional invariant that width*height == length at all times.  So
     if you change width, you must change height.
+    
+    The pyramid (see getLevel) is built from the pixels when it is first needed.  It 
+    is thrown away when the width changes or applyLUT is called, but NOT when pixels 
+    are changed in other ways; call clearPyramid after doing that.  The Editor does so
+    for every operation.
+    
+    The image also keeps track of which pixels have changed (see getDirtyRects and
+    getDirtyRanges), so that redrawing and the edit history can skip the rest.  The
+    setters, the bulk access methods, swapPixels and applyLUT mark the pixels they
+    change.  Changes made straight to the pixel buffer (through getPixels or getBuffer)
+    are NOT marked, but the image notices that they might have happened, and stops
+    trusting its dirty pixels (see isTracked).  Code that changes the raw bytes from
+    getData must call markDirty or markFlatDirty itself; the Editor does so for every
+    operation.  A new image (or copy) has no dirty pixels.
     """
 
     # IMMUTABLE ATTRIBUTES
@@ -46,9 +104,36 @@ class Image(object):
         """
         Returns: the pixel list for this image
         
-        This pixel list is used by the GUI to display the image.
+        This pixel list is used by the GUI to display the image.  It is a PixelBuffer,
+        which supports the same operations as a Pixels object.
         """
         return self._pixels # implement me
+    
+    
+    def getBuffer(self):
+        """
+        Returns: A memoryview of the raw pixel bytes of this image
+        
+        The bytes are interleaved RGB in row-major order, so pixel (row, col) is in the
+        bytes 3*(row*width+col) to 3*(row*width+col)+2.  The view shares memory with 
+        this image; no pixel data is copied.
+        """
+        return self._pixels.getBuffer()
+
+
+    def getData(self):
+        """
+        Returns: The raw pixel bytes of this image, for code that marks its own changes
+        
+        This is the bytearray of the pixel buffer (an mmap if the image is mapped).  
+        Unlike getPixels().getData() and getBuffer(), it keeps the dirty pixels trusted
+        (see isTracked), so every change made through it MUST be marked with markDirty
+        or markFlatDirty.  The bytes must never be resized.
+        """
+        tracked=self.isTracked()
+        data=self._pixels.getData()
+        self._sync(tracked)
+        return data
 
 
     def getLength(self):
@@ -58,6 +143,16 @@ class Image(object):
         return self._length # implement me
     
     
+    def isMapped(self):
+        """
+        Returns: True if the pixels of this image are memory-mapped, False otherwise
+        
+        The pixels of a mapped image (see the module a6mapped) are in a file, and are
+        processed one band at a time instead of all at once.
+        """
+        return False
+    
+    
     # MUTABLE ATTRIBUTES
     def getWidth(self):
         """
@@ -83,8 +178,12 @@ class Image(object):
         assert value>0
         assert self.getLength()%value==0
         
-        self._width=value
-        self._height=self._length//self._width # implement me
+        if value!=self._width:
+            self._width=value
+            self._height=self._length//self._width # implement me
+            self._dirty=[[0,0,self._height,self._width]]
+            self._version+=1
+        self._pyramid=None
     
     
     def getHeight(self):
@@ -111,8 +210,12 @@ class Image(object):
         assert value>0
         assert self.getLength()%value==0
         
-        self._height=value
-        self._width=self._length//self._height
+        if value!=self._height:
+            self._height=value
+            self._width=self._length//self._height
+            self._dirty=[[0,0,self._height,self._width]]
+            self._version+=1
+        self._pyramid=None
         # implement me
     
     # INITIALIZER AND OPERATORS
@@ -129,8 +232,11 @@ class Image(object):
         The height is not given explicitly, so you must compute it from the width and
         pixel list length.
         
+        If data is a Pixels object, its pixels are copied into a new PixelBuffer.  If 
+        it is a PixelBuffer, the image uses it directly (it is not copied).
+        
         Parameter data: The image data as a pixel list
-        Precondition: data is a Pixels object
+        Precondition: data is a Pixels object or a PixelBuffer object
         
         Parameter width: The image width
         Precondition: width is an int > 0 and evenly divides the length of pixels
@@ -138,13 +244,20 @@ class Image(object):
         assert isinstance(width,int)
         assert width>0
         assert len(data)%width==0
-        assert isinstance(data, pixels.Pixels)
-        
+        assert isinstance(data, a6buffer.PixelBuffer) or (pixels is not None and
+                                                          isinstance(data, pixels.Pixels))
         
+        if not isinstance(data, a6buffer.PixelBuffer):
+            data=a6buffer.PixelBuffer(data)
         self._pixels=data
         self._width=width
         self._length=len(data)
         self._height=self._length//self._width
+        self._pyramid=None
+        self._dirty=[]
+        self._cleared=0
+        self._exposures=data.getExposures()
+        self._version=0
         # implement me
     
     
@@ -165,20 +278,32 @@ class Image(object):
         tuple of three numbers), this is handled automatically when it gets converted to
         a string.  Note there is one space between each pixel, but TWO spaces after each
         row.
+        
+        The string is built by writeText, which takes time linear in the image size.
+        """
+        result=io.StringIO()
+        self.writeText(result)
+        return result.getvalue()
+    
+    
+    def __reduce_ex__(self, protocol):
+        """
+        Returns: The information needed to pickle this image
+        
+        The image is pickled as its width and its raw pixel bytes.  With pickle protocol
+        5 or higher, the bytes are given as a PickleBuffer, so they can be sent out of 
+        band without being copied (see the pickle module).  A memory-mapped image is
+        pickled as an in-memory image with the same pixels.
+        
+        Parameter protocol: The pickle protocol
+        Precondition: protocol is an int >= 0
         """
-        result='['
-        k=self._width
-        s=self._height
-        newresult = ''
-        for x in range(s):
-            result2='['
-            for y in range(k):
-                t=self.getPixel(x,y)
-                result2+=str(t)+', '
-            result2=result2[:-2]
-            newresult+=result2+'],  '
-        newresult=newresult[:-3]
-        return result+newresult+']'
+        data = self.getData()
+        if protocol >= 5:
+            data = pickle.PickleBuffer(data)
+        elif not isinstance(data,bytearray):
+            data = bytes(data)
+        return (_restore, (data, self._width))
           
         
     # ACCESS METHODS
@@ -238,7 +363,10 @@ class Image(object):
         assert col>=0
         assert col<self._width
         
+        tracked=self.isTracked()
         self._pixels[row*self._width+col]=pixel
+        self._markDirty(row,col,1,1)
+        self._sync(tracked)
          # implement me
     
     
@@ -278,8 +406,185 @@ class Image(object):
         
         NOTE: DO NOT enforce any preconditions.  List the pixel list handle this for you.
         """
+        tracked=self.isTracked()
         self._pixels[n]=pixel # implement me
+        row, col = divmod(n%self._length,self._width)
+        self._markDirty(row,col,1,1)
+        self._sync(tracked)
     
+    def __buffer__(self, flags):
+        """
+        Returns: A memoryview of the raw pixel bytes (the Python 3.12 buffer protocol)
+        
+        This is what memoryview(image) calls, on Python 3.12 or later only.  Earlier
+        versions raise a TypeError instead; use getBuffer, which works on all of them.
+        
+        Parameter flags: The buffer request flags
+        Precondition: flags is an int
+        """
+        return self.getBuffer()
+
+    # BULK ACCESS METHODS
+    def getRow(self, row):
+        """
+        Returns: The raw RGB bytes of the given row (a copy, 3*width bytes long)
+
+        Parameter row: The pixel row
+        Precondition: row is an int >= 0 and < height
+        """
+        self._checkRegion(row,0,1,self._width)
+        stride = 3*self._width
+        return bytes(self.getData()[row*stride:(row+1)*stride])
+
+
+    def setRow(self, row, data):
+        """
+        Sets the given row to the raw RGB bytes data
+
+        Parameter row: The pixel row
+        Precondition: row is an int >= 0 and < height
+
+        Parameter data: The new pixel bytes
+        Precondition: data is a bytes-like object of length 3*width
+        """
+        self.setRegion(row,0,1,self._width,data)
+
+
+    def getRegion(self, row, col, height, width):
+        """
+        Returns: The raw RGB bytes of a rectangle of this image (a copy)
+
+        The rectangle has its top left corner at (row, col) and the given height and
+        width.  The bytes are in row-major order, so the result is 3*height*width bytes.
+        The bounds are checked once for the whole rectangle, and each row of it is one
+        slice of the pixel buffer (the whole rectangle if it spans every column).
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and row+height <= image height
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and col+width <= image width
+        """
+        self._checkRegion(row,col,height,width)
+        data   = self.getData()
+        stride = 3*self._width
+        start  = row*stride+3*col
+        if width == self._width:
+            return bytes(data[start:start+height*stride])
+        size = 3*width
+        return b''.join([data[pos:pos+size] for pos in range(start,start+height*stride,stride)])
+
+
+    def setRegion(self, row, col, height, width, data):
+        """
+        Sets a rectangle of this image to the raw RGB bytes data
+
+        The rectangle is as in getRegion, and data is in the same row-major order.
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and row+height <= image height
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and col+width <= image width
+
+        Parameter data: The new pixel bytes
+        Precondition: data is a bytes-like object of length 3*height*width
+        """
+        self._checkRegion(row,col,height,width)
+        assert len(data) == 3*height*width
+        pixels = self.getData()
+        stride = 3*self._width
+        start  = row*stride+3*col
+        self._markDirty(row,col,height,width)
+        if width == self._width:
+            pixels[start:start+height*stride] = data
+            return
+        size = 3*width
+        view = memoryview(data)
+        for k in range(height):
+            pos = start+k*stride
+            pixels[pos:pos+size] = view[k*size:(k+1)*size]
+
+
+    def fillRegion(self, row, col, height, width, pixel):
+        """
+        Sets every pixel in a rectangle of this image to pixel
+
+        The rectangle is as in getRegion.
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and row+height <= image height
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and col+width <= image width
+
+        Parameter pixel: The pixel value
+        Precondition: pixel is a 3-element tuple (r,g,b) where each value is 0..255
+        """
+        self._checkRegion(row,col,height,width)
+        if len(pixel) != 3:
+            raise ValueError('pixel %s does not have 3 elements' % repr(pixel))
+        line   = bytes(pixel)*width
+        data   = self.getData()
+        stride = 3*self._width
+        start  = row*stride+3*col
+        self._markDirty(row,col,height,width)
+        if width == self._width:
+            data[start:start+height*stride] = line*height
+            return
+        for pos in range(start,start+height*stride,stride):
+            data[pos:pos+3*width] = line
+
+
+    def copyRegion(self, source, srcrow, srccol, height, width, row, col):
+        """
+        Copies a rectangle of source into this image, with its top left corner at (row, col)
+
+        The rectangle of source has its top left corner at (srcrow, srccol).  The source
+        may be this image, even if the two rectangles overlap.
+
+        Parameter source: The image to copy from
+        Precondition: source is an Image object
+
+        Parameter srcrow: The top row of the rectangle in source
+        Precondition: srcrow is an int >= 0
+
+        Parameter srccol: The left column of the rectangle in source
+        Precondition: srccol is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and fits in both images
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and fits in both images
+
+        Parameter row: The top row to copy to
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column to copy to
+        Precondition: col is an int >= 0
+        """
+        assert isinstance(source,Image)
+        self.setRegion(row,col,height,width,source.getRegion(srcrow,srccol,height,width))
+
     # ADDITIONAL METHODS
     def swapPixels(self, row1, col1, row2, col2):
         """
@@ -297,14 +602,43 @@ class Image(object):
         Parameter col2: The pixel column to swap to
         Precondition: col2 is an int >= 0 and < width
         
-        NOTE: DO NOT enforce any preconditions here.  They should be enforced already
-        in getPixel and setPixel.
+        The preconditions are checked once for each pixel, and the two pixels are
+        swapped with slices of the pixel buffer.
         """
-        a=self.getPixel(row2,col2)
-        b=self.getPixel(row1,col1)
-        self.setPixel(row1,col1,a)
-        self.setPixel(row2,col2,b)
-        # implement me
+        self._checkRegion(row1,col1,1,1)
+        self._checkRegion(row2,col2,1,1)
+        data = self.getData()
+        k1 = 3*(row1*self._width+col1)
+        k2 = 3*(row2*self._width+col2)
+        data[k1:k1+3], data[k2:k2+3] = data[k2:k2+3], data[k1:k1+3]
+        self._markDirty(row1,col1,1,1)
+        self._markDirty(row2,col2,1,1)
+    
+    
+    def getSummedAreaTable(self):
+        """
+        Returns: A summed-area table of the current pixels of this image.
+        
+        The table gives the per-channel sum of any rectangle of the image in constant 
+        time (see the SummedAreaTable class).  It is a snapshot, so it must be 
+        rebuilt if the image changes.
+        """
+        return a6integral.SummedAreaTable(self)
+    
+    
+    def applyLUT(self, lut):
+        """
+        Applies the lookup table lut to every pixel of this image.
+        
+        This is a single pass over the pixel buffer for each stage of lut (usually 
+        one), no matter how many point operations were composed into it.
+        
+        Parameter lut: The lookup table to apply
+        Precondition: lut is a PointLUT object (see the module a6lut)
+        """
+        lut.apply(self.getData())
+        self._pyramid=None
+        self._markDirty(0,0,self._height,self._width)
     
     
     def copy(self):
@@ -313,8 +647,499 @@ class Image(object):
         
         This method returns a new Image object. The underlying pixel data must be copied 
         (e.g. the copy cannot refer to the same pixel list object that this file does).
+        This is a single copy of the underlying byte buffer.
         """
-        newdata=self._pixels[:]
+        newdata=self._pixels.copy()
         newwidth=self._width
         return Image(newdata,newwidth)
         # implement me
+    
+    # PYRAMID METHODS
+    def getLevel(self, level):
+        """
+        Returns: This image scaled down by 2**level in each direction
+        
+        Level 0 is this image itself.  Each other level halves the one before it, 
+        averaging 2x2 blocks of pixels (see a6kernels.halve).  The levels are built 
+        when they are first asked for and kept until the pyramid is cleared.  There are
+        no levels past one less than 2 pixels wide or high, so asking for a higher level
+        gives the smallest one.  The levels are in memory even if this image is mapped.
+        
+        Parameter level: The pyramid level
+        Precondition: level is an int >= 0
+        """
+        assert type(level)==int and level>=0
+        if self._pyramid is None:
+            self._pyramid=[]
+        while len(self._pyramid)<level:
+            source=self._pyramid[-1] if self._pyramid else self
+            if source.getWidth()<2 or source.getHeight()<2:
+                break
+            data,width,height=a6kernels.halve(source.getData(),
+                                              source.getWidth(),source.getHeight())
+            self._pyramid.append(Image(a6buffer.PixelBuffer(data),width))
+        level=min(level,len(self._pyramid))
+        return self._pyramid[level-1] if level else self
+    
+    
+    def findLevel(self, width, height):
+        """
+        Returns: The highest pyramid level that is still at least width x height
+        
+        This is the level to draw when the display area is width x height, since it 
+        is the smallest one that does not need to be scaled up.  It is 0 if this image
+        is already smaller than that.  The pyramid is not built.
+        
+        Parameter width: The display width
+        Precondition: width is an int > 0
+        
+        Parameter height: The display height
+        Precondition: height is an int > 0
+        """
+        assert type(width)==int and width>0
+        assert type(height)==int and height>0
+        level=0
+        while (self._width>>(level+1))>=width and (self._height>>(level+1))>=height:
+            level+=1
+        return level
+    
+    
+    def clearPyramid(self):
+        """
+        Throws away the pyramid levels, so they are built again from the current pixels.
+        """
+        self._pyramid=None
+    
+    # DIRTY REGION METHODS
+    def isDirty(self):
+        """
+        Returns: True if some pixel was marked as changed since the last clearDirty
+        """
+        return bool(self._dirty)
+    
+    
+    def isTracked(self):
+        """
+        Returns: True if the dirty pixels cover every change since the last clearDirty
+        
+        This is False once the pixel buffer has been changed or handed out in a way the
+        image cannot see (pixel by pixel through getPixels, or as raw bytes through 
+        getBuffer or getPixels().getData()).  It is True again after clearDirty, or 
+        once the whole image is marked dirty.  A buffer handed out earlier can still
+        change the pixels behind its back, so do not hold on to one.
+        """
+        return self._exposures==self._pixels.getExposures()
+    
+    
+    def getVersion(self):
+        """
+        Returns: A number that changes whenever the pixels of this image may have changed
+        
+        The number goes up with every change that is marked (see markDirty), and, while
+        the image is not tracked (see isTracked), every time its pixel buffer is handed
+        out.  It never goes down, not even after clearDirty.  So a consumer that 
+        remembers it can tell if the image is still the same, without looking at the
+        pixels.
+        """
+        return self._version+self._pixels.getExposures()-self._exposures
+    
+    
+    def getDirtyRects(self):
+        """
+        Returns: The rectangles changed since the last clearDirty, as a list
+        
+        Each rectangle is a tuple (row, col, height, width), as in getRegion.  Changes
+        next to each other (such as the pixels of a row, set one at a time) are merged
+        into one rectangle, but the rectangles may still overlap.  If there would be 
+        more than MAX_DIRTY of them, they are replaced by their bounding rectangle.
+        If the width changed, the whole image is one dirty rectangle.
+        """
+        return [tuple(rect) for rect in self._dirty]
+    
+    
+    def getDirtyRanges(self):
+        """
+        Returns: The flat pixel ranges changed since the last clearDirty, as a list
+        
+        Each range is a pair (start, stop) of flat pixel positions (see getFlatPixel),
+        with stop not included.  The ranges are sorted, and do not overlap or touch.
+        A rectangle as wide as the image is a single range; any other rectangle is one
+        range per row.
+        """
+        ranges = []
+        for row, col, height, width in self._dirty:
+            start = row*self._width+col
+            if width == self._width:
+                ranges.append((start,start+height*width))
+            else:
+                for pos in range(start,start+height*self._width,self._width):
+                    ranges.append((pos,pos+width))
+        ranges.sort()
+        merged = []
+        for start, stop in ranges:
+            if merged and start <= merged[-1][1]:
+                if stop > merged[-1][1]:
+                    merged[-1] = (merged[-1][0],stop)
+            else:
+                merged.append((start,stop))
+        return merged
+    
+    
+    def getDirtyBounds(self):
+        """
+        Returns: The smallest rectangle holding every dirty pixel, or None if there are none
+        
+        The rectangle is a tuple (row, col, height, width), as in getRegion.
+        """
+        if not self._dirty:
+            return None
+        top    = min(rect[0] for rect in self._dirty)
+        left   = min(rect[1] for rect in self._dirty)
+        bottom = max(rect[0]+rect[2] for rect in self._dirty)
+        right  = max(rect[1]+rect[3] for rect in self._dirty)
+        return (top,left,bottom-top,right-left)
+    
+    
+    def getDirtyGeneration(self):
+        """
+        Returns: The number of times clearDirty has been called on this image
+        
+        Several consumers can share the dirty pixels of an image.  One that remembers 
+        this number can tell if another has cleared them since, so that the dirty 
+        pixels no longer cover everything that changed.
+        """
+        return self._cleared
+    
+    
+    def markDirty(self, row=0, col=0, height=None, width=None):
+        """
+        Marks the rectangle at (row, col) with the given height and width as changed.
+        
+        The rectangle is as in getRegion.  By default, it is the whole image.  Call this
+        after changing pixels straight through the pixel buffer.
+        
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+        
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+        
+        Parameter height: The number of rows in the rectangle (None for all rows below row)
+        Precondition: height is None or an int >= 0 and row+height <= image height
+        
+        Parameter width: The number of columns in the rectangle (None for all columns 
+        right of col)
+        Precondition: width is None or an int >= 0 and col+width <= image width
+        """
+        if height is None:
+            height = self._height-row
+        if width is None:
+            width = self._width-col
+        self._checkRegion(row,col,height,width)
+        self._markDirty(row,col,height,width)
+    
+    
+    def markFlatDirty(self, start, stop):
+        """
+        Marks the flat pixel positions from start up to (but not including) stop as changed.
+        
+        The range is marked as at most three rectangles: the end of its first row, the
+        rows in between and the start of its last row.
+        
+        Parameter start: The first flat pixel position
+        Precondition: start is an int >= 0
+        
+        Parameter stop: The flat pixel position after the last one
+        Precondition: stop is an int, start <= stop <= length
+        """
+        assert type(start)==int and type(stop)==int
+        assert 0<=start<=stop<=self._length
+        width=self._width
+        row1, col1 = divmod(start,width)
+        row2, col2 = divmod(stop,width)
+        if row1==row2:
+            self._markDirty(row1,col1,1,col2-col1)
+            return
+        if col1:
+            self._markDirty(row1,col1,1,width-col1)
+            row1+=1
+        self._markDirty(row1,0,row2-row1,width)
+        self._markDirty(row2,0,1,col2)
+    
+    
+    def clearDirty(self):
+        """
+        Forgets every dirty pixel, so that only the changes made after this are dirty.
+        """
+        self._dirty=[]
+        self._cleared+=1
+        self._resync()
+    
+    # SERIALIZATION METHODS
+    def serialize(self, level=0):
+        """
+        Returns: This image as a compact bytes object
+        
+        The bytes are a HEADER (with the width and height) followed by the raw pixel
+        bytes, compressed with zlib at the given level if it is above 0.  Use the 
+        function deserialize to get the image back.
+        
+        Parameter level: The zlib compression level (0 for no compression)
+        Precondition: level is an int in 0..9
+        """
+        result = io.BytesIO()
+        self.writeTo(result,level)
+        return result.getvalue()
+    
+    
+    def writeTo(self, file, level=0):
+        """
+        Writes this image to file in the format of serialize.
+        
+        The pixel bytes are written straight from the pixel buffer through a memoryview,
+        CHUNK_BYTES at a time, so they are never copied as a whole (even when they are 
+        compressed).  Use the function readImage to read the image back.
+        
+        Parameter file: The file to write to
+        Precondition: file is a binary file open for writing
+        
+        Parameter level: The zlib compression level (0 for no compression)
+        Precondition: level is an int in 0..9
+        """
+        assert type(level) == int and 0 <= level <= 9
+        file.write(HEADER.pack(MAGIC,VERSION,COMPRESSED if level else 0,
+                               self._width,self._height))
+        with memoryview(self.getData()) as view:
+            if not level:
+                file.write(view)
+                return
+            compressor = zlib.compressobj(level)
+            for pos in range(0,len(view),CHUNK_BYTES):
+                file.write(compressor.compress(view[pos:pos+CHUNK_BYTES]))
+            file.write(compressor.flush())
+    
+    
+    def writeText(self, file):
+        """
+        Writes the string representation of this image (see __str__) to file.
+        
+        The text is written one row at a time, so it takes time linear in the image
+        size, and only one row of text is ever in memory.
+        
+        Parameter file: The file to write to
+        Precondition: file is a text file open for writing
+        """
+        data   = self.getData()
+        stride = 3*self._width
+        file.write('[')
+        for row in range(self._height):
+            line = data[row*stride:(row+1)*stride]
+            pixels = zip(line[0::3],line[1::3],line[2::3])
+            file.write(',  [' if row else '[')
+            file.write(', '.join(map('(%d, %d, %d)'.__mod__,pixels)))
+            file.write(']')
+        file.write(']')
+    
+    # HELPER METHODS
+    def _markDirty(self, row, col, height, width):
+        """
+        Marks a rectangle as changed, without checking it.
+        
+        The rectangle is merged into the last one marked if it is inside it, or extends
+        it to the right or downwards.  If it is the whole image, it replaces all of the
+        others.
+        
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+        
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+        
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0 and row+height <= image height
+        
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0 and col+width <= image width
+        """
+        if not height or not width:
+            return
+        self._version+=1
+        dirty=self._dirty
+        if dirty:
+            last=dirty[-1]
+            top, left, rows, cols = last
+            if row==top and rows==height and col==left+cols:
+                last[3]=cols+width
+                return
+            if col==left and cols==width and row==top+rows:
+                last[2]=rows+height
+                return
+            if top<=row and left<=col and row+height<=top+rows and col+width<=left+cols:
+                return
+            if height==self._height and width==self._width:
+                dirty.clear()
+        if height==self._height and width==self._width:
+            self._resync()
+        dirty.append([row,col,height,width])
+        if len(dirty)>MAX_DIRTY:
+            self._dirty=[list(self.getDirtyBounds())]
+    
+    
+    def _sync(self, tracked):
+        """
+        Brings _exposures up to date after a change that was marked, if it was current.
+        
+        Parameter tracked: Whether the dirty pixels were trusted before the change
+        Precondition: tracked is a bool
+        """
+        if tracked:
+            self._exposures=self._pixels.getExposures()
+    
+    
+    def _resync(self):
+        """
+        Trusts the dirty pixels again, keeping any untracked exposures in the version.
+        """
+        exposures=self._pixels.getExposures()
+        self._version+=exposures-self._exposures
+        self._exposures=exposures
+    
+    
+    def _checkRegion(self, row, col, height, width):
+        """
+        Checks that the rectangle at (row, col) with the given height and width is
+        inside this image.
+        
+        Parameter row: The top row of the rectangle
+        Precondition: NONE (this is what is checked)
+        
+        Parameter col: The left column of the rectangle
+        Precondition: NONE (this is what is checked)
+        
+        Parameter height: The number of rows in the rectangle
+        Precondition: NONE (this is what is checked)
+        
+        Parameter width: The number of columns in the rectangle
+        Precondition: NONE (this is what is checked)
+        """
+        assert type(row)==int and type(height)==int
+        assert row>=0 and height>=0
+        assert row+height<=self._height
+        assert type(col)==int and type(width)==int
+        assert col>=0 and width>=0
+        assert col+width<=self._width
+
+
+# SERIALIZATION FUNCTIONS
+def deserialize(data):
+    """
+    Returns: The image serialized in data (see Image.serialize)
+    
+    If data is not compressed, the pixels are copied once, straight from data into the
+    buffer of the new image.  This raises a ValueError if data is not a serialized image.
+    
+    Parameter data: The serialized image
+    Precondition: data is a bytes-like object (such as bytes or a memoryview)
+    """
+    view = memoryview(data).cast('B')
+    width, height, compressed = _read_header(view[:HEADER.size])
+    body = view[HEADER.size:]
+    if compressed:
+        pixels = bytearray(zlib.decompress(body))
+    else:
+        pixels = bytearray(body)
+    return _build(pixels,width,height)
+
+
+def readImage(file):
+    """
+    Returns: The image read from file (see Image.writeTo)
+    
+    An uncompressed image is read with readinto, straight into the buffer of the new
+    image.  A compressed one is decompressed CHUNK_BYTES at a time.  This raises a 
+    ValueError if file does not hold a serialized image.
+    
+    Parameter file: The file to read from
+    Precondition: file is a binary file open for reading
+    """
+    width, height, compressed = _read_header(file.read(HEADER.size))
+    size = 3*width*height
+    if not compressed:
+        pixels = bytearray(size)
+        view   = memoryview(pixels)
+        pos = 0
+        while pos < size:
+            count = file.readinto(view[pos:])
+            if not count:
+                break
+            pos += count
+        return _build(pixels[:pos] if pos < size else pixels,width,height)
+    decompressor = zlib.decompressobj()
+    pixels = bytearray()
+    while not decompressor.eof:
+        chunk = file.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        pixels += decompressor.decompress(chunk)
+    return _build(pixels,width,height)
+
+
+# HELPER FUNCTIONS
+def _restore(data, width):
+    """
+    Returns: The image unpickled from its pixel bytes and width (see Image.__reduce_ex__)
+    
+    A bytearray (which is what pickle gives for in-band data, and what out-of-band
+    buffers usually are) becomes the pixel buffer without being copied.
+    
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytes-like object whose length is a multiple of 3*width
+    
+    Parameter width: The image width
+    Precondition: width is an int > 0
+    """
+    if not isinstance(data,bytearray):
+        data = bytearray(data)
+    return Image(a6buffer.PixelBuffer(data),width)
+
+
+def _read_header(header):
+    """
+    Returns: The triple (width, height, compressed) read from a serialized image header
+    
+    This raises a ValueError if the header is not valid.
+    
+    Parameter header: The header bytes
+    Precondition: header is a bytes-like object
+    """
+    if len(header) < HEADER.size:
+        raise ValueError('data is too short to be a serialized image')
+    magic, version, flags, width, height = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('data is not a serialized image')
+    if version != VERSION:
+        raise ValueError('unsupported serialized image version %d' % version)
+    if width == 0 or height == 0:
+        raise ValueError('serialized image has no pixels')
+    return (width, height, bool(flags & COMPRESSED))
+
+
+def _build(pixels, width, height):
+    """
+    Returns: An image with the given pixel bytes and size
+    
+    This raises a ValueError if pixels does not have exactly 3*width*height bytes.
+    
+    Parameter pixels: The raw pixel bytes
+    Precondition: pixels is a bytearray
+    
+    Parameter width: The image width
+    Precondition: width is an int > 0
+    
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    if len(pixels) != 3*width*height:
+        raise ValueError('serialized image has %d pixel bytes, not %d' % 
+                         (len(pixels),3*width*height))
+    return Image(a6buffer.PixelBuffer(pixels),width)
@@ -0,0 +1,236 @@
+"""
+Summed-area tables (integral images) for our imager application.
+
+This module contains a single class.  A summed-area table stores, for every position
+(row,col), the sum of all of the pixels above and to the left of it.  Once the table
+is built (one pass over the image), the sum of ANY rectangle of pixels takes four
+lookups per color channel, no matter how big the rectangle is.
+
+This is what lets pixellate, blur and the other box filters run in time that does not
+depend on the block size or radius.
+"""
+import itertools
+import operator
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SummedAreaTable(object):
+    """
+    A class that gives the per-channel sum of any rectangle of an image in O(1).
+
+    The table is a snapshot: it is computed from the pixels of the image when it is
+    created, and does not change if the image changes afterwards.
+
+    Each channel table has (height+1) rows and (width+1) columns, stored in row-major
+    order.  Entry (row,col) is the sum of that channel over all of the pixels in rows
+    0..row-1 and columns 0..col-1.  So the first row and column are all 0.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _width:  The image width                  [int > 0]
+        _height: The image height                 [int > 0]
+        _tables: The red, green and blue tables   [list of 3 int sequences]
+    """
+
+    # GETTERS
+    def getWidth(self):
+        """
+        Returns: The width of the image this table was built from
+        """
+        return self._width
+
+
+    def getHeight(self):
+        """
+        Returns: The height of the image this table was built from
+        """
+        return self._height
+
+    # INITIALIZER
+    def __init__(self, image):
+        """
+        Initializer: Builds the summed-area table for the current pixels of image.
+
+        Parameter image: The image to sum
+        Precondition: image is an Image object
+        """
+        self._width  = image.getWidth()
+        self._height = image.getHeight()
+        data = image.getData()
+        if numpy is not None:
+            self._tables = _numpy_tables(data,self._width,self._height)
+        else:
+            self._tables = [_channel_table(data,self._width,self._height,k)
+                            for k in range(3)]
+
+    # ACCESS METHODS
+    def getSum(self, row, col, height, width):
+        """
+        Returns: The (red, green, blue) sums of the given rectangle, as ints.
+
+        The rectangle starts at (row, col) and is height rows tall and width columns
+        wide.  Any part of the rectangle outside of the image is ignored, just like
+        the blocks at the edge of the image in pixellate.
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0
+        """
+        stride = self._width+1
+        bottom = min(row+height,self._height)
+        right  = min(col+width,self._width)
+        row = min(row,bottom)
+        col = min(col,right)
+        a = row*stride+col
+        b = row*stride+right
+        c = bottom*stride+col
+        d = bottom*stride+right
+        red, green, blue = self._tables
+        return (int(red[d]-red[b]-red[c]+red[a]),
+                int(green[d]-green[b]-green[c]+green[a]),
+                int(blue[d]-blue[b]-blue[c]+blue[a]))
+
+
+    def getCount(self, row, col, height, width):
+        """
+        Returns: The number of image pixels in the given rectangle.
+
+        As with getSum, any part of the rectangle outside of the image is ignored.
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0
+        """
+        rows = max(0,min(row+height,self._height)-row)
+        cols = max(0,min(col+width,self._width)-col)
+        return rows*cols
+
+
+    def getMean(self, row, col, height, width):
+        """
+        Returns: The average (red, green, blue) of the given rectangle, as floats.
+
+        As with getSum, any part of the rectangle outside of the image is ignored.
+
+        Parameter row: The top row of the rectangle
+        Precondition: row is an int >= 0
+
+        Parameter col: The left column of the rectangle
+        Precondition: col is an int >= 0
+
+        Parameter height: The number of rows in the rectangle
+        Precondition: height is an int >= 0
+
+        Parameter width: The number of columns in the rectangle
+        Precondition: width is an int >= 0, and the rectangle contains at least one
+        pixel of the image
+        """
+        count = self.getCount(row,col,height,width)
+        assert count > 0
+        red, green, blue = self.getSum(row,col,height,width)
+        return (red/count, green/count, blue/count)
+
+
+    def getWindowMeans(self, radius):
+        """
+        Returns: The raw bytes of the image where each pixel is its local mean
+
+        The local mean of a pixel is the average of the (2*radius+1) x (2*radius+1)
+        square centered on it, ignoring any part outside of the image.  Each value is
+        rounded to the nearest int.  The cost does not depend on radius.
+
+        Parameter radius: The radius of the window
+        Precondition: radius is an int >= 0
+        """
+        assert isinstance(radius,int) and radius >= 0
+        width  = self._width
+        height = self._height
+        stride = width+1
+        lefts  = [max(0,col-radius) for col in range(width)]
+        rights = [min(width,col+radius+1) for col in range(width)]
+        spans  = [right-left for left, right in zip(lefts,rights)]
+
+        result = bytearray(3*width*height)
+        for row in range(height):
+            top    = max(0,row-radius)
+            bottom = min(height,row+radius+1)
+            counts = [(bottom-top)*span for span in spans]
+            topbase = top*stride
+            botbase = bottom*stride
+            start = 3*row*width
+            for k in range(3):
+                table = self._tables[k]
+                result[start+k:start+3*width:3] = bytes(
+                    round((table[botbase+r]-table[topbase+r]-table[botbase+l]
+                           +table[topbase+l])/n)
+                    for l, r, n in zip(lefts,rights,counts))
+        return result
+
+
+# HELPER FUNCTIONS
+def _channel_table(data, width, height, channel):
+    """
+    Returns: The summed-area table for one color channel, as an array of ints
+
+    Each row is built from the row above it with C-level accumulate and map, so there
+    is no per-pixel Python code.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter channel: The channel to sum (0 for red, 1 for green, 2 for blue)
+    Precondition: channel is 0, 1 or 2
+    """
+    stride = 3*width
+    above = [0]*(width+1)
+    table = array('q',above)
+    for start in range(0,len(data),stride):
+        sums = itertools.accumulate(data[start+channel:start+stride:3],initial=0)
+        above = list(map(operator.add,above,sums))
+        table.extend(above)
+    return table
+
+
+def _numpy_tables(data, width, height):
+    """
+    Returns: The summed-area tables for the three color channels, using NumPy
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes and NumPy is installed
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    pixels = numpy.frombuffer(data,dtype=numpy.uint8).reshape(height,width,3)
+    tables = numpy.zeros((3,height+1,width+1),dtype=numpy.int64)
+    tables[:,1:,1:] = pixels.transpose(2,0,1).cumsum(1,dtype=numpy.int64).cumsum(2)
+    return [tables[k].ravel() for k in range(3)]
@@ -0,0 +1,702 @@
+"""
+Image file loading and saving for our imager application.
+
+This module contains functions to read an image file into an Image object, and to
+write an Image object back out to a file.  The pixels are decoded straight into the
+raw bytes of a PixelBuffer, so no (r,g,b) tuples are created along the way.
+
+PPM and PGM files (binary and ASCII) and PNG files are read and written natively,
+using only the standard library (zlib for PNG).  Writing streams the image out a band
+of rows at a time.  Reading a PNG decompresses it as the chunks are read, and undoes
+the row filters with bulk operations where the filter allows it (None, Sub and Up).
+The Average and Paeth filters depend on the byte just decoded, so those rows are
+decoded one byte at a time.
+
+Every other format is loaded and saved with the Pillow library (PIL), which must be
+installed for those formats.
+"""
+import itertools
+import os
+import struct
+import time
+import zlib
+
+import a6buffer
+import a6editor
+import a6image
+import a6kernels
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+
+# The file extensions that loadImage can read (in lower case)
+EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.ppm', '.pgm', '.pnm', '.tif',
+              '.tiff')
+
+# The file extensions that are read and written without Pillow
+NATIVE_EXTENSIONS = ('.png', '.ppm', '.pgm', '.pnm')
+
+# The first 8 bytes of every PNG file
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# The zlib compression level used when saving PNG files
+PNG_COMPRESSION = 6
+
+# The size (in bytes) of the bands of rows written at a time
+STREAM_BYTES = 1024*1024
+
+
+def loadImage(path):
+    """
+    Returns: The image stored in the file at path, as an Image object
+
+    The image is converted to RGB if it is not RGB already.  PPM, PGM and PNG files
+    are decoded natively (the format is found from the first bytes of the file, not
+    the extension).  Other formats need Pillow.
+
+    Parameter path: The file to read
+    Precondition: path is a str naming a readable image file
+    """
+    with open(path,'rb') as file:
+        start = file.read(8)
+        file.seek(0)
+        if start == PNG_SIGNATURE:
+            return readPNG(file)
+        if start[:1] == b'P' and start[1:2] in (b'2',b'3',b'5',b'6'):
+            return readPNM(file)
+
+    _require_pillow()
+    with PILImage.open(path) as source:
+        source = source.convert('RGB')
+        data = bytearray(source.tobytes())
+        width = source.size[0]
+    return a6image.Image(a6buffer.PixelBuffer(data),width)
+
+
+def saveImage(image, path):
+    """
+    Saves image to the file at path.
+
+    The file format is chosen from the extension of path.  PPM (and PNM), PGM and PNG
+    files are written natively; other formats need Pillow.
+
+    Parameter image: The image to save
+    Precondition: image is an Image object
+
+    Parameter path: The file to write
+    Precondition: path is a str with one of the EXTENSIONS
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in NATIVE_EXTENSIONS:
+        with open(path,'wb') as file:
+            if extension == '.png':
+                writePNG(image,file)
+            else:
+                writePNM(image,file,extension == '.pgm')
+        return
+
+    _require_pillow()
+    _save_pillow(image,path)
+
+
+def isImageFile(path):
+    """
+    Returns: True if path has one of the EXTENSIONS, False otherwise
+
+    Parameter path: The file name to check
+    Precondition: path is a str
+    """
+    return path.lower().endswith(EXTENSIONS)
+
+
+# PPM AND PGM
+def readPNM(file):
+    """
+    Returns: The PPM or PGM image in file, as an Image object
+
+    The binary (P6, P5) and ASCII (P3, P2) variants are supported.  Grey images are
+    expanded to RGB.  If the maximum value is not 255, the values are scaled to 0..255.
+
+    This raises a ValueError if the file is not a valid PPM or PGM file.
+
+    Parameter file: The file to read from
+    Precondition: file is a binary file opened for reading, at the start of the image
+    """
+    magic, width, height, maxval = _read_pnm_header(file)
+    channels = 3 if magic in (b'P3',b'P6') else 1
+    count = width*height*channels
+    if magic in (b'P5',b'P6'):
+        size = count*(2 if maxval > 255 else 1)
+        values = bytearray(size)
+        if file.readinto(values) != size:
+            raise ValueError('the image data is truncated')
+        if maxval > 255:
+            values = bytearray(map(lambda hi, lo: ((hi << 8 | lo)*255+maxval//2)//maxval,
+                                   values[0::2],values[1::2]))
+        elif maxval != 255:
+            values = values.translate(_scale_table(maxval))
+    else:
+        values = bytearray(map(lambda v: (int(v)*255+maxval//2)//maxval,
+                               file.read().split()[:count]))
+        if len(values) != count:
+            raise ValueError('the image data is truncated')
+    if channels == 1:
+        values = _expand_grey(values)
+    return a6image.Image(a6buffer.PixelBuffer(values),width)
+
+
+def writePNM(image, file, grey=False):
+    """
+    Writes image to file as a binary PPM file (or a PGM file if grey is True).
+
+    The image is written one band of rows at a time.  A PGM file stores the brightness
+    of each pixel, as computed by Editor.monochromify.
+
+    Parameter image: The image to save
+    Precondition: image is an Image object
+
+    Parameter file: The file to write to
+    Precondition: file is a binary file opened for writing
+
+    Parameter grey: Whether to write a greyscale PGM file
+    Precondition: grey is a bool
+    """
+    width  = image.getWidth()
+    height = image.getHeight()
+    file.write(b'%s\n%d %d\n255\n' % (b'P5' if grey else b'P6',width,height))
+    data = image.getData()
+    for start, stop in _bands(image):
+        band = data[3*start*width:3*stop*width]
+        if grey:
+            band = bytearray(band)
+            a6kernels.greyscale(band)
+            band = band[0::3]
+        file.write(band)
+
+
+# PNG
+def readPNG(file):
+    """
+    Returns: The PNG image in file, as an Image object
+
+    All of the standard (non-interlaced) formats are supported: greyscale, RGB and
+    palette images, with or without alpha, at every bit depth.  Alpha is ignored, and
+    16-bit values keep only their high byte.  The image data is decompressed as it is
+    read, and the rows are unfiltered as soon as they are complete.
+
+    This raises a ValueError if the file is not a valid PNG file, or is interlaced.
+
+    Parameter file: The file to read from
+    Precondition: file is a binary file opened for reading, at the start of the image
+    """
+    if file.read(8) != PNG_SIGNATURE:
+        raise ValueError('the file is not a PNG file')
+    palette = None
+    decoder = None
+    for kind, body in _png_chunks(file):
+        if kind == b'IHDR':
+            width, height, depth, color, method, filtering, interlace = struct.unpack(
+                '>IIBBBBB',body)
+            if interlace != 0:
+                raise ValueError('interlaced PNG files are not supported')
+            if color not in _PNG_CHANNELS or method != 0 or filtering != 0:
+                raise ValueError('the PNG header is not valid')
+            decoder = _PNGRows(width,height,_PNG_CHANNELS[color]*depth)
+        elif kind == b'PLTE':
+            palette = body
+        elif kind == b'IDAT':
+            if decoder is None:
+                raise ValueError('the PNG file has no header')
+            decoder.feed(body)
+        elif kind == b'IEND':
+            break
+    if decoder is None:
+        raise ValueError('the PNG file has no header')
+    values = _png_to_rgb(decoder.finish(),width,height,depth,color,palette)
+    return a6image.Image(a6buffer.PixelBuffer(values),width)
+
+
+def writePNG(image, file, level=None):
+    """
+    Writes image to file as an 8-bit RGB PNG file.
+
+    The image is compressed one band of rows at a time, and each compressed piece is
+    written as its own IDAT chunk, so the compressed file is never held in memory.
+    The rows are stored without a filter, which is the fastest to write and read.
+
+    Parameter image: The image to save
+    Precondition: image is an Image object
+
+    Parameter file: The file to write to
+    Precondition: file is a binary file opened for writing
+
+    Parameter level: The zlib compression level (None for PNG_COMPRESSION)
+    Precondition: level is None or an int in 0..9
+    """
+    width  = image.getWidth()
+    height = image.getHeight()
+    stride = 3*width
+    file.write(PNG_SIGNATURE)
+    _write_png_chunk(file,b'IHDR',struct.pack('>IIBBBBB',width,height,8,2,0,0,0))
+
+    compressor = zlib.compressobj(PNG_COMPRESSION if level is None else level)
+    data = image.getData()
+    for start, stop in _bands(image):
+        band = bytearray((stop-start)*(stride+1))
+        for row in range(start,stop):
+            pos = (row-start)*(stride+1)+1
+            band[pos:pos+stride] = data[row*stride:(row+1)*stride]
+        piece = compressor.compress(band)
+        if piece:
+            _write_png_chunk(file,b'IDAT',piece)
+    _write_png_chunk(file,b'IDAT',compressor.flush())
+    _write_png_chunk(file,b'IEND',b'')
+
+
+# BENCHMARK
+def benchmark(path, target, operations=(('invert',),), repeat=3):
+    """
+    Returns: The times of load, filter and save for the native path and the tuple path
+
+    The result is a dictionary with the keys 'native' and 'tuples'.  Each value is a
+    triple (load, filter, save) with the best time (in seconds) of repeat runs.
+
+    The native path is loadImage, the Editor operations and saveImage.  The tuple path
+    is the way images used to be loaded: Pillow decodes the file, the pixels are boxed
+    as (r,g,b) tuples in a pixels.Pixels object, and the Image copies them.  It saves
+    with Pillow.  If Pillow or the pixels module is not installed, its value is None.
+
+    Parameter path: The image file to load
+    Precondition: path is a str naming a readable image file
+
+    Parameter target: The image file to save to (overwritten each run)
+    Precondition: target is a str naming a writable file with one of the EXTENSIONS
+
+    Parameter operations: The Editor operations to apply, each a name and arguments
+    Precondition: operations is a sequence of tuples (name, arg1, arg2, ...)
+
+    Parameter repeat: The number of runs to time
+    Precondition: repeat is an int > 0
+    """
+    def run(load, save):
+        best = None
+        for attempt in range(repeat):
+            times = []
+            start = time.perf_counter()
+            editor = a6editor.Editor(load(path))
+            times.append(time.perf_counter()-start)
+            start = time.perf_counter()
+            for operation in operations:
+                getattr(editor,operation[0])(*operation[1:])
+            current = editor.getCurrent()
+            times.append(time.perf_counter()-start)
+            start = time.perf_counter()
+            save(current,target)
+            times.append(time.perf_counter()-start)
+            best = times if best is None else list(map(min,best,times))
+        return tuple(best)
+
+    result = {'native':run(loadImage,saveImage), 'tuples':None}
+    try:
+        import pixels
+    except ImportError:
+        pixels = None
+    if PILImage is not None and pixels is not None:
+        result['tuples'] = run(lambda name: _load_tuples(name,pixels),_save_pillow)
+    return result
+
+
+# HELPER FUNCTIONS
+def _require_pillow():
+    """
+    Raises an ImportError if Pillow is not installed.
+    """
+    if PILImage is None:
+        raise ImportError('loading and saving image files requires Pillow (PIL)')
+
+
+def _bands(image):
+    """
+    Returns: The (start, stop) row ranges used to write image in STREAM_BYTES pieces
+
+    Parameter image: The image to split
+    Precondition: image is an Image object
+    """
+    rows = max(1,STREAM_BYTES//(3*image.getWidth()))
+    height = image.getHeight()
+    return [(start,min(height,start+rows)) for start in range(0,height,rows)]
+
+
+def _expand_grey(values):
+    """
+    Returns: The RGB bytes with each grey value repeated in all three channels
+
+    Parameter values: The grey values
+    Precondition: values is a bytes-like object
+    """
+    rgb = bytearray(3*len(values))
+    rgb[0::3] = values
+    rgb[1::3] = values
+    rgb[2::3] = values
+    return rgb
+
+
+def _scale_table(maxval):
+    """
+    Returns: The table that scales the values 0..maxval to 0..255 (with rounding)
+
+    Parameter maxval: The largest value
+    Precondition: maxval is an int in 1..255
+    """
+    return bytes(min(255,(v*255+maxval//2)//maxval) for v in range(256))
+
+
+def _read_pnm_header(file):
+    """
+    Returns: The header (magic, width, height, maxval) of the PPM or PGM file
+
+    The file is left at the first byte of the image data.  Comments (from '#' to the
+    end of the line) are skipped.  This raises a ValueError if the header is invalid.
+
+    Parameter file: The file to read from
+    Precondition: file is a binary file opened for reading, at the start of the image
+    """
+    tokens = []
+    token = b''
+    while len(tokens) < 4:
+        char = file.read(1)
+        if char == b'#':
+            file.readline()
+            char = b' '
+        if char and not char.isspace():
+            token += char
+            continue
+        if token:
+            tokens.append(token)
+            token = b''
+        if not char:
+            break
+    if len(tokens) < 4 or tokens[0] not in (b'P2',b'P3',b'P5',b'P6'):
+        raise ValueError('the file is not a PPM or PGM file')
+    try:
+        width, height, maxval = int(tokens[1]), int(tokens[2]), int(tokens[3])
+    except ValueError:
+        raise ValueError('the PPM or PGM header is not valid')
+    if width <= 0 or height <= 0 or not 0 < maxval < 65536:
+        raise ValueError('the PPM or PGM header is not valid')
+    return (tokens[0],width,height,maxval)
+
+
+def _png_chunks(file):
+    """
+    Yields: The (type, data) pair of each chunk of the PNG file, in order
+
+    Each chunk is checked against its CRC, and a ValueError is raised if it does not
+    match or the file ends early.
+
+    Parameter file: The file to read from
+    Precondition: file is a binary file opened for reading, just after the signature
+    """
+    while True:
+        head = file.read(8)
+        if len(head) < 8:
+            raise ValueError('the PNG file is truncated')
+        length, kind = struct.unpack('>I4s',head)
+        body = file.read(length)
+        check = file.read(4)
+        if len(body) < length or len(check) < 4:
+            raise ValueError('the PNG file is truncated')
+        if zlib.crc32(body,zlib.crc32(kind)) != struct.unpack('>I',check)[0]:
+            raise ValueError('the PNG chunk %s is corrupt' % kind.decode('latin-1'))
+        yield (kind,body)
+        if kind == b'IEND':
+            return
+
+
+def _write_png_chunk(file, kind, body):
+    """
+    Writes one PNG chunk (length, type, data and CRC) to file.
+
+    Parameter file: The file to write to
+    Precondition: file is a binary file opened for writing
+
+    Parameter kind: The chunk type
+    Precondition: kind is a bytes object of length 4
+
+    Parameter body: The chunk data
+    Precondition: body is a bytes-like object
+    """
+    file.write(struct.pack('>I',len(body)))
+    file.write(kind)
+    file.write(body)
+    file.write(struct.pack('>I',zlib.crc32(body,zlib.crc32(kind))))
+
+
+class _PNGRows(object):
+    """
+    A class that decompresses and unfilters the rows of a PNG image as data arrives.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _stride:  The number of bytes in each row (without the filter byte)  [int > 0]
+        _bpp:     The filter distance, the bytes per pixel (at least 1)      [int > 0]
+        _height:  The number of rows                                         [int > 0]
+        _inflate: The zlib decompressor                                      [Decompress]
+
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _pending: The decompressed bytes not yet unfiltered   [bytearray]
+        _rows:    The unfiltered rows so far, without filter bytes  [bytearray]
+        _count:   The number of rows unfiltered so far        [int >= 0]
+    """
+
+    def __init__(self, width, height, bits):
+        """
+        Initializer: Creates a row decoder for an image of the given size.
+
+        Parameter width: The image width
+        Precondition: width is an int > 0
+
+        Parameter height: The image height
+        Precondition: height is an int > 0
+
+        Parameter bits: The number of bits per pixel
+        Precondition: bits is an int > 0
+        """
+        self._stride  = (width*bits+7)//8
+        self._bpp     = max(1,bits//8)
+        self._height  = height
+        self._inflate = zlib.decompressobj()
+        self._pending = bytearray()
+        self._rows    = bytearray()
+        self._count   = 0
+
+
+    def feed(self, data):
+        """
+        Decompresses data, and unfilters every row that is now complete.
+
+        Parameter data: The contents of an IDAT chunk
+        Precondition: data is a bytes object
+        """
+        self._pending += self._inflate.decompress(data)
+        self._unfilterRows()
+
+
+    def finish(self):
+        """
+        Returns: The unfiltered rows of the image, one after the other
+
+        This raises a ValueError if the image data is incomplete.
+        """
+        self._pending += self._inflate.flush()
+        self._unfilterRows()
+        if self._count < self._height:
+            raise ValueError('the PNG image data is truncated')
+        return self._rows
+
+
+    def _unfilterRows(self):
+        """
+        Unfilters every complete row of the decompressed bytes.
+        """
+        size = self._stride+1
+        stride = self._stride
+        complete = min(len(self._pending)//size,self._height-self._count)
+        for pos in range(0,complete*size,size):
+            kind = self._pending[pos]
+            row = self._pending[pos+1:pos+size]
+            prior = self._rows[-stride:] if self._count else None
+            self._rows += _unfilter(kind,row,prior,self._bpp)
+            self._count += 1
+        del self._pending[:complete*size]
+
+
+def _unfilter(kind, row, prior, bpp):
+    """
+    Returns: The unfiltered bytes of one PNG row
+
+    Parameter kind: The filter type of the row
+    Precondition: kind is an int
+
+    Parameter row: The filtered bytes of the row (modified)
+    Precondition: row is a bytearray
+
+    Parameter prior: The unfiltered previous row (None for the first row)
+    Precondition: prior is None or a bytearray of the same length as row
+
+    Parameter bpp: The filter distance
+    Precondition: bpp is an int > 0
+    """
+    if kind == 0:
+        return row
+    if kind == 1 or (kind == 4 and prior is None):
+        for k in range(bpp):
+            row[k::bpp] = bytes(map((255).__and__,itertools.accumulate(row[k::bpp])))
+        return row
+    if kind == 2:
+        return row if prior is None else _add_bytes(row,prior)
+    if kind == 3:
+        above = prior or bytes(len(row))
+        for pos in range(len(row)):
+            left = row[pos-bpp] if pos >= bpp else 0
+            row[pos] = (row[pos]+((left+above[pos]) >> 1)) & 255
+        return row
+    if kind == 4:
+        for pos in range(len(row)):
+            if pos >= bpp:
+                left, corner = row[pos-bpp], prior[pos-bpp]
+            else:
+                left = corner = 0
+            up = prior[pos]
+            guess = left+up-corner
+            pa, pb, pc = abs(guess-left), abs(guess-up), abs(guess-corner)
+            if pa <= pb and pa <= pc:
+                predict = left
+            elif pb <= pc:
+                predict = up
+            else:
+                predict = corner
+            row[pos] = (row[pos]+predict) & 255
+        return row
+    raise ValueError('unknown PNG filter type %d' % kind)
+
+
+def _add_bytes(first, second):
+    """
+    Returns: The bytes first[i]+second[i] (mod 256), as a bytearray
+
+    The sums are done on all of the bytes at once, as two big integers.  The low 7
+    bits of each byte are added without carrying into the next byte, and the top bit
+    is then set with an exclusive or.
+
+    Parameter first: The first bytes
+    Precondition: first is a bytes-like object
+
+    Parameter second: The second bytes
+    Precondition: second is a bytes-like object of the same length as first
+    """
+    size = len(first)
+    low  = int.from_bytes(b'\x7f'*size,'little')
+    x = int.from_bytes(first,'little')
+    y = int.from_bytes(second,'little')
+    total = ((x & low)+(y & low)) ^ ((x ^ y) & ~low)
+    return bytearray(total.to_bytes(size,'little'))
+
+
+def _png_to_rgb(rows, width, height, depth, color, palette):
+    """
+    Returns: The RGB bytes of the unfiltered PNG rows
+
+    Parameter rows: The unfiltered rows, one after the other
+    Precondition: rows is a bytearray
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter depth: The PNG bit depth
+    Precondition: depth is 1, 2, 4, 8 or 16
+
+    Parameter color: The PNG color type
+    Precondition: color is a key of _PNG_CHANNELS
+
+    Parameter palette: The PLTE chunk (needed if color is 3)
+    Precondition: palette is None or a bytes object
+    """
+    channels = _PNG_CHANNELS[color]
+    if depth == 16:
+        rows = rows[0::2]
+    elif depth < 8:
+        rows = _unpack_bits(rows,width,height,depth)
+        if color == 0:
+            rows = rows.translate(_scale_table((1 << depth)-1))
+
+    if color == 3:
+        if palette is None:
+            raise ValueError('the PNG file has no palette')
+        tables = [bytes(palette[k::3]).ljust(256,b'\x00') for k in range(3)]
+        rgb = bytearray(3*len(rows))
+        for k in range(3):
+            rgb[k::3] = rows.translate(tables[k])
+        return rgb
+    if channels <= 2:
+        return _expand_grey(rows[0::channels])
+    if channels == 3:
+        return rows
+    rgb = bytearray(3*width*height)
+    for k in range(3):
+        rgb[k::3] = rows[k::4]
+    return rgb
+
+
+def _unpack_bits(rows, width, height, depth):
+    """
+    Returns: The values of rows packed depth bits at a time, one value per byte
+
+    Each row is padded to a whole byte, and the padding is dropped.
+
+    Parameter rows: The packed rows
+    Precondition: rows is a bytearray
+
+    Parameter width: The number of values per row
+    Precondition: width is an int > 0
+
+    Parameter height: The number of rows
+    Precondition: height is an int > 0
+
+    Parameter depth: The bits per value
+    Precondition: depth is 1, 2 or 4
+    """
+    count  = 8//depth
+    mask   = (1 << depth)-1
+    stride = (width*depth+7)//8
+    values = bytearray(stride*count*height)
+    for pos in range(count):
+        shift = 8-depth*(pos+1)
+        values[pos::count] = rows.translate(bytes((v >> shift) & mask for v in range(256)))
+    if stride*count == width:
+        return values
+    result = bytearray()
+    for row in range(height):
+        result += values[row*stride*count:row*stride*count+width]
+    return result
+
+
+def _load_tuples(path, pixels):
+    """
+    Returns: The image at path, loaded through (r,g,b) tuples and a pixels.Pixels object
+
+    Parameter path: The file to read
+    Precondition: path is a str naming a readable image file, and Pillow is installed
+
+    Parameter pixels: The pixels module
+    Precondition: pixels is a module
+    """
+    with PILImage.open(path) as source:
+        source = source.convert('RGB')
+        data = pixels.Pixels(list(source.getdata()))
+        width = source.size[0]
+    return a6image.Image(data,width)
+
+
+def _save_pillow(image, path):
+    """
+    Saves image to path with Pillow (whatever the extension).
+
+    Parameter image: The image to save
+    Precondition: image is an Image object
+
+    Parameter path: The file to write
+    Precondition: path is a str with one of the EXTENSIONS, and Pillow is installed
+    """
+    size = (image.getWidth(),image.getHeight())
+    target = PILImage.frombuffer('RGB',size,bytes(image.getData()),'raw','RGB',0,1)
+    target.save(path)
+
+
+# The number of channels of each PNG color type
+_PNG_CHANNELS = {0:1, 2:3, 3:1, 4:2, 6:4}
@@ -0,0 +1,512 @@
+"""
+Background jobs for the Editor operations of our imager application.
+
+Editor methods do all of their work before they return, which can take a long time on
+a big image.  This module runs them as jobs instead, one at a time and in order, on a
+background thread.  Each job can be waited for, followed (its progress is reported
+after every band of rows) and cancelled.  Jobs can also be awaited in asyncio code,
+so GUI and service front-ends stay responsive.
+
+Each job starts a new step of the edit history (with increment) and then calls the
+Editor method.  The operations report their progress after each band they finish
+(see a6tiles.setProgress).  Cancelling is cooperative: a running job stops at the end
+of the current band with a JobCancelled error (or when the method returns, if it does
+not report its progress), and the history is rolled back to the state before the 
+increment (see Editor.rollback).  Any other error rolls the history
+back too, so a job either finishes or leaves the history as it found it.
+
+In process mode, the operation runs on a copy of the current image in a worker
+process (the image is pickled there and back), so the pure Python kernels do not hold
+the GIL of this process.  The result is then copied into the history with
+Editor.adoptResult.  Memory-mapped images always run in this process.
+
+While jobs are queued or running, the Editor must not be used by any other thread.
+Call JobRunner.wait first.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import threading
+from concurrent import futures
+
+import a6batch
+import a6editor
+import a6tiles
+
+
+class JobCancelled(futures.CancelledError):
+    """
+    The error of a job that was cancelled while it was running.
+
+    It is a CancelledError, like the error of a job that was cancelled before it
+    started, so one except clause catches both.
+    """
+    pass
+
+
+class Job(object):
+    """
+    A class representing one Editor call run by a JobRunner.
+
+    A job is awaitable: in asyncio code, 'await job' returns the result of the call.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _name:      The Editor method name                      [str]
+        _args:      The method arguments                        [tuple]
+        _ident:     The number of this job in its runner        [int >= 0]
+        _cancelled: Set when the job is cancelled               [threading.Event]
+        _listeners: The functions told about progress           [list of callables]
+        _future:    The result of the call (set by the runner)  [Future]
+
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _progress:  The fraction of the call that is finished   [float in 0..1]
+    """
+
+    # GETTERS
+    def getName(self):
+        """
+        Returns: The name of the Editor method this job calls
+        """
+        return self._name
+
+
+    def getArgs(self):
+        """
+        Returns: The arguments of the call
+        """
+        return self._args
+
+
+    def getProgress(self):
+        """
+        Returns: The fraction (from 0 to 1) of the running band loop that is finished
+
+        Most operations are a single loop over the bands of the image.  Operations made
+        of several loops start again from 0 for each one.  This is 1.0 once the job has
+        finished.
+        """
+        return self._progress
+
+
+    def getFuture(self):
+        """
+        Returns: The concurrent.futures Future holding the result of the call
+        """
+        return self._future
+
+
+    def isCancelled(self):
+        """
+        Returns: True if cancel was called (while the job was not done), False otherwise
+        """
+        return self._cancelled.is_set()
+
+
+    def isRunning(self):
+        """
+        Returns: True if the job has started but has not finished, False otherwise
+        """
+        return self._future.running()
+
+
+    def isDone(self):
+        """
+        Returns: True if the job has finished, failed or been cancelled, False otherwise
+        """
+        return self._future.done()
+
+    # INITIALIZER AND OPERATORS
+    def __init__(self, name, args, ident):
+        """
+        Initializer: Creates a job for the call name(*args).
+
+        The runner sets the future when it queues the job.
+
+        Parameter name: The Editor method name
+        Precondition: name is a str naming a public method of Editor
+
+        Parameter args: The method arguments
+        Precondition: args is a tuple of valid arguments for that method
+
+        Parameter ident: The number of this job in its runner
+        Precondition: ident is an int >= 0
+        """
+        self._name      = name
+        self._args      = args
+        self._ident     = ident
+        self._cancelled = threading.Event()
+        self._listeners = []
+        self._future    = None
+        self._progress  = 0.0
+
+
+    def __await__(self):
+        """
+        Waits (in asyncio code) for the job to finish, and returns its result.
+        """
+        return asyncio.wrap_future(self._future).__await__()
+
+
+    def __repr__(self):
+        """
+        Returns: The unambiguous representation of this job
+        """
+        return '<Job %s%s %.0f%%>' % (self._name,repr(self._args),100*self._progress)
+
+    # ADDITIONAL METHODS
+    def addListener(self, function):
+        """
+        Adds a function to call whenever the progress of this job changes.
+
+        It is called as function(job,fraction) on the thread running the job, so it
+        should be quick, and a GUI should hand the fraction over to its own thread.
+
+        Parameter function: The function to call
+        Precondition: function is a callable taking a Job and a float
+        """
+        assert callable(function)
+        self._listeners.append(function)
+
+
+    def cancel(self):
+        """
+        Returns: True if the job will be cancelled, False if it was already done.
+
+        A job that has not started is never run.  A running job stops at the end of the
+        band it is working on (or once the method returns, for operations that do not
+        report their progress), and its runner rolls the history back.  Either way, the
+        result of the job is then a CancelledError.
+        """
+        if self._future.done():
+            return False
+        self._cancelled.set()
+        self._future.cancel()
+        return True
+
+
+    def result(self, timeout=None):
+        """
+        Returns: The result of the call, once the job has finished
+
+        If the call raised an error (or the job was cancelled), that error is raised
+        here instead.
+
+        Parameter timeout: The most seconds to wait (None to wait forever)
+        Precondition: timeout is None or a number >= 0
+        """
+        return self._future.result(timeout)
+
+    # HELPER METHODS
+    def _update(self, fraction):
+        """
+        Sets the progress of this job, and tells the listeners if it changed.
+
+        Parameter fraction: The fraction of the work finished
+        Precondition: fraction is a float in 0..1
+        """
+        if fraction == self._progress:
+            return
+        self._progress = fraction
+        for function in self._listeners:
+            function(self,fraction)
+
+
+    def _report(self, done, total):
+        """
+        The progress function of a job run in this process (see a6tiles.setProgress).
+
+        It raises JobCancelled if the job was cancelled, which stops the operation.
+
+        Parameter done: The amount of the operation that is finished
+        Precondition: done is an int >= 0
+
+        Parameter total: The amount of the whole operation
+        Precondition: total is an int > 0
+        """
+        self._update(done/total)
+        self._check()
+
+
+    def _check(self):
+        """
+        Raises JobCancelled if this job was cancelled.
+        """
+        if self._cancelled.is_set():
+            raise JobCancelled('%s was cancelled' % self._name)
+
+
+class JobRunner(object):
+    """
+    A class that runs the methods of an Editor as background jobs, in order.
+
+    All jobs are run by one background thread, one at a time, in the order they were
+    submitted.  In process mode, that thread sends the image to a worker process and
+    follows the progress of the call there through shared memory.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _editor:   The editor the jobs edit                     [Editor]
+        _mode:     Where the operations run                     ['thread' or 'process']
+        _thread:   Runs the jobs one at a time                  [ThreadPoolExecutor]
+        _idents:   Numbers the jobs                             [itertools.count]
+        _cancel:   The number of the job the worker must cancel [multiprocessing Value, or None]
+        _shared:   The progress of the job in the worker        [multiprocessing Value, or None]
+
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _workers:  The worker process (created when needed)    [ProcessPoolExecutor, or None]
+        _jobs:     The jobs submitted, oldest first             [list of Job]
+    The two multiprocessing values are None in thread mode.  Finished jobs are removed
+    from _jobs by the next call to submit.
+    """
+
+    # The seconds between two checks of the progress of a job in the worker process
+    POLL_SECONDS = 0.05
+
+    # GETTERS
+    def getEditor(self):
+        """
+        Returns: The editor the jobs edit
+        """
+        return self._editor
+
+
+    def getMode(self):
+        """
+        Returns: Where the operations run ('thread' or 'process')
+        """
+        return self._mode
+
+
+    def getJobs(self):
+        """
+        Returns: The jobs that have not finished yet, oldest first
+        """
+        return [job for job in self._jobs if not job.isDone()]
+
+    # INITIALIZER
+    def __init__(self, editor, mode='thread'):
+        """
+        Initializer: Creates a job runner for editor.
+
+        Parameter editor: The editor the jobs edit
+        Precondition: editor is an Editor object
+
+        Parameter mode: Where the operations run
+        Precondition: mode is 'thread' or 'process'
+        """
+        assert isinstance(editor,a6editor.Editor)
+        assert mode in ('thread','process')
+        self._editor  = editor
+        self._mode    = mode
+        self._thread  = futures.ThreadPoolExecutor(1)
+        self._idents  = itertools.count()
+        self._cancel  = None
+        self._shared  = None
+        self._workers = None
+        self._jobs    = []
+        if mode == 'process':
+            self._cancel = multiprocessing.Value('q',-1)
+            self._shared = multiprocessing.Value('d',0.0)
+
+    # ADDITIONAL METHODS
+    def submit(self, name, *args):
+        """
+        Returns: A new job for the call editor.name(*args), queued behind the others
+
+        Parameter name: The Editor method to call
+        Precondition: name is a str naming a public editing method of Editor
+
+        Parameter args: The method arguments
+        Precondition: args are valid arguments for that method
+        """
+        assert type(name) == str and not name.startswith('_')
+        assert callable(getattr(self._editor,name,None))
+        job = Job(name,args,next(self._idents))
+        job._future = self._thread.submit(self._execute,job)
+        self._jobs = self.getJobs()+[job]
+        return job
+
+
+    async def run(self, name, *args):
+        """
+        Returns: The result of the call editor.name(*args), run as a job (a coroutine)
+
+        If the task awaiting this is cancelled, so is the job.
+
+        Parameter name: The Editor method to call
+        Precondition: name is a str naming a public editing method of Editor
+
+        Parameter args: The method arguments
+        Precondition: args are valid arguments for that method
+        """
+        job = self.submit(name,*args)
+        try:
+            return await job
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+
+    def cancelAll(self):
+        """
+        Cancels every job that has not finished.
+        """
+        for job in self.getJobs():
+            job.cancel()
+
+
+    def wait(self):
+        """
+        Waits until every job has finished (or failed, or been cancelled).
+
+        The errors of the jobs are not raised here; see Job.result.
+        """
+        futures.wait([job.getFuture() for job in self._jobs])
+
+
+    def shutdown(self):
+        """
+        Cancels the jobs that have not started, waits for the running one, and stops the
+        background thread (and worker process).
+
+        The runner cannot be used afterwards.
+        """
+        for job in self.getJobs():
+            if not job.isRunning():
+                job.cancel()
+        self._thread.shutdown()
+        if self._workers is not None:
+            self._workers.shutdown()
+            self._workers = None
+
+    # HELPER METHODS
+    def _execute(self, job):
+        """
+        Returns: The result of running job (on the background thread)
+
+        Any deferred operations are run first, since they belong to the step before the
+        job.  Then the history is incremented and the method is called.  If it raises
+        an error (JobCancelled included), the history is rolled back before the error
+        is raised again.
+
+        Parameter job: The job to run
+        Precondition: job is a Job made by this runner
+        """
+        job._check()
+        editor = self._editor
+        editor.flush()
+        if self._mode == 'process' and not editor.getCurrent().isMapped():
+            return self._executeRemote(job)
+
+        editor.increment()
+        try:
+            a6tiles.setProgress(job._report)
+            try:
+                result = getattr(editor,job.getName())(*job.getArgs())
+                editor.getCurrent()
+                job._check()
+            finally:
+                a6tiles.setProgress(None)
+        except BaseException:
+            editor.rollback()
+            raise
+        job._update(1.0)
+        return result
+
+
+    def _executeRemote(self, job):
+        """
+        Returns: The result of running job in the worker process
+
+        The history is only incremented once the result is back, so nothing has to be
+        rolled back if the job fails, or was cancelled while the worker finished it.
+
+        Parameter job: The job to run
+        Precondition: job is a Job made by this runner, in process mode
+        """
+        editor = self._editor
+        self._shared.value = 0.0
+        future = self._pool().submit(_run_remote,job._ident,editor.getCurrent(),
+                                     editor.getFrameCount(),job.getName(),job.getArgs())
+        done = False
+        while not done:
+            done = bool(futures.wait([future],JobRunner.POLL_SECONDS)[0])
+            if job.isCancelled():
+                self._cancel.value = job._ident
+            job._update(self._shared.value)
+        image, result = future.result()
+        job._check()
+        editor.increment()
+        editor.adoptResult(job.getName(),job.getArgs(),image)
+        job._update(1.0)
+        return result
+
+
+    def _pool(self):
+        """
+        Returns: The worker process pool, creating it if necessary
+        """
+        if self._workers is None:
+            self._workers = futures.ProcessPoolExecutor(1,initializer=_init_remote,
+                                                        initargs=(self._cancel,self._shared))
+        return self._workers
+
+
+# WORKER PROCESS FUNCTIONS
+# The shared values of the worker process: [cancel, progress]
+_REMOTE = [None, None]
+
+
+def _init_remote(cancel, progress):
+    """
+    Stores the values shared with the runner, when the worker process starts.
+
+    Parameter cancel: The number of the job to cancel
+    Precondition: cancel is a multiprocessing Value of type 'q'
+
+    Parameter progress: The progress of the running job
+    Precondition: progress is a multiprocessing Value of type 'd'
+    """
+    _REMOTE[0] = cancel
+    _REMOTE[1] = progress
+
+
+def _run_remote(ident, image, frames, name, args):
+    """
+    Returns: The pair (image, result) after calling Editor method name on image
+
+    This is the function run by the worker process.  The call reports its progress
+    through the shared value, and raises JobCancelled at the end of a band once the
+    runner asks for job ident to be cancelled.
+
+    Parameter ident: The number of the job
+    Precondition: ident is an int >= 0
+
+    Parameter image: The image to edit
+    Precondition: image is an Image object
+
+    Parameter frames: The number of frames stacked in image (see the module a6batch)
+    Precondition: frames is an int > 0 that evenly divides the image height
+
+    Parameter name: The Editor method to call
+    Precondition: name is a str naming a public editing method of Editor
+
+    Parameter args: The method arguments
+    Precondition: args is a tuple of valid arguments for that method
+    """
+    cancel, progress = _REMOTE
+
+    def report(done, total):
+        progress.value = done/total
+        if cancel.value == ident:
+            raise JobCancelled('%s was cancelled' % name)
+
+    report(0,1)
+    if frames > 1:
+        image = a6batch.ImageBatch(image.getPixels(),image.getWidth(),frames)
+    editor = a6editor.Editor(image)
+    a6tiles.setProgress(report)
+    try:
+        result = getattr(editor,name)(*args)
+        return (editor.getCurrent(),result)
+    finally:
+        a6tiles.setProgress(None)
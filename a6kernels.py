@@ -0,0 +1,575 @@
+"""
+Bulk pixel kernels for our imager application.
+
+This module contains functions that process all of the pixels of an image in one
+pass.  They work directly on the raw interleaved RGB bytes of a PixelBuffer (see the
+method getData), rather than going through getPixel and setPixel once per pixel.
+
+If NumPy is installed, the kernels use it.  Otherwise they fall back to the fastest
+pure Python version we have (byte translation and extended slices).  Both versions
+produce exactly the same bytes as the original per-pixel loops in the Editor class.
+"""
+import functools
+import math
+import operator
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Translation table mapping each byte value v to itself
+IDENTITY_TABLE = bytes(range(256))
+
+# Translation table mapping each byte value v to 255-v
+INVERT_TABLE = bytes(255-v for v in range(256))
+
+# The brightness weights, precomputed for every channel value.  The brightness is
+# computed as 0.3*red + 0.6*green + 0.1*blue, so summing these table entries in the
+# same order gives exactly the same float as the original formula.
+_RED_WEIGHT   = [0.3*v for v in range(256)]
+_GREEN_WEIGHT = [0.6*v for v in range(256)]
+_BLUE_WEIGHT  = [0.1*v for v in range(256)]
+
+# The size (in pixels) of the square tiles used by the NumPy transpose
+TILE_SIZE = 64
+
+# The number of vignette masks (one per image size) kept by vignetteMask
+MASK_CACHE_SIZE = 8
+
+
+# POINT OPERATIONS
+def invert(data):
+    """
+    Inverts the pixels in data, replacing each value with its complement 255-value.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+    """
+    data[:] = data.translate(INVERT_TABLE)
+
+
+def mapChannels(data, tables):
+    """
+    Replaces each color value v in data with tables[k][v], where k is its channel.
+
+    This is one bytes.translate pass per channel (or over the whole buffer, if the
+    three tables are the same).
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter tables: The red, green and blue translation tables
+    Precondition: tables is a sequence of 3 bytes objects, each of length 256
+    """
+    if tables[0] == tables[1] == tables[2]:
+        data[:] = data.translate(tables[0])
+        return
+    for k in range(3):
+        data[k::3] = data[k::3].translate(tables[k])
+
+
+def greyscale(data, pre=None, post=None):
+    """
+    Converts the pixels in data to greyscale.
+
+    Each of the three color components is set to int(0.3*red + 0.6*green + 0.1*blue),
+    exactly as in the per-pixel version of Editor.monochromify.
+
+    The optional tables let other per-channel operations be fused into the same pass.
+    If pre is not None, each value v is first replaced by pre[k][v] (k the channel).
+    If post is not None, each result v is then replaced by post[k][v].
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter pre: The tables to apply before the conversion
+    Precondition: pre is None or a sequence of 3 bytes objects of length 256
+
+    Parameter post: The tables to apply after the conversion
+    Precondition: post is None or a sequence of 3 bytes objects of length 256
+    """
+    if numpy is not None:
+        rgb = _as_array(data)
+        brightness = _brightness(_mapped(rgb,pre)).astype(numpy.uint8)
+        for k in range(3):
+            rgb[:,k] = brightness if post is None else _lookup(post[k])[brightness]
+        return
+
+    values = bytes(_brightness_values(data,pre))
+    for k in range(3):
+        data[k::3] = values if post is None else values.translate(post[k])
+
+
+def sepia(data, pre=None, post=None):
+    """
+    Converts the pixels in data to sepia tone.
+
+    The red component is unchanged, green is set to int(0.6*brightness) and blue is
+    set to int(0.4*brightness), exactly as in the per-pixel version of
+    Editor.monochromify.
+
+    The optional tables let other per-channel operations be fused into the same pass.
+    If pre is not None, each value v is first replaced by pre[k][v] (k the channel).
+    If post is not None, each result v is then replaced by post[k][v].
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter pre: The tables to apply before the conversion
+    Precondition: pre is None or a sequence of 3 bytes objects of length 256
+
+    Parameter post: The tables to apply after the conversion
+    Precondition: post is None or a sequence of 3 bytes objects of length 256
+    """
+    if numpy is not None:
+        rgb = _as_array(data)
+        mapped = _mapped(rgb,pre)
+        brightness = _brightness(mapped)
+        result = [mapped[:,0],(0.6*brightness).astype(numpy.uint8),
+                  (0.4*brightness).astype(numpy.uint8)]
+        for k in range(3):
+            rgb[:,k] = result[k] if post is None else _lookup(post[k])[result[k]]
+        return
+
+    brightness = _float_brightness(data,pre)
+    result = [data[0::3] if pre is None else data[0::3].translate(pre[0]),
+              bytes([int(0.6*value) for value in brightness]),
+              bytes([int(0.4*value) for value in brightness])]
+    for k in range(3):
+        data[k::3] = result[k] if post is None else result[k].translate(post[k])
+
+
+def scale(data, mask):
+    """
+    Multiplies every pixel in data by the matching factor in mask.
+
+    Each color value v of pixel n becomes int(mask[n]*v).  This is one pass over
+    each color channel.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter mask: The factor for each pixel
+    Precondition: mask is a sequence of len(data)//3 floats, each in the range 0..1
+    """
+    assert len(mask) == len(data)//3
+    if numpy is not None:
+        rgb = _as_array(data)
+        factors = numpy.frombuffer(mask,dtype=numpy.float64)[:,None]
+        rgb[:] = (factors*rgb).astype(numpy.uint8)
+        return
+
+    for k in range(3):
+        data[k::3] = bytes(map(int,map(operator.mul,mask,data[k::3])))
+
+
+@functools.lru_cache(maxsize=MASK_CACHE_SIZE)
+def vignetteMask(width, height):
+    """
+    Returns: The vignette darkening factor of each pixel, as an array of floats
+
+    The factor for the pixel at (row,col) is 1 - (d / hfD)^2, where d is the distance
+    from the pixel to the center of the image and hfD is half of the diagonal.  The
+    factors are computed with the same float operations (in the same order) as the
+    original per-pixel version of Editor.vignette, so the results are identical.
+
+    The masks for the last MASK_CACHE_SIZE image sizes are cached, so vignetting many
+    images of the same size only computes the mask once.  The result must not be
+    modified.
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    return vignetteRows(width,height,0,height)
+
+
+def vignetteRows(width, height, top, rows):
+    """
+    Returns: The vignette factors of rows top..top+rows-1, as an array of floats
+
+    These are the same factors as in vignetteMask(width,height), but only for some of
+    the rows.  They are not cached, so the memory used only depends on rows.  This is
+    for images that are processed one band of rows at a time.
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+
+    Parameter top: The first row
+    Precondition: top is an int >= 0
+
+    Parameter rows: The number of rows
+    Precondition: rows is an int >= 0 with top+rows <= height
+    """
+    hfD = math.sqrt((width/2)**2+(height/2)**2)
+    across = [(width/2-y)**2 for y in range(width)]
+    mask = array('d')
+    for x in range(top,top+rows):
+        down = (height/2-x)**2
+        mask.extend([1 - (math.sqrt(down+dx) / hfD)**2 for dx in across])
+    return mask
+
+
+# GEOMETRIC OPERATIONS
+def transpose(data, width, height):
+    """
+    Transposes the pixels in data, so pixel (row,col) moves to (col,row).
+
+    The result has the width and height swapped; it is up to the caller to update the
+    image size.  Square images are transposed in place, one row/column pair at a time,
+    so no copy of the image is ever made.  Other images are copied column by column
+    (or tile by tile, with NumPy).
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    assert len(data) == 3*width*height
+    if width == height:
+        _transpose_square(data,width)
+    elif numpy is not None:
+        _transpose_tiled(data,width,height)
+    else:
+        data[:] = _gather_columns(data,width,range(width),False)
+
+
+def rotateRight(data, width, height):
+    """
+    Rotates the pixels in data right by 90 degrees.
+
+    The result has the width and height swapped; it is up to the caller to update the
+    image size.  Square images are rotated in place (a transpose followed by a
+    horizontal reflection).
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    assert len(data) == 3*width*height
+    if width == height:
+        _transpose_square(data,width)
+        reflectHori(data,width,height)
+    else:
+        data[:] = _gather_columns(data,width,range(width),True)
+
+
+def rotateLeft(data, width, height):
+    """
+    Rotates the pixels in data left by 90 degrees.
+
+    The result has the width and height swapped; it is up to the caller to update the
+    image size.  Square images are rotated in place (a transpose followed by a
+    vertical reflection).
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    assert len(data) == 3*width*height
+    if width == height:
+        _transpose_square(data,width)
+        reflectVert(data,width,height)
+    else:
+        data[:] = _gather_columns(data,width,range(width-1,-1,-1),False)
+
+
+def reflectHori(data, width, height):
+    """
+    Reflects the pixels in data around the horizontal middle (left-right mirror).
+
+    Each row is reversed in place with one slice assignment per color channel.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    assert len(data) == 3*width*height
+    stride = 3*width
+    for start in range(0,len(data),stride):
+        row = data[start:start+stride]
+        data[start:start+stride:3]   = row[-3::-3]
+        data[start+1:start+stride:3] = row[-2::-3]
+        data[start+2:start+stride:3] = row[-1::-3]
+
+
+def reflectVert(data, width, height):
+    """
+    Reflects the pixels in data around the vertical middle (top-bottom mirror).
+
+    Whole rows are swapped in place, so only one row is ever copied at a time.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    assert len(data) == 3*width*height
+    stride = 3*width
+    for row in range(height//2):
+        top = row*stride
+        bot = (height-1-row)*stride
+        saved = data[top:top+stride]
+        data[top:top+stride] = data[bot:bot+stride]
+        data[bot:bot+stride] = saved
+
+
+# RESAMPLING
+def halve(data, width, height):
+    """
+    Returns: The triple (bytes, width//2, height//2) of data scaled down by half
+
+    Each pixel of the result is the average of a 2x2 block of data, rounded down (an
+    odd last row or column is dropped).  The averages are taken two values at a time
+    over the whole buffer, as one big integer (see _average), so there is no Python
+    loop over the pixels.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytes-like object of interleaved RGB bytes (or an mmap)
+
+    Parameter width: The image width
+    Precondition: width is an int >= 2 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int >= 2
+    """
+    assert width >= 2 and height >= 2
+    stride = 3*width
+    size   = 6*(width//2)
+    rows   = height//2
+    upper  = b''.join([data[2*row*stride:2*row*stride+size] for row in range(rows)])
+    lower  = b''.join([data[(2*row+1)*stride:(2*row+1)*stride+size] for row in range(rows)])
+    pairs  = _average(upper,lower)
+    left   = bytearray(len(pairs)//2)
+    right  = bytearray(len(pairs)//2)
+    for channel in range(3):
+        left[channel::3]  = pairs[channel::6]
+        right[channel::3] = pairs[3+channel::6]
+    return (bytearray(_average(left,right)), width//2, rows)
+
+
+# HELPER FUNCTIONS
+def _average(first, second):
+    """
+    Returns: The bytes (a+b)//2 for each pair of bytes a, b of first and second
+
+    Both are read as one big integer each, and averaged with the carry-free identity
+    (a+b)//2 == (a & b) + ((a ^ b) >> 1), with a mask to keep each shifted byte in place.
+
+    Parameter first: The first bytes
+    Precondition: first is a bytes-like object
+
+    Parameter second: The second bytes
+    Precondition: second is a bytes-like object with the same length as first
+    """
+    size = len(first)
+    a = int.from_bytes(first,'big')
+    b = int.from_bytes(second,'big')
+    mask = int.from_bytes(b'\x7f'*size,'big')
+    return ((a & b) + (((a ^ b) >> 1) & mask)).to_bytes(size,'big')
+
+
+def _transpose_square(data, size):
+    """
+    Transposes the square image in data in place.
+
+    For each diagonal position i, the rest of row i is swapped with the rest of
+    column i.  Columns are read and written with extended slices, one per channel.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter size: The image width (and height)
+    Precondition: size is an int > 0 and size*size*3 == len(data)
+    """
+    stride = 3*size
+    for i in range(size-1):
+        count = size-1-i
+        rowstart = i*stride+3*(i+1)
+        colstart = (i+1)*stride+3*i
+        row = data[rowstart:rowstart+3*count]
+        for k in range(3):
+            colslice = slice(colstart+k,colstart+k+stride*(count-1)+1,stride)
+            col = data[colslice]
+            data[colslice] = row[k::3]
+            data[rowstart+k:rowstart+3*count:3] = col
+
+
+def _transpose_tiled(data, width, height):
+    """
+    Transposes the image in data with NumPy, one TILE_SIZE x TILE_SIZE block at a time.
+
+    Working in tiles keeps both the rows read and the rows written in cache.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes and NumPy is installed
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and width*height*3 == len(data)
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    source = numpy.frombuffer(data,dtype=numpy.uint8).reshape(height,width,3).copy()
+    target = numpy.frombuffer(data,dtype=numpy.uint8).reshape(width,height,3)
+    for row in range(0,height,TILE_SIZE):
+        for col in range(0,width,TILE_SIZE):
+            block = source[row:row+TILE_SIZE,col:col+TILE_SIZE]
+            target[col:col+TILE_SIZE,row:row+TILE_SIZE] = block.transpose(1,0,2)
+
+
+def _gather_columns(data, width, columns, reverse):
+    """
+    Returns: A new bytearray whose rows are the given columns of the image in data
+
+    Each column is read with one extended slice per channel, from top to bottom (or
+    from bottom to top if reverse is True).
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 that evenly divides len(data)//3
+
+    Parameter columns: The columns to gather, in output order
+    Precondition: columns is an iterable of ints in 0..width-1
+
+    Parameter reverse: Whether to read the columns from bottom to top
+    Precondition: reverse is a bool
+    """
+    stride = 3*width
+    result = bytearray(len(data))
+    for k in range(3):
+        if reverse:
+            plane = b''.join(data[k+3*col::stride][::-1] for col in columns)
+        else:
+            plane = b''.join(data[k+3*col::stride] for col in columns)
+        result[k::3] = plane
+    return result
+
+
+def _as_array(data):
+    """
+    Returns: A NumPy view of data with shape (pixels, 3)
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes and NumPy is installed
+    """
+    return numpy.frombuffer(data,dtype=numpy.uint8).reshape(-1,3)
+
+
+def _brightness(rgb):
+    """
+    Returns: A float64 array with the brightness of each pixel in rgb
+
+    The operations are performed in the same order as 0.3*red + 0.6*green + 0.1*blue
+    so that the result is identical to the pure Python formula.
+
+    Parameter rgb: The pixels to measure
+    Precondition: rgb is a NumPy uint8 array of shape (pixels, 3)
+    """
+    rgb = rgb.astype(numpy.float64)
+    return 0.3*rgb[:,0] + 0.6*rgb[:,1] + 0.1*rgb[:,2]
+
+
+def _float_brightness(data, pre=None):
+    """
+    Returns: A list with the (float) brightness of each pixel in data
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter pre: The tables to apply to each channel first
+    Precondition: pre is None or a sequence of 3 bytes objects of length 256
+    """
+    red, green, blue = _weights(pre)
+    return [red[r]+green[g]+blue[b] for r,g,b in zip(data[0::3],data[1::3],data[2::3])]
+
+
+def _brightness_values(data, pre=None):
+    """
+    Returns: A list with the (truncated int) brightness of each pixel in data
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter pre: The tables to apply to each channel first
+    Precondition: pre is None or a sequence of 3 bytes objects of length 256
+    """
+    red, green, blue = _weights(pre)
+    return [int(red[r]+green[g]+blue[b])
+            for r,g,b in zip(data[0::3],data[1::3],data[2::3])]
+
+
+def _weights(pre):
+    """
+    Returns: The red, green and blue brightness weight tables, composed with pre
+
+    Entry v of the red table is 0.3*pre[0][v] (and so on), so looking up an unmapped
+    value gives exactly the weight of the mapped value.
+
+    Parameter pre: The tables to apply to each channel first
+    Precondition: pre is None or a sequence of 3 bytes objects of length 256
+    """
+    if pre is None:
+        return (_RED_WEIGHT,_GREEN_WEIGHT,_BLUE_WEIGHT)
+    return ([_RED_WEIGHT[v] for v in pre[0]],[_GREEN_WEIGHT[v] for v in pre[1]],
+            [_BLUE_WEIGHT[v] for v in pre[2]])
+
+
+def _mapped(rgb, pre):
+    """
+    Returns: The NumPy pixels rgb with the tables pre applied to each channel
+
+    If pre is None, this returns rgb itself.
+
+    Parameter rgb: The pixels to map
+    Precondition: rgb is a NumPy uint8 array of shape (pixels, 3)
+
+    Parameter pre: The tables to apply to each channel
+    Precondition: pre is None or a sequence of 3 bytes objects of length 256
+    """
+    if pre is None:
+        return rgb
+    return numpy.stack([_lookup(pre[k])[rgb[:,k]] for k in range(3)],axis=1)
+
+
+def _lookup(table):
+    """
+    Returns: The translation table as a NumPy uint8 array
+
+    Parameter table: The table to convert
+    Precondition: table is a bytes object of length 256 and NumPy is installed
+    """
+    return numpy.frombuffer(table,dtype=numpy.uint8)
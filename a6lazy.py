@@ -0,0 +1,195 @@
+"""
+Deferred execution of Editor operations for our imager application.
+
+This module contains a single class.  An operation graph records Editor operations
+instead of running them, and runs them all at once when the pixels are needed.  Before
+running them, it simplifies them in two ways:
+
+    * Geometric operations (transpose, rotations and reflections) are collapsed into
+      the shortest equivalent sequence.  So rotateRight four times does nothing, and
+      rotateLeft followed by transpose is a single reflectHori.
+    * Point operations (invert, monochromify and the other lookup table filters) are
+      fused into one PointLUT (see the module a6lut), so that a chain of them is
+      applied in as few passes over the pixels as possible (usually one).
+
+Point operations change each pixel without looking at its position, and geometric
+operations move pixels without changing them.  So the two kinds commute, and the
+graph can collapse all the geometric operations and fuse all the point operations no
+matter how they are interleaved.  Any other operation is not deferred; the Editor runs
+the graph before it.
+"""
+import a6kernels
+import a6lut
+import a6tiles
+
+
+# The operations that change each pixel on its own
+POINT_OPERATIONS = ('invert', 'monochromify', 'brightness', 'contrast', 'gamma',
+                    'levels', 'applyLUT')
+
+# The operations that move pixels without changing them
+GEOMETRIC_OPERATIONS = ('transpose', 'rotateRight', 'rotateLeft', 'reflectHori',
+                        'reflectVert')
+
+
+class OperationGraph(object):
+    """
+    A class that records deferred point and geometric operations.
+
+    The operations are stored as (name, args) pairs in the order they were added.  The
+    method plan turns them into the steps that are actually run by execute.
+
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _nodes: The recorded operations, in order   [list of (str, tuple) pairs]
+    Every name in _nodes is in POINT_OPERATIONS or GEOMETRIC_OPERATIONS.
+    """
+
+    # GETTERS
+    def getOperations(self):
+        """
+        Returns: A copy of the list of recorded (name, args) pairs
+        """
+        return self._nodes[:]
+
+
+    def isEmpty(self):
+        """
+        Returns: True if there are no recorded operations, False otherwise
+        """
+        return not self._nodes
+
+    # INITIALIZER
+    def __init__(self):
+        """
+        Initializer: Creates an empty operation graph.
+        """
+        self._nodes = []
+
+    # EDIT METHODS
+    def add(self, name, args=()):
+        """
+        Records the operation name with the given arguments.
+
+        Parameter name: The Editor method name
+        Precondition: name is in POINT_OPERATIONS or GEOMETRIC_OPERATIONS
+
+        Parameter args: The method arguments
+        Precondition: args is a tuple
+        """
+        assert name in POINT_OPERATIONS or name in GEOMETRIC_OPERATIONS
+        self._nodes.append((name,tuple(args)))
+
+
+    def clear(self):
+        """
+        Deletes all of the recorded operations.
+        """
+        self._nodes = []
+
+
+    def plan(self):
+        """
+        Returns: The pair (geometric, lut) that has the same effect as the recorded ones
+
+        The value geometric is the shortest list of geometric operation names, and lut
+        is a PointLUT that does all of the point operations.  Doing the geometric
+        operations and then the lut is the same as doing the recorded operations.
+        """
+        geometric = simplifyGeometry([name for name, args in self._nodes
+                                      if name in GEOMETRIC_OPERATIONS])
+        lut = a6lut.PointLUT()
+        for name, args in self._nodes:
+            if name in POINT_OPERATIONS:
+                lut = lut.then(a6lut.operationLUT(name,args))
+        return (geometric,lut)
+
+
+    def execute(self, image, frames=1):
+        """
+        Returns: The names of the operations actually run on image
+
+        This runs the simplified plan on image, and then clears the graph.  The fused
+        point operations are reported as 'invert' if that is all they do, and as
+        'applyLUT' otherwise.
+
+        Parameter image: The image to modify
+        Precondition: image is an Image object
+
+        Parameter frames: The number of frames stacked in image (see the module a6batch)
+        Precondition: frames is an int > 0 that evenly divides the image height
+        """
+        geometric, lut = self.plan()
+        names = []
+        for name in geometric:
+            a6tiles.runTransform(image,name,frames=frames)
+            names.append(name)
+        if not lut.isIdentity():
+            a6tiles.runKernel(image,'applyLUT',(lut,))
+            names.append('invert' if lut.isInvert() else 'applyLUT')
+        self.clear()
+        return names
+
+
+def simplifyGeometry(names):
+    """
+    Returns: The shortest list of geometric operations equivalent to names
+
+    Every sequence of transposes, rotations and reflections is one of only eight
+    transformations (the symmetries of a rectangle).  Each of these can be done with
+    at most two operations.
+
+    Parameter names: The geometric operations, in order
+    Precondition: names is a list of names in GEOMETRIC_OPERATIONS
+    """
+    if not names:
+        return []
+    shortest = _shortest_sequences()
+    return list(shortest[_signature(names)])
+
+
+# HELPER FUNCTIONS
+def _signature(names):
+    """
+    Returns: A value identifying the transformation done by names
+
+    This runs the operations on a small 2x3 image with a different value in every
+    pixel, and returns the result (with its width).  Two sequences of operations have
+    the same signature exactly when they do the same thing to every image.
+
+    Parameter names: The geometric operations, in order
+    Precondition: names is a list of names in GEOMETRIC_OPERATIONS
+    """
+    data = bytearray(range(18))
+    width, height = 3, 2
+    for name in names:
+        getattr(a6kernels,name)(data,width,height)
+        if name not in ('reflectHori','reflectVert'):
+            width, height = height, width
+    return (bytes(data),width)
+
+
+def _shortest_sequences():
+    """
+    Returns: A dictionary from each signature to its shortest sequence of operations
+
+    This is computed once (with a breadth-first search) and then cached.
+    """
+    global _SHORTEST
+    if _SHORTEST is None:
+        shortest = {_signature([]):()}
+        frontier = [()]
+        while frontier:
+            following = []
+            for sequence in frontier:
+                for name in GEOMETRIC_OPERATIONS:
+                    candidate = sequence+(name,)
+                    signature = _signature(list(candidate))
+                    if signature not in shortest:
+                        shortest[signature] = candidate
+                        following.append(candidate)
+            frontier = following
+        _SHORTEST = shortest
+    return _SHORTEST
+
+# The cache for _shortest_sequences
+_SHORTEST = None
@@ -0,0 +1,326 @@
+"""
+Lookup tables (LUTs) for point operations in our imager application.
+
+A point operation computes each new pixel from the old value of that pixel alone.  As
+each color value is one of only 256 numbers, such an operation can be computed ONCE
+for each possible value and stored in a table.  Applying the operation to an image is
+then a single table lookup per value (bytes.translate), no matter how complicated the
+arithmetic was.
+
+This module contains a single class, PointLUT, plus functions that build the tables
+for the Editor point operations.  There are two kinds of table:
+
+    * Per-channel tables map each red, green and blue value on its own (invert,
+      brightness, contrast, gamma, levels).
+    * Cross-channel tables combine the three channels into a brightness (the
+      greyscale and sepia conversions of monochromify).
+
+Tables compose: lut1.then(lut2) is a single PointLUT that does lut1 and then lut2.  A
+chain of point operations almost always composes into a table that is applied in one
+pass over the pixels.
+"""
+import a6kernels
+
+
+class PointLUT(object):
+    """
+    A class that applies a chain of point operations as lookup tables.
+
+    The operations are stored as a list of stages.  Each stage is a list [pre, cross,
+    post], and is applied in one pass over the pixels:
+
+        pre:   The per-channel tables applied first    [None, or list of 3 bytes]
+        cross: The cross-channel conversion            [None, 'greyscale' or 'sepia']
+        post:  The per-channel tables applied last     [None, or list of 3 bytes]
+
+    If cross is None, then post is None too.  Composing tables merges stages whenever
+    the result can still be done in one pass, so most chains have a single stage.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _stages: The stages, in order   [list of [pre, cross, post] lists]
+    """
+
+    # GETTERS
+    def getPasses(self):
+        """
+        Returns: The number of passes over the pixels that apply needs
+        """
+        return len(self._stages)
+
+
+    def isIdentity(self):
+        """
+        Returns: True if this table leaves every pixel unchanged, False otherwise
+        """
+        return not self._stages
+
+
+    def getStages(self):
+        """
+        Returns: The stages of this table, as a tuple of (pre, cross, post) tuples
+
+        Two tables with the same stages change the pixels in the same way.
+        """
+        return tuple((None if pre is None else tuple(pre), cross,
+                      None if post is None else tuple(post))
+                     for pre, cross, post in self._stages)
+
+
+    def isInvert(self):
+        """
+        Returns: True if this table is exactly the invert operation, False otherwise
+        """
+        return self._stages == [[[a6kernels.INVERT_TABLE]*3,None,None]]
+
+    # INITIALIZER
+    def __init__(self, tables=None, cross=None):
+        """
+        Initializer: Creates a lookup table with a single stage.
+
+        If tables is a bytes object, it is used for all three channels.  If both
+        tables and cross are None, the table is the identity (it changes nothing).
+
+        Parameter tables: The per-channel tables
+        Precondition: tables is None, a bytes object of length 256, or a sequence of
+        3 bytes objects of length 256
+
+        Parameter cross: The cross-channel conversion to do after the tables
+        Precondition: cross is None, 'greyscale' or 'sepia'
+        """
+        assert cross in (None,'greyscale','sepia')
+        if isinstance(tables,(bytes,bytearray)):
+            tables = [bytes(tables)]*3
+        elif tables is not None:
+            tables = [bytes(table) for table in tables]
+            assert len(tables) == 3
+        if tables is not None:
+            assert all(len(table) == 256 for table in tables)
+            if tables == [a6kernels.IDENTITY_TABLE]*3:
+                tables = None
+
+        if tables is None and cross is None:
+            self._stages = []
+        else:
+            self._stages = [[tables,cross,None]]
+
+    # ADDITIONAL METHODS
+    def then(self, other):
+        """
+        Returns: A new PointLUT that applies this table and then other
+
+        Neither table is modified.  The last stage of this table and the first stage
+        of other are merged into one when possible.  This is always possible unless
+        this table ends in a sepia conversion and other starts with a cross-channel
+        conversion.
+
+        Parameter other: The table to apply second
+        Precondition: other is a PointLUT object
+        """
+        result = PointLUT()
+        stages = [list(stage) for stage in self._stages]
+        for stage in other._stages:
+            stage = list(stage)
+            if not stages:
+                stages.append(stage)
+            elif stage[1] is None:
+                last = stages[-1]
+                if last[1] is None:
+                    last[0] = _compose(last[0],stage[0])
+                else:
+                    last[2] = _compose(last[2],stage[0])
+            elif stages[-1][1] is None:
+                stage[0] = _compose(stages[-1][0],stage[0])
+                stages[-1] = stage
+            elif stages[-1][1] == 'greyscale':
+                stages[-1][2] = _fold_after_grey(stages[-1],stage)
+            else:
+                stages.append(stage)
+        result._stages = stages
+        return result
+
+
+    def apply(self, data):
+        """
+        Applies this table to the pixels in data.
+
+        Parameter data: The raw pixel bytes to modify
+        Precondition: data is a bytearray of interleaved RGB bytes
+        """
+        for stage in self._stages:
+            _apply_stage(stage,data)
+
+
+    def evaluate(self, pixel):
+        """
+        Returns: The (r,g,b) value that this table maps pixel to
+
+        Parameter pixel: The pixel value
+        Precondition: pixel is a 3-element tuple (r,g,b) where each value is 0..255
+        """
+        data = bytearray(pixel)
+        self.apply(data)
+        return tuple(data)
+
+
+# TABLE CONSTRUCTORS
+def invertLUT():
+    """
+    Returns: The table for Editor.invert (each value v becomes 255-v)
+    """
+    return PointLUT(a6kernels.INVERT_TABLE)
+
+
+def monochromeLUT(sepia):
+    """
+    Returns: The table for Editor.monochromify
+
+    Parameter sepia: Whether to use sepia tone instead of greyscale.
+    Precondition: sepia is a bool
+    """
+    return PointLUT(None,'sepia' if sepia == True else 'greyscale')
+
+
+def brightnessLUT(amount):
+    """
+    Returns: The table that adds amount to every color value (clamped to 0..255)
+
+    Parameter amount: The change in brightness
+    Precondition: amount is an int
+    """
+    return PointLUT(bytes(_clamp(v+amount) for v in range(256)))
+
+
+def contrastLUT(factor):
+    """
+    Returns: The table that scales every color value away from (or toward) 128
+
+    Each value v becomes round(128 + factor*(v-128)), clamped to 0..255.  So a factor
+    above 1 increases the contrast, and a factor below 1 decreases it.
+
+    Parameter factor: The contrast factor
+    Precondition: factor is a number >= 0
+    """
+    assert factor >= 0
+    return PointLUT(bytes(_clamp(round(128+factor*(v-128))) for v in range(256)))
+
+
+def gammaLUT(gamma):
+    """
+    Returns: The table that applies gamma correction to every color value
+
+    Each value v becomes round(255 * (v/255) ** (1/gamma)).  So a gamma above 1
+    brightens the dark areas, and a gamma below 1 darkens them.
+
+    Parameter gamma: The gamma value
+    Precondition: gamma is a number > 0
+    """
+    assert gamma > 0
+    return PointLUT(bytes(_clamp(round(255*(v/255)**(1/gamma))) for v in range(256)))
+
+
+def levelsLUT(low, high):
+    """
+    Returns: The table that stretches the values low..high to the full range 0..255
+
+    Values at or below low become 0, values at or above high become 255, and the
+    values in between are scaled linearly (and rounded).
+
+    Parameter low: The value that becomes black
+    Precondition: low is an int in 0..254
+
+    Parameter high: The value that becomes white
+    Precondition: high is an int in low+1..255
+    """
+    assert 0 <= low < high <= 255
+    return PointLUT(bytes(_clamp(round((v-low)*255/(high-low))) for v in range(256)))
+
+
+def operationLUT(name, args):
+    """
+    Returns: The table for the Editor point operation name with arguments args
+
+    Parameter name: The Editor method name
+    Precondition: name is one of 'invert', 'monochromify', 'brightness', 'contrast',
+    'gamma', 'levels' or 'applyLUT'
+
+    Parameter args: The method arguments
+    Precondition: args is a tuple of valid arguments for that method
+    """
+    if name == 'applyLUT':
+        return args[0]
+    if name == 'monochromify':
+        return monochromeLUT(*args)
+    return _CONSTRUCTORS[name](*args)
+
+
+# HELPER FUNCTIONS
+def _clamp(value):
+    """
+    Returns: value clamped to the range 0..255
+
+    Parameter value: The value to clamp
+    Precondition: value is an int
+    """
+    return min(255,max(0,value))
+
+
+def _compose(first, second):
+    """
+    Returns: The per-channel tables that apply first and then second
+
+    Parameter first: The tables to apply first (None for no change)
+    Precondition: first is None or a list of 3 bytes objects of length 256
+
+    Parameter second: The tables to apply second (None for no change)
+    Precondition: second is None or a list of 3 bytes objects of length 256
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return [first[k].translate(second[k]) for k in range(3)]
+
+
+def _apply_stage(stage, data):
+    """
+    Applies one [pre, cross, post] stage to the pixels in data.
+
+    Parameter stage: The stage to apply
+    Precondition: stage is a stage list, as described in PointLUT
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+    """
+    pre, cross, post = stage
+    if cross is None:
+        if pre is not None:
+            a6kernels.mapChannels(data,pre)
+    else:
+        getattr(a6kernels,cross)(data,pre,post)
+
+
+def _fold_after_grey(grey, stage):
+    """
+    Returns: The post tables that do a greyscale stage and then another stage
+
+    After a greyscale conversion (and its post tables), every pixel is determined by
+    one number, the greyscale value v.  So whatever stage does next is also a function
+    of v alone, and can be stored as a per-channel table indexed by v.
+
+    Parameter grey: The greyscale stage
+    Precondition: grey is a stage list whose cross is 'greyscale'
+
+    Parameter stage: The stage to do next
+    Precondition: stage is a stage list
+    """
+    post = grey[2] or [a6kernels.IDENTITY_TABLE]*3
+    data = bytearray(768)
+    for k in range(3):
+        data[k::3] = post[k]
+    _apply_stage(stage,data)
+    return [bytes(data[k::3]) for k in range(3)]
+
+
+# The constructors for the per-channel Editor operations
+_CONSTRUCTORS = {'invert':invertLUT, 'brightness':brightnessLUT,
+                 'contrast':contrastLUT, 'gamma':gammaLUT, 'levels':levelsLUT}
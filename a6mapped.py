@@ -0,0 +1,396 @@
+"""
+Memory-mapped images for our imager application.
+
+This module lets the Editor work on images that are too big to fit in memory.  The
+pixels of a mapped image are kept in a raw RGB file (3 bytes per pixel, row-major, no
+header), and the file is memory-mapped.  The operating system pages the pixels in and
+out as they are used, so only the pages being worked on take up memory.
+
+The Editor filters stream mapped images one band of rows at a time (see the module
+a6tiles), and the edit history keeps each older state as a sibling file instead of a
+copy in memory.  So the memory used does not depend on the size of the image.
+
+Sibling files are made next to the original file, and are deleted when the image that
+owns them is closed or garbage collected.  The original file is only changed by
+editing the image opened on it directly.  An Editor works on a sibling copy.
+"""
+import mmap
+import os
+import shutil
+import tempfile
+import weakref
+
+import a6buffer
+import a6image
+import a6tiles
+
+
+# The size (in bytes) of the chunks used to copy and compare files
+COPY_BYTES = 16*1024*1024
+
+# The suffix of the sibling files
+SIBLING_SUFFIX = '.a6map'
+
+
+class MappedBuffer(a6buffer.PixelBuffer):
+    """
+    A class that stores a list of pixels in a memory-mapped raw RGB file.
+
+    This acts like a PixelBuffer, except that getData returns an mmap object rather
+    than a bytearray.  An mmap supports indexing, slicing and slice assignment, but not
+    the other bytearray methods, so the bulk kernels must be run on bands copied out of
+    it (see the module a6tiles).
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _length:  The number of pixels in the list      [int >= 0]
+
+    MUTABLE ATTRIBUTES (Can be changed at any time)
+        _path:    The file holding the pixels           [str]
+        _owned:   Whether the file is deleted on close  [bool]
+        _data:    The mapping of the file               [mmap object, or None if closed]
+        _release: Closes the mapping (and deletes the file if owned) [weakref.finalize]
+        _exposures: The number of pixel sets and raw buffers handed out [int >= 0]
+    The file changes only in adopt, which also changes _data, _owned and _release.
+    """
+
+    # GETTERS
+    def getPath(self):
+        """
+        Returns: The path of the file holding the pixels
+        """
+        return self._path
+
+
+    def isOwned(self):
+        """
+        Returns: True if the file is deleted when this buffer is closed, False otherwise
+        """
+        return self._owned
+
+
+    def isClosed(self):
+        """
+        Returns: True if this buffer has been closed, False otherwise
+        """
+        return self._data is None
+
+    # INITIALIZER AND OPERATORS
+    def __init__(self, path, owned=False):
+        """
+        Initializer: Maps the raw RGB file at path.
+
+        Changes to the pixels are written to the file.  If owned is True, the file is
+        deleted when this buffer is closed or garbage collected.
+
+        Parameter path: The file to map
+        Precondition: path is a str naming a readable and writable file whose size is a
+        positive multiple of 3
+
+        Parameter owned: Whether this buffer owns (and deletes) the file
+        Precondition: owned is a bool
+        """
+        assert type(owned) == bool
+        size = os.path.getsize(path)
+        assert size > 0 and size % 3 == 0, repr(path)+' is not a raw RGB file'
+        self._length = size//3
+        self._exposures = 0
+        self._open(path,owned)
+
+
+    def __eq__(self, other):
+        """
+        Returns: True if other is a PixelBuffer with the same pixels, False otherwise
+
+        The pixels are compared one chunk at a time.
+
+        Parameter other: The object to compare with
+        Precondition: NONE
+        """
+        if not isinstance(other,a6buffer.PixelBuffer) or len(other) != self._length:
+            return False
+        mine  = self._data
+        yours = other._data
+        for pos in range(0,3*self._length,COPY_BYTES):
+            if mine[pos:pos+COPY_BYTES] != yours[pos:pos+COPY_BYTES]:
+                return False
+        return True
+
+    # ADDITIONAL METHODS
+    def copy(self):
+        """
+        Returns: A copy of this buffer, in a new sibling file
+
+        The file is copied by the operating system (with copy_file_range where it is
+        available), so the pixels never pass through this process.  On file systems
+        that support it, the copy shares its pages with the original until either is
+        written (copy-on-write).
+        """
+        self._data.flush()
+        path = _sibling_path(self._path)
+        _copy_file(self._path,path,3*self._length)
+        return MappedBuffer(path,True)
+
+
+    def sibling(self):
+        """
+        Returns: A new buffer of black pixels the same size as this one, in a sibling file
+        """
+        path = _sibling_path(self._path)
+        createFile(path,self._length)
+        return MappedBuffer(path,True)
+
+
+    def adopt(self, other):
+        """
+        Replaces the pixels of this buffer with those of other, WITHOUT copying them.
+
+        This buffer takes over the file of other, and closes its own file.  Afterwards
+        other is closed, and must not be used.
+
+        Parameter other: The buffer to take the pixels from
+        Precondition: other is a MappedBuffer with the same length as this one
+        """
+        assert isinstance(other,MappedBuffer) and len(other) == self._length
+        path, owned = other._path, other._owned
+        other._release.detach()
+        other._data.close()
+        other._data = None
+        self.close()
+        self._open(path,owned)
+
+
+    def flush(self):
+        """
+        Writes any changed pixels to the file.
+        """
+        self._data.flush()
+
+
+    def close(self):
+        """
+        Closes the mapping, and deletes the file if this buffer owns it.
+
+        This does nothing if the buffer is already closed.
+        """
+        self._release()
+        self._data = None
+
+    # HELPER METHODS
+    def _open(self, path, owned):
+        """
+        Maps the file at path as the pixels of this buffer.
+
+        Parameter path: The file to map
+        Precondition: path is a str naming a raw RGB file of 3*len(self) bytes
+
+        Parameter owned: Whether this buffer owns (and deletes) the file
+        Precondition: owned is a bool
+        """
+        with open(path,'r+b') as file:
+            self._data = mmap.mmap(file.fileno(),3*self._length)
+        self._path = path
+        self._owned = owned
+        self._release = weakref.finalize(self,_release,self._data,path if owned else None)
+
+
+class MappedImage(a6image.Image):
+    """
+    A class for images whose pixels are in a memory-mapped raw RGB file.
+
+    This is an Image whose pixel list is a MappedBuffer.  Everything that works on an
+    Image works on a MappedImage, but the bulk operations should go through the module
+    a6tiles, which streams the pixels one band at a time.  Copies are sibling files.
+
+    There are no new attributes.  The attribute _pixels is a MappedBuffer.
+    """
+
+    # INITIALIZER
+    def __init__(self, data, width):
+        """
+        Initializer: Creates a mapped image from the given file or buffer.
+
+        If data is a str, the file it names is mapped (and is NOT deleted when the
+        image is closed).  If it is a MappedBuffer, the image uses it directly.
+
+        Parameter data: The raw RGB file or the mapped pixels
+        Precondition: data is a str naming a raw RGB file, or a MappedBuffer object
+
+        Parameter width: The image width
+        Precondition: width is an int > 0 and evenly divides the length of pixels
+        """
+        if isinstance(data,str):
+            data = MappedBuffer(data)
+        assert isinstance(data,MappedBuffer)
+        a6image.Image.__init__(self,data,width)
+
+    # ADDITIONAL METHODS
+    def isMapped(self):
+        """
+        Returns: True, since the pixels of this image are memory-mapped
+        """
+        return True
+
+
+    def applyLUT(self, lut):
+        """
+        Applies the lookup table lut to every pixel of this image, one band at a time.
+
+        Parameter lut: The lookup table to apply
+        Precondition: lut is a PointLUT object (see the module a6lut)
+        """
+        a6tiles.runKernel(self,'applyLUT',(lut,))
+
+
+    def copy(self):
+        """
+        Returns: A copy of this image, in a new sibling file.
+
+        The copy is also a MappedImage, and its file is deleted when it is closed.
+        """
+        return MappedImage(self._pixels.copy(),self._width)
+
+
+    def close(self):
+        """
+        Closes the pixel file of this image (deleting it if it is a sibling file).
+        """
+        self._pixels.close()
+
+
+# FILE FUNCTIONS
+def createFile(path, length):
+    """
+    Creates a raw RGB file of length black pixels at path.
+
+    The file is extended without writing it, so on most file systems it takes up no
+    disk space until the pixels are set.
+
+    Parameter path: The file to create (replacing any file already there)
+    Precondition: path is a str naming a writable file
+
+    Parameter length: The number of pixels
+    Precondition: length is an int > 0
+    """
+    assert isinstance(length,int) and length > 0
+    with open(path,'wb') as file:
+        file.truncate(3*length)
+
+
+def createImage(path, width, height):
+    """
+    Returns: A new black MappedImage of the given size, stored in the file path
+
+    Parameter path: The file to create (replacing any file already there)
+    Precondition: path is a str naming a writable file
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter height: The image height
+    Precondition: height is an int > 0
+    """
+    assert isinstance(width,int) and width > 0
+    assert isinstance(height,int) and height > 0
+    createFile(path,width*height)
+    return MappedImage(path,width)
+
+
+def openImage(path, width):
+    """
+    Returns: A MappedImage for the raw RGB file at path
+
+    Parameter path: The raw RGB file
+    Precondition: path is a str naming a raw RGB file
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 and evenly divides the number of pixels in path
+    """
+    return MappedImage(path,width)
+
+
+def saveRaw(image, path):
+    """
+    Writes the pixels of image to path as a raw RGB file, one chunk at a time.
+
+    Parameter image: The image to save
+    Precondition: image is an Image object
+
+    Parameter path: The file to write
+    Precondition: path is a str naming a writable file
+    """
+    data = image.getData()
+    with open(path,'wb') as file:
+        for pos in range(0,len(data),COPY_BYTES):
+            file.write(data[pos:pos+COPY_BYTES])
+
+
+# HELPER FUNCTIONS
+def _sibling_path(path):
+    """
+    Returns: The path of a new, empty sibling file for the file at path
+
+    The file is created in the same directory (so that copies can share pages), with
+    a unique name.
+
+    Parameter path: The file to make a sibling of
+    Precondition: path is a str naming a file
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    handle, sibling = tempfile.mkstemp(SIBLING_SUFFIX,name+'.',folder)
+    os.close(handle)
+    return sibling
+
+
+def _copy_file(source, target, size):
+    """
+    Copies the first size bytes of the file source to the file target.
+
+    This uses os.copy_file_range if it is available, so the copy happens inside the
+    operating system (and may share pages).  Otherwise, it copies COPY_BYTES at a time.
+
+    Parameter source: The file to copy from
+    Precondition: source is a str naming a file of at least size bytes
+
+    Parameter target: The file to copy to
+    Precondition: target is a str naming a writable file
+
+    Parameter size: The number of bytes to copy
+    Precondition: size is an int >= 0
+    """
+    with open(source,'rb') as infile, open(target,'wb') as outfile:
+        if hasattr(os,'copy_file_range'):
+            try:
+                done = 0
+                while done < size:
+                    count = os.copy_file_range(infile.fileno(),outfile.fileno(),
+                                               size-done,done,done)
+                    if count == 0:
+                        break
+                    done += count
+                if done == size:
+                    return
+            except OSError:
+                pass
+            outfile.seek(0)
+            outfile.truncate()
+        shutil.copyfileobj(infile,outfile,COPY_BYTES)
+
+
+def _release(data, path):
+    """
+    Closes the mapping data, and deletes the file path if it is not None.
+
+    This is the finalizer of each MappedBuffer.  It must not refer to the buffer.
+
+    Parameter data: The mapping to close
+    Precondition: data is an mmap object
+
+    Parameter path: The file to delete
+    Precondition: path is None or a str naming a file
+    """
+    data.close()
+    if path is not None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
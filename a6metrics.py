@@ -0,0 +1,476 @@
+"""
+Opt-in instrumentation for our imager application.
+
+This module measures where the time goes when the imager is slow.  It records
+
+    * counters of pixel reads and writes on Image (by getPixel, setPixel, the flat
+      and bulk versions, and swapPixels) and of image copies (with the bytes copied),
+    * the number of calls, total time and (optionally) allocated bytes of every
+      public Editor and ImageHistory method, and
+    * gauges of the memory used by the edit history, updated after every increment,
+      undo, redo and clear.
+
+Everything is off until enable is called.  The instrumentation works by replacing the
+methods of the classes with measuring wrappers, and disable puts the original methods
+back.  So when it is disabled, the accessors are exactly the original functions and
+there is no overhead at all.
+
+The measurements are kept in a Registry.  Exporters are functions that are given a
+snapshot of the registry each time export is called; prometheusExporter makes one that
+writes the Prometheus text format to a file.
+"""
+import functools
+import os
+import threading
+import time
+import tracemalloc
+
+import a6editor
+import a6history
+import a6image
+import a6mapped
+
+
+# The prefix of every metric name in the Prometheus text format
+PREFIX = 'a6_'
+
+# The counters kept by every registry, with their help text
+COUNTERS = {'pixel_reads':'Pixels read with the Image accessors',
+            'pixel_writes':'Pixels written with the Image accessors',
+            'image_copies':'Images copied with Image.copy',
+            'image_copy_bytes':'Pixel bytes copied by Image.copy'}
+
+# The gauges kept by every registry, with their help text
+GAUGES = {'history_depth':'States in the edit history',
+          'history_resident_bytes':'Uncompressed pixel bytes held by the history',
+          'history_compressed_bytes':'Bytes held by compressed history deltas',
+          'history_uncompressed_bytes':'Size of the compressed deltas before compression'}
+
+
+class Registry(object):
+    """
+    A class that holds the measurements made while instrumentation is enabled.
+
+    The counters and gauges are dictionaries from names (in COUNTERS and GAUGES, or
+    added with increment and setGauge) to numbers.  The timings are a dictionary from
+    qualified method names (such as 'Editor.invert') to a list [calls, seconds, bytes].
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _counters:  The counters             [dict of str to int]
+        _gauges:    The gauges               [dict of str to number]
+        _timings:   The method timings       [dict of str to [int, float, int]]
+        _exporters: The export functions     [list of functions of one argument]
+        _lock:      Guards _timings          [threading.Lock]
+    The dictionaries are changed in place but never replaced, since the wrappers keep
+    references to them.
+    """
+
+    # GETTERS
+    def getCounter(self, name):
+        """
+        Returns: The value of the counter name (0 if it has never been incremented)
+
+        Parameter name: The counter name
+        Precondition: name is a str
+        """
+        return self._counters.get(name,0)
+
+
+    def getGauge(self, name):
+        """
+        Returns: The value of the gauge name (None if it has never been set)
+
+        Parameter name: The gauge name
+        Precondition: name is a str
+        """
+        return self._gauges.get(name)
+
+
+    def getTiming(self, method):
+        """
+        Returns: The triple (calls, seconds, bytes) for method, or None if never called
+
+        Parameter method: The qualified method name, such as 'Editor.invert'
+        Precondition: method is a str
+        """
+        with self._lock:
+            timing = self._timings.get(method)
+            return None if timing is None else tuple(timing)
+
+    # INITIALIZER
+    def __init__(self):
+        """
+        Initializer: Creates a registry with every counter at 0.
+        """
+        self._counters  = dict.fromkeys(COUNTERS,0)
+        self._gauges    = {}
+        self._timings   = {}
+        self._exporters = []
+        self._lock      = threading.Lock()
+
+    # RECORDING
+    def increment(self, name, amount=1):
+        """
+        Adds amount to the counter name.
+
+        Parameter name: The counter name
+        Precondition: name is a str
+
+        Parameter amount: The amount to add
+        Precondition: amount is an int >= 0
+        """
+        self._counters[name] = self._counters.get(name,0)+amount
+
+
+    def setGauge(self, name, value):
+        """
+        Sets the gauge name to value.
+
+        Parameter name: The gauge name
+        Precondition: name is a str
+
+        Parameter value: The value of the gauge
+        Precondition: value is a number
+        """
+        self._gauges[name] = value
+
+
+    def observe(self, method, seconds, allocated=0):
+        """
+        Records one call of method that took seconds and allocated bytes.
+
+        Parameter method: The qualified method name
+        Precondition: method is a str
+
+        Parameter seconds: The time the call took
+        Precondition: seconds is a number >= 0
+
+        Parameter allocated: The peak bytes allocated during the call
+        Precondition: allocated is an int >= 0
+        """
+        with self._lock:
+            timing = self._timings.get(method)
+            if timing is None:
+                self._timings[method] = [1,seconds,allocated]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] += allocated
+
+
+    def reset(self):
+        """
+        Sets every counter to 0 and forgets the gauges and timings.
+
+        The exporters are kept.
+        """
+        for name in self._counters:
+            self._counters[name] = 0
+        self._gauges.clear()
+        with self._lock:
+            self._timings.clear()
+
+    # EXPORTING
+    def addExporter(self, exporter):
+        """
+        Adds an exporter, which is called with each snapshot given out by export.
+
+        Parameter exporter: The function to call
+        Precondition: exporter is a function of one argument (a snapshot dictionary)
+        """
+        self._exporters.append(exporter)
+
+
+    def removeExporter(self, exporter):
+        """
+        Removes an exporter added with addExporter.
+
+        Parameter exporter: The function to remove
+        Precondition: exporter was added to this registry
+        """
+        self._exporters.remove(exporter)
+
+
+    def snapshot(self):
+        """
+        Returns: A copy of the measurements, as a dictionary
+
+        The dictionary has the keys 'counters', 'gauges' and 'timings'.  The timings
+        are dictionaries with the keys 'calls', 'seconds' and 'bytes'.
+        """
+        with self._lock:
+            timings = {method:{'calls':calls, 'seconds':seconds, 'bytes':allocated}
+                       for method, (calls, seconds, allocated) in self._timings.items()}
+        return {'counters':dict(self._counters), 'gauges':dict(self._gauges),
+                'timings':timings}
+
+
+    def export(self):
+        """
+        Returns: The snapshot given to every exporter
+
+        Each exporter is called with the same snapshot, in the order they were added.
+        """
+        snapshot = self.snapshot()
+        for exporter in self._exporters:
+            exporter(snapshot)
+        return snapshot
+
+
+    def toPrometheus(self):
+        """
+        Returns: The measurements in the Prometheus text exposition format
+        """
+        return prometheusText(self.snapshot())
+
+
+# ENABLING AND DISABLING
+def enable(registry=None, memory=False):
+    """
+    Returns: The registry that records the measurements
+
+    This installs the measuring wrappers.  If instrumentation is already enabled, it is
+    disabled first.  If memory is True, tracemalloc is started too, and the peak bytes
+    allocated by each method call are recorded (this makes everything much slower).
+
+    Parameter registry: The registry to record in (None for a new one)
+    Precondition: registry is None or a Registry object
+
+    Parameter memory: Whether to measure the bytes allocated by each method
+    Precondition: memory is a bool
+    """
+    global _REGISTRY
+    assert registry is None or isinstance(registry,Registry)
+    disable()
+    registry = registry or Registry()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _STATE['tracing'] = True
+    _STATE['memory'] = memory
+
+    counters = registry._counters
+    def reads(method):
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            counters['pixel_reads'] += 1
+            return method(self,*args)
+        return wrapper
+    def writes(method):
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            counters['pixel_writes'] += 1
+            return method(self,*args)
+        return wrapper
+    def swaps(method):
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            counters['pixel_reads']  += 2
+            counters['pixel_writes'] += 2
+            return method(self,*args)
+        return wrapper
+    def regions(key):
+        def wrap(method):
+            @functools.wraps(method)
+            def wrapper(self, row, col, height, width, *args):
+                counters[key] += height*width
+                return method(self,row,col,height,width,*args)
+            return wrapper
+        return wrap
+    def rows(method):
+        @functools.wraps(method)
+        def wrapper(self, row):
+            counters['pixel_reads'] += self.getWidth()
+            return method(self,row)
+        return wrapper
+    def copies(method):
+        @functools.wraps(method)
+        def wrapper(self):
+            counters['image_copies'] += 1
+            counters['image_copy_bytes'] += 3*self.getLength()
+            return method(self)
+        return wrapper
+
+    for name in ('getPixel','getFlatPixel'):
+        _install(a6image.Image,name,reads)
+    for name in ('setPixel','setFlatPixel'):
+        _install(a6image.Image,name,writes)
+    _install(a6image.Image,'swapPixels',swaps)
+    _install(a6image.Image,'getRow',rows)
+    _install(a6image.Image,'getRegion',regions('pixel_reads'))
+    _install(a6image.Image,'setRegion',regions('pixel_writes'))
+    _install(a6image.Image,'fillRegion',regions('pixel_writes'))
+    for cls in (a6image.Image,a6mapped.MappedImage):
+        _install(cls,'copy',copies)
+    for cls in (a6history.ImageHistory,a6editor.Editor):
+        for name, value in list(vars(cls).items()):
+            if callable(value) and not name.startswith(('_','get','is')):
+                gauges = name in ('increment','undo','redo','clear')
+                _install(cls,name,lambda method: _timed(registry,cls.__name__,method,gauges))
+    _REGISTRY = registry
+    return registry
+
+
+def disable():
+    """
+    Removes the measuring wrappers, putting back the original methods.
+
+    This does nothing if instrumentation is not enabled.  The registry keeps its
+    measurements.
+    """
+    global _REGISTRY
+    for (cls, name), method in _ORIGINALS.items():
+        setattr(cls,name,method)
+    _ORIGINALS.clear()
+    if _STATE.get('tracing'):
+        tracemalloc.stop()
+    _STATE.clear()
+    _REGISTRY = None
+
+
+def isEnabled():
+    """
+    Returns: True if instrumentation is enabled, False otherwise
+    """
+    return _REGISTRY is not None
+
+
+def getRegistry():
+    """
+    Returns: The registry recording the measurements, or None if not enabled
+    """
+    return _REGISTRY
+
+
+# EXPORTERS
+def prometheusText(snapshot):
+    """
+    Returns: The snapshot in the Prometheus text exposition format
+
+    Counters become PREFIX+name+'_total', gauges keep their names, and the method
+    timings become three counters labelled with the method name.
+
+    Parameter snapshot: The measurements
+    Precondition: snapshot is a dictionary returned by Registry.snapshot
+    """
+    lines = []
+    for name, value in sorted(snapshot['counters'].items()):
+        metric = PREFIX+name+'_total'
+        lines.append('# HELP %s %s' % (metric,COUNTERS.get(name,name)))
+        lines.append('# TYPE %s counter' % metric)
+        lines.append('%s %s' % (metric,value))
+    for name, value in sorted(snapshot['gauges'].items()):
+        metric = PREFIX+name
+        lines.append('# HELP %s %s' % (metric,GAUGES.get(name,name)))
+        lines.append('# TYPE %s gauge' % metric)
+        lines.append('%s %s' % (metric,value))
+    for key, help in (('calls','Calls of each method'),('seconds','Seconds spent in each method'),
+                      ('bytes','Peak bytes allocated by each method')):
+        metric = PREFIX+'method_'+key+'_total'
+        lines.append('# HELP %s %s' % (metric,help))
+        lines.append('# TYPE %s counter' % metric)
+        for method, timing in sorted(snapshot['timings'].items()):
+            lines.append('%s{method="%s"} %s' % (metric,method,timing[key]))
+    return '\n'.join(lines)+'\n'
+
+
+def prometheusExporter(path):
+    """
+    Returns: An exporter that writes each snapshot to path in the Prometheus text format
+
+    The file is replaced each time, so a scraper (such as the node exporter textfile
+    collector) always sees a complete file.
+
+    Parameter path: The file to write
+    Precondition: path is a str naming a writable file
+    """
+    def exporter(snapshot):
+        with open(path+'.tmp','w') as file:
+            file.write(prometheusText(snapshot))
+        os.replace(path+'.tmp',path)
+    return exporter
+
+
+# HELPER FUNCTIONS
+def _install(cls, name, wrap):
+    """
+    Replaces the method name of cls with wrap(method), remembering the original.
+
+    Parameter cls: The class to change
+    Precondition: cls is a class with an attribute name in its own dictionary
+
+    Parameter name: The method name
+    Precondition: name is a str
+
+    Parameter wrap: The function that makes the wrapper
+    Precondition: wrap is a function of one argument (the original method)
+    """
+    method = vars(cls)[name]
+    _ORIGINALS[(cls,name)] = method
+    setattr(cls,name,wrap(method))
+
+
+def _timed(registry, owner, method, gauges):
+    """
+    Returns: A wrapper of method that records its calls in registry
+
+    Parameter registry: The registry to record in
+    Precondition: registry is a Registry object
+
+    Parameter owner: The name of the class that defines method
+    Precondition: owner is a str
+
+    Parameter method: The method to wrap
+    Precondition: method is a function
+
+    Parameter gauges: Whether to update the history gauges after each call
+    Precondition: gauges is a bool
+    """
+    qualified = owner+'.'+method.__name__
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwds):
+        memory = _STATE.get('memory')
+        if memory:
+            before = tracemalloc.get_traced_memory()[0]
+            _STATE['depth'] = _STATE.get('depth',0)+1
+            if _STATE['depth'] == 1:
+                tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            return method(self,*args,**kwds)
+        finally:
+            elapsed = time.perf_counter()-start
+            allocated = 0
+            if memory:
+                allocated = max(0,tracemalloc.get_traced_memory()[1]-before)
+                _STATE['depth'] -= 1
+            registry.observe(qualified,elapsed,allocated)
+            if gauges:
+                _history_gauges(registry,self)
+    return wrapper
+
+
+def _history_gauges(registry, history):
+    """
+    Sets the history gauges of registry from history.
+
+    Parameter registry: The registry to update
+    Precondition: registry is a Registry object
+
+    Parameter history: The history to measure
+    Precondition: history is an ImageHistory object
+    """
+    registry.setGauge('history_depth',history.getDepth())
+    registry.setGauge('history_resident_bytes',history.getResidentBytes())
+    registry.setGauge('history_compressed_bytes',history.getCompressedBytes())
+    registry.setGauge('history_uncompressed_bytes',history.getUncompressedBytes())
+
+
+# The registry in use (None when disabled)
+_REGISTRY = None
+
+# The original methods replaced by enable, by (class, name)
+_ORIGINALS = {}
+
+# Whether memory is measured, whether this module started tracemalloc, and the depth
+# of nested measured calls
+_STATE = {}
@@ -0,0 +1,233 @@
+"""
+Reference versions of the Editor operations for our imager application.
+
+This module keeps the original, pixel-at-a-time versions of the Editor operations.
+They are slow, but they are simple enough to be obviously correct, and they define
+what the fast versions must produce.  The benchmark module a6bench checks every fast
+backend against them, byte for byte.
+
+Each function works on an Image object through getPixel, setPixel, getFlatPixel and
+setFlatPixel only, exactly as the Editor methods used to.
+"""
+import math
+
+
+def invert(image):
+    """
+    Inverts image, replacing each pixel with its color complement.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    for pos in range(image.getLength()):
+        rgb = image.getFlatPixel(pos)
+        image.setFlatPixel(pos,(255-rgb[0],255-rgb[1],255-rgb[2]))
+
+
+def transpose(image):
+    """
+    Transposes image.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    original = image.copy()
+    image.setWidth(image.getHeight())
+    for row in range(image.getHeight()):
+        for col in range(image.getWidth()):
+            image.setPixel(row,col,original.getPixel(col,row))
+
+
+def reflectHori(image):
+    """
+    Reflects image around the horizontal middle.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    for h in range(image.getWidth()//2):
+        for row in range(image.getHeight()):
+            image.swapPixels(row,h,row,image.getWidth()-1-h)
+
+
+def reflectVert(image):
+    """
+    Reflects image around the vertical middle.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    for r in range(image.getHeight()//2):
+        for h in range(image.getWidth()):
+            image.swapPixels(r,h,image.getHeight()-1-r,h)
+
+
+def rotateRight(image):
+    """
+    Rotates image right by 90 degrees.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    original = image.copy()
+    image.setWidth(image.getHeight())
+    for row in range(image.getHeight()):
+        for col in range(image.getWidth()):
+            image.setPixel(row,col,original.getPixel(original.getHeight()-col-1,row))
+
+
+def rotateLeft(image):
+    """
+    Rotates image left by 90 degrees.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    original = image.copy()
+    image.setWidth(image.getHeight())
+    for row in range(image.getHeight()):
+        for col in range(image.getWidth()):
+            image.setPixel(row,col,original.getPixel(col,original.getWidth()-row-1))
+
+
+def monochromify(image, sepia):
+    """
+    Converts image to greyscale, or to sepia tone if sepia is True.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+
+    Parameter sepia: Whether to use sepia tone instead of greyscale.
+    Precondition: sepia is a bool
+    """
+    for pos in range(image.getLength()):
+        rgb = image.getFlatPixel(pos)
+        brightness = 0.3*rgb[0] + 0.6*rgb[1] + 0.1*rgb[2]
+        if sepia == True:
+            image.setFlatPixel(pos,(rgb[0],int(0.6*brightness),int(0.4*brightness)))
+        else:
+            value = int(brightness)
+            image.setFlatPixel(pos,(value,value,value))
+
+
+def vignette(image):
+    """
+    Darkens the corners of image by the factor 1 - (d / hfD)^2.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    for x in range(image.getHeight()):
+        for y in range(image.getWidth()):
+            hfD = math.sqrt((image.getWidth()/2)**2+(image.getHeight()/2)**2)
+            d = math.sqrt((image.getHeight()/2-x)**2+(image.getWidth()/2-y)**2)
+            rgb = image.getPixel(x,y)
+            red   = (1 - (d / hfD)**2)*rgb[0]
+            green = (1 - (d / hfD)**2)*rgb[1]
+            blue  = (1 - (d / hfD)**2)*rgb[2]
+            image.setPixel(x,y,(int(red),int(green),int(blue)))
+
+
+def pixellate(image, step):
+    """
+    Pixellates image in blocks of step x step pixels.
+
+    As in the original, each block sum is divided by step**2 even for the smaller
+    blocks at the edges.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+
+    Parameter step: The number of pixels in a pixellated block
+    Precondition: step is an int > 0
+    """
+    height = image.getHeight()
+    width  = image.getWidth()
+    for y in range(0,width,step):
+        for x in range(0,height,step):
+            r = g = b = 0
+            for s in range(step):
+                for h in range(step):
+                    if x+s < height and y+h < width:
+                        a = image.getPixel(x+s,y+h)
+                        r += a[0]
+                        g += a[1]
+                        b += a[2]
+            avgpixel = (round(r/step**2),round(g/step**2),round(b/step**2))
+            for s in range(step):
+                for h in range(step):
+                    if x+s < height and y+h < width:
+                        image.setPixel(x+s,y+h,avgpixel)
+
+
+def jail(image):
+    """
+    Puts red jail bars on image.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+    """
+    def vbar(col):
+        for row in range(image.getHeight()):
+            for k in range(4):
+                image.setPixel(row,col+k,(255,0,0))
+    def hbar(row):
+        for col in range(image.getWidth()):
+            for k in range(3):
+                image.setPixel(row+k,col,(255,0,0))
+
+    vbar(0)
+    hbar(0)
+    vbar(image.getWidth()-4)
+    hbar(image.getHeight()-3)
+    n = (image.getWidth()-8)//50
+    x = (image.getWidth()-8-4*n)/n
+    for y in range(n):
+        vbar(round((4*(y+1)+(y+1)*x)))
+
+
+def encode(image, text):
+    """
+    Returns: True if text was hidden in image; False otherwise
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+
+    Parameter text: a message to hide
+    Precondition: text is a string
+    """
+    if len(text) > 999999 or len(text)+4 > image.getLength():
+        return False
+    message = chr(125)+chr(126)+text+chr(126)+chr(125)
+    for pos in range(len(message)):
+        digits = str(ord(message[pos])).zfill(3)
+        rgb = image.getFlatPixel(pos)
+        pixel = []
+        for k in range(3):
+            value = int(str(rgb[k])[0:2]+digits[k])
+            if value > 255:
+                value -= 10
+            pixel.append(value)
+        image.setFlatPixel(pos,tuple(pixel))
+    return True
+
+
+def decode(image):
+    """
+    Returns: The message hidden in image, or None if there is no message
+
+    Parameter image: The image to read
+    Precondition: image is an Image object
+    """
+    def code(pos):
+        rgb = image.getFlatPixel(pos)
+        return (rgb[0] % 10)*100 + (rgb[1] % 10)*10 + rgb[2] % 10
+
+    if code(0) != 125:
+        return None
+    text = ''
+    for pos in range(2,image.getLength()):
+        if code(pos) == 126:
+            return text
+        text += chr(code(pos))
+    return None
@@ -0,0 +1,280 @@
+"""
+Command-line batch runner for our imager application.
+
+This module applies a pipeline of Editor operations to every image in a directory
+(or matching a glob pattern), using a pool of worker processes.  For example
+
+    python a6run.py photos/ out/ --pipeline monochromify:sepia,vignette,pixellate:8
+
+makes a sepia, vignetted, pixellated copy of every image in photos/ and saves it in
+out/ under the same name.  A glob pattern may match images in several directories;
+each result is then saved at the same path relative to the deepest directory that
+holds all of them (see targetPaths), so images with the same name do not collide.
+
+A pipeline is a comma-separated list of Editor method names.  Arguments follow the
+name, separated by colons.  Numbers are passed as ints, true/false as bools, and any
+other text as a str.  For monochromify, 'sepia' means True and 'grey' means False.
+
+Each worker process loads, edits and saves one image at a time.  At most --prefetch
+images per worker are in flight at once, so memory stays bounded no matter how many
+images there are.  The runner prints the time and throughput of each image, and the
+total throughput at the end.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent import futures
+
+import a6editor
+import a6io
+
+
+# Words that stand for a bool argument in a pipeline
+BOOL_WORDS = {'true':True, 'false':False, 'sepia':True, 'grey':False, 'gray':False,
+              'greyscale':False, 'grayscale':False}
+
+
+def parsePipeline(spec):
+    """
+    Returns: The pipeline described by spec, as a list of (name, args) pairs
+
+    Each name is an Editor method, and args is a tuple of its arguments.  For example
+    'monochromify:sepia,pixellate:8' is [('monochromify',(True,)),('pixellate',(8,))].
+
+    This raises a ValueError if a name is not a public Editor method.
+
+    Parameter spec: The pipeline description
+    Precondition: spec is a str
+    """
+    pipeline = []
+    for step in spec.split(','):
+        step = step.strip()
+        if not step:
+            continue
+        parts = step.split(':')
+        name = parts[0]
+        if name.startswith('_') or not callable(getattr(a6editor.Editor,name,None)):
+            raise ValueError('%s is not an Editor operation' % repr(name))
+        pipeline.append((name,tuple(_parse_argument(arg) for arg in parts[1:])))
+    return pipeline
+
+
+def findImages(source):
+    """
+    Returns: A sorted list of the image files named by source
+
+    If source is a directory, this is every file in it with one of the extensions in
+    a6io.EXTENSIONS.  Otherwise source is treated as a glob pattern.
+
+    Parameter source: A directory or glob pattern
+    Precondition: source is a str
+    """
+    if os.path.isdir(source):
+        names = [os.path.join(source,name) for name in os.listdir(source)]
+    else:
+        names = glob.glob(source)
+    return sorted(name for name in names if os.path.isfile(name) and a6io.isImageFile(name))
+
+
+def targetPaths(sources, outdir):
+    """
+    Returns: The list of the paths to save the result of each source at, in order
+
+    Each target is the path of its source relative to the deepest directory that holds
+    all of the sources, put under outdir.  If the sources are all in one directory,
+    this is just outdir and the file name.
+
+    This raises a ValueError if two sources would be saved at the same path (such as
+    the same file named twice).
+
+    Parameter sources: The image files to process
+    Precondition: sources is a non-empty list of str
+
+    Parameter outdir: The directory to save the results in
+    Precondition: outdir is a str
+    """
+    paths = [os.path.abspath(source) for source in sources]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    targets = [os.path.join(outdir,os.path.relpath(path,root)) for path in paths]
+    seen = {}
+    for source, target in zip(sources,targets):
+        key = os.path.normcase(target)
+        if key in seen:
+            raise ValueError('%s and %s would both be saved as %s' % 
+                             (repr(seen[key]),repr(source),repr(target)))
+        seen[key] = source
+    return targets
+
+
+def applyPipeline(editor, pipeline):
+    """
+    Applies each operation in pipeline to the current image of editor.
+
+    Each operation gets its own step in the edit history, just as if the buttons were
+    pressed one after the other.
+
+    Parameter editor: The editor to use
+    Precondition: editor is an Editor object
+
+    Parameter pipeline: The operations to apply
+    Precondition: pipeline is a list of (name, args) pairs, as from parsePipeline
+    """
+    for name, args in pipeline:
+        editor.increment()
+        getattr(editor,name)(*args)
+
+
+def processImage(source, target, pipeline):
+    """
+    Returns: The pair (pixels, seconds) after applying pipeline to one image file
+
+    This loads the image at source, applies the pipeline and saves the result to
+    target.  It is the function run by each worker process.
+
+    Parameter source: The image file to read
+    Precondition: source is a str naming an image file
+
+    Parameter target: The image file to write
+    Precondition: target is a str naming a writable image file
+
+    Parameter pipeline: The operations to apply
+    Precondition: pipeline is a list of (name, args) pairs, as from parsePipeline
+    """
+    start = time.perf_counter()
+    image = a6io.loadImage(source)
+    editor = a6editor.Editor(image)
+    applyPipeline(editor,pipeline)
+    a6io.saveImage(editor.getCurrent(),target)
+    return (image.getLength(), time.perf_counter()-start)
+
+
+def runBatch(sources, outdir, pipeline, workers=None, prefetch=2, report=None):
+    """
+    Returns: The pair (pixels, seconds) for the whole batch
+
+    This applies pipeline to every file in sources with a pool of worker processes,
+    saving each result in outdir under the same name (or relative path, if the sources
+    are in several directories; see targetPaths).  The subdirectories of outdir are 
+    created as needed.  At most workers*prefetch images are loaded at any time.
+
+    This raises a ValueError, before any image is processed, if two sources would be
+    saved at the same path.
+
+    If report is not None, it is called as report(source, pixels, seconds) as each
+    image finishes (in the order they finish).
+
+    Parameter sources: The image files to process
+    Precondition: sources is a list of str
+
+    Parameter outdir: The directory to save the results in
+    Precondition: outdir is a str naming a directory
+
+    Parameter pipeline: The operations to apply
+    Precondition: pipeline is a list of (name, args) pairs, as from parsePipeline
+
+    Parameter workers: The number of worker processes (None for one per core)
+    Precondition: workers is None or an int > 0
+
+    Parameter prefetch: The number of images queued for each worker
+    Precondition: prefetch is an int > 0
+
+    Parameter report: The function to call as each image finishes
+    Precondition: report is None or a function of three arguments
+    """
+    assert workers is None or (isinstance(workers,int) and workers > 0)
+    assert isinstance(prefetch,int) and prefetch > 0
+    if workers is None:
+        workers = os.cpu_count() or 1
+    targets = targetPaths(sources,outdir) if sources else []
+    for folder in sorted(set(os.path.dirname(target) for target in targets)|{outdir}):
+        os.makedirs(folder,exist_ok=True)
+
+    start = time.perf_counter()
+    total = 0
+    with futures.ProcessPoolExecutor(workers) as pool:
+        queue = iter(zip(sources,targets))
+        running = {}
+        while True:
+            while len(running) < workers*prefetch:
+                source, target = next(queue,(None,None))
+                if source is None:
+                    break
+                running[pool.submit(processImage,source,target,pipeline)] = source
+            if not running:
+                break
+            done, pending = futures.wait(running,return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                source = running.pop(future)
+                pixels, seconds = future.result()
+                total += pixels
+                if report is not None:
+                    report(source,pixels,seconds)
+    return (total, time.perf_counter()-start)
+
+
+def main(argv=None):
+    """
+    Returns: The exit status of the batch runner (0 on success)
+
+    This parses the command line arguments, runs the batch and prints the throughput
+    of each image and of the whole batch.
+
+    Parameter argv: The command line arguments (None for sys.argv[1:])
+    Precondition: argv is None or a list of str
+    """
+    parser = argparse.ArgumentParser(description='Apply Editor operations to many images.')
+    parser.add_argument('source', help='a directory of images or a glob pattern')
+    parser.add_argument('outdir', help='the directory to save the results in')
+    parser.add_argument('-p','--pipeline', required=True,
+                        help='operations to apply, e.g. monochromify:sepia,vignette')
+    parser.add_argument('-w','--workers', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='images queued per worker (default: 2)')
+    args = parser.parse_args(argv)
+
+    try:
+        pipeline = parsePipeline(args.pipeline)
+    except ValueError as e:
+        parser.error(str(e))
+    sources = findImages(args.source)
+    if not sources:
+        print('No images found in %s' % args.source, file=sys.stderr)
+        return 1
+
+    try:
+        targetPaths(sources,args.outdir)
+    except ValueError as e:
+        parser.error(str(e))
+
+    def report(source, pixels, seconds):
+        print('%s  %d px  %.3fs  %.2f Mpx/s' % (source,pixels,seconds,
+                                              pixels/seconds/1e6 if seconds else 0.0))
+
+    pixels, seconds = runBatch(sources,args.outdir,pipeline,args.workers,
+                               args.prefetch,report)
+    print('%d images  %d px  %.3fs  %.2f images/s  %.2f Mpx/s' % (len(sources),pixels,
+          seconds,len(sources)/seconds,pixels/seconds/1e6))
+    return 0
+
+
+# HELPER FUNCTIONS
+def _parse_argument(text):
+    """
+    Returns: The value of one pipeline argument
+
+    Parameter text: The argument as written in the pipeline
+    Precondition: text is a str
+    """
+    if text.lower() in BOOL_WORDS:
+        return BOOL_WORDS[text.lower()]
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+if __name__ == '__main__':
+    sys.exit(main())
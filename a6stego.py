@@ -0,0 +1,519 @@
+"""
+Steganography kernels for our imager application.
+
+This module hides text in the raw bytes of an image, and reads it back, using the same
+format as Editor.encode and Editor.decode.  Each character is stored in one pixel, as
+the 3-digit decimal number of its ASCII value: the last digit of the red, green and
+blue values hold the hundreds, tens and ones digits.  The message starts with the
+marker '}~' and ends with the marker '~}'.
+
+The functions here do all of the digit work on the whole message at once, with table
+lookups and C-level map calls, instead of converting each pixel to and from strings.
+
+There is also a binary mode for payloads of arbitrary bytes.  It stores the payload in
+the lowest 1, 2 or 4 bits of each color value, after a header that holds a magic
+number, a version, the number of bits, the shard position, the payload length and a
+CRC-32 checksum.  The header is always stored at 2 bits per color value in the first
+HEADER_VALUES color values, so an image that does not carry a payload is rejected
+after reading only its first few pixels.
+
+A payload too big for one image is split into shards, one per image, by encodeStream,
+and rebuilt by decodeStream.  Both read and write the payload one shard at a time, so
+the whole payload never has to be in memory.
+"""
+import functools
+import io
+import operator
+import struct
+import zlib
+
+
+# The start and end markers (as character codes)
+START_MARKER = (125, 126)
+END_MARKER   = (126, 125)
+
+# The most characters that a message can have
+MAX_LENGTH = 999999
+
+# Translation table giving the last decimal digit of each byte value
+_LAST_DIGIT = bytes(v % 10 for v in range(256))
+
+# Translation table from the ASCII characters '0'..'9' to the digits 0..9
+_DIGIT_VALUE = bytes((v-ord('0')) % 256 for v in range(256))
+
+# The hundreds and tens contributions of each digit
+_HUNDREDS = [100*d for d in range(10)]
+_TENS     = [10*d for d in range(10)]
+
+
+def _encode_value(value, digit):
+    """
+    Returns: The color value with digit stored in it, exactly as in Editor._encode_pixel
+
+    This keeps the first two characters of the value written in decimal and appends
+    the digit.  If the result is more than 255, 10 is taken away.
+
+    Parameter value: The original color value
+    Precondition: value is an int in 0..255
+
+    Parameter digit: The digit to store
+    Precondition: digit is an int in 0..9
+    """
+    result = int(str(value)[0:2]+str(digit))
+    if result > 255:
+        result -= 10
+    return result
+
+# The encoded value for each (digit, value) pair, at position digit*256+value
+_ENCODED = [_encode_value(value,digit) for digit in range(10) for value in range(256)]
+
+
+def encodeText(data, text):
+    """
+    Returns: True if text was hidden in data; False otherwise
+
+    If the text has more than MAX_LENGTH characters, or data does not have enough
+    pixels to store the text and both markers, this returns False without changing
+    data.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter text: The message to hide
+    Precondition: text is a string
+    """
+    if len(text) > MAX_LENGTH or len(text)+4 > len(data)//3:
+        return False
+
+    codes = list(START_MARKER)+[ord(c) for c in text]+list(END_MARKER)
+    digits = ''.join([str(code).zfill(3)[0:3] for code in codes]).encode('ascii')
+    offsets = map(operator.mul,digits.translate(_DIGIT_VALUE),[256]*len(digits))
+    size = len(digits)
+    data[0:size] = bytes(map(_ENCODED.__getitem__,map(operator.add,offsets,data[0:size])))
+    return True
+
+
+def textPixels(text):
+    """
+    Returns: The number of pixels (from the first one) that encodeText changes for text
+
+    Parameter text: The message to hide
+    Precondition: text is a string
+    """
+    return len(START_MARKER)+len(text)+len(END_MARKER)
+
+
+def decodeText(data, chunk=65536):
+    """
+    Returns: The message hidden in data, or None if there is no message
+
+    There is a message if the first pixel holds the start marker code 125.  The message
+    is every pixel after the start marker, up to the first pixel that holds the code
+    126.  If there is no such pixel, there is no message.
+
+    The end marker is found by searching the last digits of the pixels one chunk at a
+    time, so only the pixels up to the end of the message are ever read.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter chunk: The number of pixels to search at a time
+    Precondition: chunk is an int > 0
+    """
+    if len(data) < 3 or _code(data[0:3].translate(_LAST_DIGIT),0) != START_MARKER[0]:
+        return None
+
+    end = findCode(data,END_MARKER[0],2,chunk)
+    if end is None:
+        return None
+    digits = data[6:3*end].translate(_LAST_DIGIT)
+    codes = map(operator.add,map(operator.add,map(_HUNDREDS.__getitem__,digits[0::3]),
+                                 map(_TENS.__getitem__,digits[1::3])),digits[2::3])
+    return ''.join(map(chr,codes))
+
+
+def findCode(data, code, start=0, chunk=65536):
+    """
+    Returns: The first pixel position >= start whose last digits hold code, or None
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter code: The 3-digit code to look for
+    Precondition: code is an int in 0..999
+
+    Parameter start: The first pixel position to check
+    Precondition: start is an int >= 0
+
+    Parameter chunk: The number of pixels to search at a time
+    Precondition: chunk is an int > 0
+    """
+    pattern = bytes((code//100,code//10 % 10,code % 10))
+    for first in range(3*start,len(data),3*chunk):
+        digits = data[first:first+3*chunk].translate(_LAST_DIGIT)
+        pos = digits.find(pattern)
+        while pos != -1:
+            if pos % 3 == 0:
+                return (first+pos)//3
+            pos = digits.find(pattern,pos+1)
+    return None
+
+
+# The magic number and version at the start of a binary header
+MAGIC   = b'A6SB'
+VERSION = 1
+
+# The number of low bits of each color value that may hold a binary payload
+BITS_PER_VALUE = (1, 2, 4)
+
+# The binary header: magic, version, bits, shard index, final flag, length, checksum
+HEADER = struct.Struct('>4sBBHBII')
+
+# The number of bits of each color value used by the header
+HEADER_BITS = 2
+
+# The number of color values (bytes of pixel data) holding the header
+HEADER_VALUES = HEADER.size*8//HEADER_BITS
+
+# The most shards in one stream
+MAX_SHARDS = 65536
+
+
+def capacity(data, bits=2):
+    """
+    Returns: The number of payload bytes that fit in data at bits per color value
+
+    This is 0 if data has fewer than HEADER_VALUES color values, but then not even an
+    empty payload fits, as there is no room for the header.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter bits: The number of low bits of each color value to use
+    Precondition: bits is in BITS_PER_VALUE
+    """
+    assert bits in BITS_PER_VALUE, repr(bits)+' is not a valid number of bits'
+    return max(0,(len(data)-HEADER_VALUES)*bits//8)
+
+
+def payloadPixels(payload, bits=2):
+    """
+    Returns: The number of pixels (from the first one) that encodeBytes changes for payload
+
+    This counts the header and the payload values, rounded up to whole pixels.
+
+    Parameter payload: The bytes to hide
+    Precondition: payload is a bytes-like object
+
+    Parameter bits: The number of low bits of each color value to use
+    Precondition: bits is in BITS_PER_VALUE
+    """
+    assert bits in BITS_PER_VALUE, repr(bits)+' is not a valid number of bits'
+    values = HEADER_VALUES+len(payload)*8//bits
+    return -(-values//3)
+
+
+def readHeader(data):
+    """
+    Returns: The binary header stored in data as (bits, index, final, length, checksum)
+
+    If data does not carry a binary payload, this returns None.  The magic number is
+    checked first, so an image without a payload is rejected after reading only
+    8*len(MAGIC)//HEADER_BITS color values.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+    """
+    if len(data) < HEADER_VALUES:
+        return None
+    if _read_bits(data,0,len(MAGIC),HEADER_BITS) != MAGIC:
+        return None
+    magic, version, bits, index, final, length, checksum = HEADER.unpack(
+        _read_bits(data,0,HEADER.size,HEADER_BITS))
+    if version != VERSION or bits not in BITS_PER_VALUE or final > 1:
+        return None
+    if length > capacity(data,bits):
+        return None
+    return (bits,index,final == 1,length,checksum)
+
+
+def isCarrier(data):
+    """
+    Returns: True if data carries a binary payload, False otherwise
+
+    Only the header is read, so this does not check the payload checksum.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+    """
+    return readHeader(data) is not None
+
+
+def encodeBytes(data, payload, bits=2, index=0, final=True):
+    """
+    Returns: True if payload was hidden in data; False otherwise
+
+    The payload is stored after a binary header in the lowest bits of each color value.
+    If the header and payload do not fit (see capacity), this returns False without 
+    changing data.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter payload: The bytes to hide
+    Precondition: payload is a bytes-like object
+
+    Parameter bits: The number of low bits of each color value to use
+    Precondition: bits is in BITS_PER_VALUE
+
+    Parameter index: The position of this shard in its stream
+    Precondition: index is an int in 0..MAX_SHARDS-1
+
+    Parameter final: Whether this is the last shard of its stream
+    Precondition: final is a bool
+    """
+    assert bits in BITS_PER_VALUE, repr(bits)+' is not a valid number of bits'
+    assert isinstance(index,int) and 0 <= index < MAX_SHARDS, repr(index)+' is not a valid index'
+    payload = bytes(payload)
+    if len(data) < HEADER_VALUES or len(payload) > capacity(data,bits):
+        return False
+
+    header = HEADER.pack(MAGIC,VERSION,bits,index,1 if final else 0,len(payload),
+                         zlib.crc32(payload))
+    _write_bits(data,0,header,HEADER_BITS)
+    _write_bits(data,HEADER_VALUES,payload,bits)
+    return True
+
+
+def decodeBytes(data):
+    """
+    Returns: The binary payload hidden in data, or None if there is no payload
+
+    This also returns None if the payload does not match its checksum.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+    """
+    header = readHeader(data)
+    if header is None:
+        return None
+    return _payload(data,header)
+
+
+def encodeStream(datas, source, bits=2):
+    """
+    Returns: The number of images used to hide the payload read from source
+
+    The payload is split into shards, in order, so that each image holds as much as
+    it can.  Images too small to hold a header and one byte are skipped (decodeStream
+    skips them too).  Only one shard of the payload is read at a time.
+
+    This raises a ValueError if the images run out before the payload does.  The images
+    used so far are still modified.
+
+    Parameter datas: The raw pixel bytes of each image, in order
+    Precondition: datas is an iterable of bytearrays of interleaved RGB bytes
+
+    Parameter source: The payload to hide
+    Precondition: source is a bytes-like object or a binary file opened for reading
+
+    Parameter bits: The number of low bits of each color value to use
+    Precondition: bits is in BITS_PER_VALUE
+    """
+    assert bits in BITS_PER_VALUE, repr(bits)+' is not a valid number of bits'
+    if not hasattr(source,'read'):
+        source = io.BytesIO(source)
+
+    index = 0
+    pending = b''
+    for data in datas:
+        size = capacity(data,bits)
+        if len(data) < HEADER_VALUES or size < 1:
+            continue
+        shard = pending+source.read(size-len(pending))
+        pending = source.read(1)
+        encodeBytes(data,shard,bits,index,not pending)
+        index += 1
+        if not pending:
+            return index
+    raise ValueError('the payload does not fit in the images')
+
+
+def iterPayload(datas):
+    """
+    Yields: The shards of the binary payload hidden in datas, in order
+
+    Images without a payload header are skipped.  This stops after the final shard,
+    so later images are never read.
+
+    This raises a ValueError if a shard is out of order or does not match its checksum,
+    or if the images run out before the final shard.
+
+    Parameter datas: The raw pixel bytes of each image, in order
+    Precondition: datas is an iterable of bytearrays of interleaved RGB bytes
+    """
+    index = 0
+    for data in datas:
+        header = readHeader(data)
+        if header is None:
+            continue
+        if header[1] != index:
+            raise ValueError('expected shard %d but found shard %d' % (index,header[1]))
+        shard = _payload(data,header)
+        if shard is None:
+            raise ValueError('shard %d does not match its checksum' % index)
+        yield shard
+        if header[2]:
+            return
+        index += 1
+    raise ValueError('the payload is missing shards after shard %d' % (index-1))
+
+
+def decodeStream(datas, target):
+    """
+    Returns: The number of payload bytes written to target
+
+    This writes the binary payload hidden in datas to target, one shard at a time.  It
+    raises a ValueError for the same reasons as iterPayload.
+
+    Parameter datas: The raw pixel bytes of each image, in order
+    Precondition: datas is an iterable of bytearrays of interleaved RGB bytes
+
+    Parameter target: Where to write the payload
+    Precondition: target is a binary file opened for writing (or has a write method)
+    """
+    total = 0
+    for shard in iterPayload(datas):
+        target.write(shard)
+        total += len(shard)
+    return total
+
+
+# HELPER FUNCTIONS
+def _code(digits, pos):
+    """
+    Returns: The 3-digit code stored at pixel pos of digits
+
+    Parameter digits: The last digits of the pixel values
+    Precondition: digits is a bytes-like object of digits 0..9
+
+    Parameter pos: The pixel position
+    Precondition: pos is an int with 0 <= 3*pos+2 < len(digits)
+    """
+    return 100*digits[3*pos]+10*digits[3*pos+1]+digits[3*pos+2]
+
+
+def _payload(data, header):
+    """
+    Returns: The payload described by header, or None if it does not match the checksum
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter header: The header stored in data
+    Precondition: header is a tuple as returned by readHeader(data)
+    """
+    bits, index, final, length, checksum = header
+    payload = _read_bits(data,HEADER_VALUES,length,bits)
+    if zlib.crc32(payload) != checksum:
+        return None
+    return payload
+
+
+def _write_bits(data, start, payload, bits):
+    """
+    Stores payload in the lowest bits of the color values of data, from start on.
+
+    Each payload byte is split into 8//bits pieces, highest bits first.  The pieces are
+    spread over the values with extended slices, and merged with the cleared values as
+    one big integer, so there is no loop over the bytes.
+
+    Parameter data: The raw pixel bytes to modify
+    Precondition: data is a bytearray with room for len(payload)*8//bits values
+
+    Parameter start: The first color value to use
+    Precondition: start is an int >= 0
+
+    Parameter payload: The bytes to store
+    Precondition: payload is a bytes object
+
+    Parameter bits: The number of low bits of each color value to use
+    Precondition: bits is 1, 2, 4 or 8
+    """
+    count = 8//bits
+    size = len(payload)*count
+    if size == 0:
+        return
+    pieces = bytearray(size)
+    for pos, table in enumerate(_split_tables(bits)):
+        pieces[pos::count] = payload.translate(table)
+    cleared = data[start:start+size].translate(_clear_table(bits))
+    merged = int.from_bytes(cleared,'big') | int.from_bytes(pieces,'big')
+    data[start:start+size] = merged.to_bytes(size,'big')
+
+
+def _read_bits(data, start, length, bits):
+    """
+    Returns: The length bytes stored in the lowest bits of data, from start on
+
+    This is the inverse of _write_bits.
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray with at least start+length*8//bits values
+
+    Parameter start: The first color value to read
+    Precondition: start is an int >= 0
+
+    Parameter length: The number of bytes to read
+    Precondition: length is an int >= 0
+
+    Parameter bits: The number of low bits of each color value to read
+    Precondition: bits is 1, 2, 4 or 8
+    """
+    count = 8//bits
+    values = data[start:start+length*count]
+    result = 0
+    for pos, table in enumerate(_join_tables(bits)):
+        result |= int.from_bytes(values[pos::count].translate(table),'big')
+    return result.to_bytes(length,'big')
+
+
+@functools.lru_cache(maxsize=None)
+def _split_tables(bits):
+    """
+    Returns: The tables that give each piece of a byte split into bits-sized pieces
+
+    Table pos maps a byte to its piece pos, counting from the highest bits.
+
+    Parameter bits: The size of each piece
+    Precondition: bits is 1, 2, 4 or 8
+    """
+    mask = (1 << bits)-1
+    return tuple(bytes((v >> (8-bits*(pos+1))) & mask for v in range(256))
+                 for pos in range(8//bits))
+
+
+@functools.lru_cache(maxsize=None)
+def _join_tables(bits):
+    """
+    Returns: The tables that move the low bits of a value to piece pos of a byte
+
+    This is the inverse of _split_tables.
+
+    Parameter bits: The size of each piece
+    Precondition: bits is 1, 2, 4 or 8
+    """
+    mask = (1 << bits)-1
+    return tuple(bytes((v & mask) << (8-bits*(pos+1)) for v in range(256))
+                 for pos in range(8//bits))
+
+
+@functools.lru_cache(maxsize=None)
+def _clear_table(bits):
+    """
+    Returns: The table that clears the lowest bits of each value
+
+    Parameter bits: The number of bits to clear
+    Precondition: bits is 1, 2, 4 or 8
+    """
+    return bytes(v & ~((1 << bits)-1) for v in range(256))
@@ -0,0 +1,777 @@
+"""
+Tiled (multi-core) execution of Editor filters for our imager application.
+
+This module splits an image into bands of whole rows and runs a filter kernel on each
+band, either on a pool of threads or on a pool of processes.  Threads only help when
+the kernel releases the GIL (the NumPy kernels do; the pure Python ones mostly do
+not).  Processes always run in parallel, but each band has to be copied to and from
+the worker.
+
+Some filters look at the pixels around each pixel.  For these, each band is given
+extra rows (a halo) above and below it, and only the rows of the band itself are
+copied back.  Filters that work in blocks (pixellate) use bands whose boundaries line
+up with the blocks.
+
+Each filter is described by a kernel function in KERNELS.  A kernel is called as
+
+    kernel(data, width, top, height, args)
+
+where data is the raw bytes of the band (modified in place), top is the image row the
+band starts at and height is the height of the WHOLE image.  The Editor uses the same
+kernels (with the whole image as a single band) when no scheduler is set.
+
+Images that are too big for memory (see the module a6mapped) are never loaded as a
+whole.  Instead, runKernel streams them through memory one band of about BAND_BYTES
+at a time, and runTransform rebuilds them one band at a time for the geometric
+operations.  Either way, the rows each band changes are marked dirty (see
+Image.markDirty).
+
+A thread can set a progress function with setProgress (the module a6jobs does this
+for each job).  Every operation run in that thread then calls it after each band, as
+function(done,total).  In-memory images are split into bands of PROGRESS_BYTES for
+this.  The function may raise an exception to stop the operation between two bands.
+"""
+import os
+import threading
+import time
+from concurrent import futures
+
+import a6buffer
+import a6image
+import a6kernels
+
+
+# KERNELS
+def _invert(data, width, top, height, args):
+    """
+    The band kernel for Editor.invert
+
+    Parameter data: The raw bytes of the band (modified in place)
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The filter arguments
+    Precondition: args is an empty tuple
+    """
+    a6kernels.invert(data)
+
+
+def _monochromify(data, width, top, height, args):
+    """
+    The band kernel for Editor.monochromify
+
+    Parameter data: The raw bytes of the band (modified in place)
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The filter arguments
+    Precondition: args is (sepia,) where sepia is a bool
+    """
+    if args[0] == True:
+        a6kernels.sepia(data)
+    else:
+        a6kernels.greyscale(data)
+
+
+def _applyLUT(data, width, top, height, args):
+    """
+    The band kernel for Editor.applyLUT
+
+    Parameter data: The raw bytes of the band (modified in place)
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The filter arguments
+    Precondition: args is (lut,) where lut is a PointLUT object
+    """
+    args[0].apply(data)
+
+
+def _vignette(data, width, top, height, args):
+    """
+    The band kernel for Editor.vignette
+
+    The whole image uses the cached vignette mask.  A band computes just its own rows
+    of the mask, so the memory used does not depend on the size of the image.
+
+    Parameter data: The raw bytes of the band (modified in place)
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The filter arguments
+    Precondition: args is an empty tuple
+    """
+    if top == 0 and len(data) == 3*width*height:
+        mask = a6kernels.vignetteMask(width,height)
+    else:
+        mask = a6kernels.vignetteRows(width,height,top,len(data)//(3*width))
+    a6kernels.scale(data,mask)
+
+
+def _pixellate(data, width, top, height, args):
+    """
+    The band kernel for Editor.pixellate
+
+    The block sums come from a summed-area table of the band.  The band must start at
+    a multiple of step (see ALIGN).
+
+    Parameter data: The raw bytes of the band (modified in place)
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0, and a multiple of step
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The filter arguments
+    Precondition: args is (step,) where step is an int > 0
+    """
+    step  = args[0]
+    image = _as_image(data,width)
+    rows  = image.getHeight()
+    table = image.getSummedAreaTable()
+    area  = step**2
+    for x in range(0,rows,step):
+        band = bytearray()
+        for y in range(0,width,step):
+            r, g, b = table.getSum(x,y,step,step)
+            avgpixel = bytes((round(r/area),round(g/area),round(b/area)))
+            band += avgpixel*min(step,width-y)
+        image.setRegion(x,0,min(step,rows-x),width,band*min(step,rows-x))
+
+
+def _blur(data, width, top, height, args):
+    """
+    The band kernel for Editor.blur
+
+    The band must include a halo of radius rows (see HALO).
+
+    Parameter data: The raw bytes of the band (modified in place)
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The filter arguments
+    Precondition: args is (radius,) where radius is an int >= 0
+    """
+    data[:] = _as_image(data,width).getSummedAreaTable().getWindowMeans(args[0])
+
+
+def _highPass(data, width, top, height, args):
+    """
+    The band kernel for Editor.highPass
+
+    The band must include a halo of radius rows (see HALO).
+
+    Parameter data: The raw bytes of the band (modified in place)
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The filter arguments
+    Precondition: args is (radius,) where radius is an int >= 0
+    """
+    means = _as_image(data,width).getSummedAreaTable().getWindowMeans(args[0])
+    data[:] = bytes(min(255,max(0,128+value-mean)) for value, mean in zip(data,means))
+
+
+# The band kernel of each tileable Editor operation
+KERNELS = {'invert':_invert, 'monochromify':_monochromify, 'applyLUT':_applyLUT,
+           'vignette':_vignette, 'pixellate':_pixellate, 'blur':_blur,
+           'highPass':_highPass}
+
+# The halo (in rows) needed by each neighbourhood operation, as a function of its args
+HALO = {'blur':lambda args: args[0], 'highPass':lambda args: args[0]}
+
+# The row multiple that bands must start at, as a function of the operation args
+ALIGN = {'pixellate':lambda args: args[0]}
+
+# The size (in bytes) of the bands used to stream images that are not in memory
+BAND_BYTES = 16*1024*1024
+
+# The kernels that treat every pixel on its own, so they can run on a batch of stacked
+# frames (see the module a6batch) in one call
+POINTWISE = ('invert', 'monochromify', 'applyLUT')
+
+# The size (in bytes) of the bands used for in-memory images while reporting progress
+PROGRESS_BYTES = 1024*1024
+
+# The progress function of each thread (see setProgress)
+_PROGRESS = threading.local()
+
+# The geometric operations that swap the width and height of the image
+TRANSPOSING = ('transpose', 'rotateRight', 'rotateLeft')
+
+
+def runKernel(image, name, args, frames=1):
+    """
+    Runs the kernel for operation name on all of image, in this thread.
+
+    The whole image is treated as a single band, so no pixel data is copied.  If the
+    image is memory-mapped, it is streamed through memory instead (see streamKernel).
+    So is an in-memory image if this thread has a progress function, in bands of
+    PROGRESS_BYTES.
+
+    If image is a stack of several frames (see the module a6batch), the kernels that
+    are not POINTWISE are run on each frame in turn, as a band of its own.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+
+    Parameter name: The operation to run
+    Precondition: name is a key of KERNELS
+
+    Parameter args: The operation arguments
+    Precondition: args is a tuple of valid arguments for that operation
+
+    Parameter frames: The number of frames stacked in image
+    Precondition: frames is an int > 0 that evenly divides the image height, and is 1
+    if image is memory-mapped
+    """
+    if frames > 1 and name not in POINTWISE:
+        _run_frames(image,frames,KERNELS[name],args)
+        return
+    if image.isMapped():
+        streamKernel(image,name,args)
+        return
+    if getProgress() is not None:
+        streamKernel(image,name,args,PROGRESS_BYTES)
+        return
+    KERNELS[name](image.getData(),image.getWidth(),0,image.getHeight(),args)
+    image.markDirty()
+
+
+def streamKernel(image, name, args, size=None):
+    """
+    Runs the kernel for operation name on image, one band of rows at a time.
+
+    Each band (with its halo) is copied into memory, filtered and written back before
+    the next band is read, so at most about 2*size bytes are in memory at once.  The
+    rows of the halo above a band have already been written by then, so their old
+    values are kept from the band before.  The result is exactly the same as running
+    the kernel on the whole image.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+
+    Parameter name: The operation to run
+    Precondition: name is a key of KERNELS
+
+    Parameter args: The operation arguments
+    Precondition: args is a tuple of valid arguments for that operation
+
+    Parameter size: The number of bytes per band (None for BAND_BYTES)
+    Precondition: size is None or an int > 0
+    """
+    width  = image.getWidth()
+    height = image.getHeight()
+    data   = image.getData()
+    halo   = HALO[name](args) if name in HALO else 0
+    stride = 3*width
+    rows   = _band_rows(stride,name,args,size)
+
+    carry = b''
+    for start in range(0,height,rows):
+        stop   = min(height,start+rows)
+        top    = start-len(carry)//stride
+        bottom = min(height,stop+halo)
+        band = bytearray(carry)
+        band += data[start*stride:bottom*stride]
+        carry = bytes(band[(max(0,stop-halo)-top)*stride:(stop-top)*stride]) if halo else b''
+        KERNELS[name](band,width,top,height,args)
+        data[start*stride:stop*stride] = band[(start-top)*stride:(stop-top)*stride]
+        image.markDirty(start,0,stop-start,width)
+        _report(stop,height)
+
+
+def runTransform(image, name, size=None, frames=1):
+    """
+    Runs the geometric operation name on image, updating its width and height.
+
+    In-memory images use the kernels in a6kernels directly.  Memory-mapped images are
+    processed one band of rows at a time.  The reflections are done in place.  The
+    other operations write each band to its place in a new mapped file, which then
+    replaces the pixels of image.
+
+    If image is a stack of several frames (see the module a6batch), every operation
+    but reflectHori (which works one row at a time anyway) is run on each frame in turn.
+
+    Parameter image: The image to modify
+    Precondition: image is an Image object
+
+    Parameter name: The operation to run
+    Precondition: name is in a6lazy.GEOMETRIC_OPERATIONS
+
+    Parameter size: The number of bytes per band for mapped images (None for BAND_BYTES)
+    Precondition: size is None or an int > 0
+
+    Parameter frames: The number of frames stacked in image
+    Precondition: frames is an int > 0 that evenly divides the image height, and is 1
+    if image is memory-mapped
+    """
+    width  = image.getWidth()
+    height = image.getHeight()//frames
+    if frames > 1 and name != 'reflectHori':
+        kernel = getattr(a6kernels,name)
+        _run_frames(image,frames,lambda data, width, top, height, args:
+                    kernel(data,width,height),())
+    elif not image.isMapped():
+        getattr(a6kernels,name)(image.getData(),width,frames*height)
+        _report(1,1)
+    elif name == 'reflectHori':
+        _stream_reflect_hori(image,size)
+    elif name == 'reflectVert':
+        _stream_reflect_vert(image,size)
+    else:
+        _stream_transpose(image,name,size)
+    if name in TRANSPOSING:
+        image.setWidth(height)
+    image.markDirty()
+
+
+def getProgress():
+    """
+    Returns: The progress function of this thread, or None if there is none
+    """
+    return getattr(_PROGRESS,'function',None)
+
+
+def setProgress(function):
+    """
+    Sets the progress function of this thread.
+
+    While it is set, runKernel, streamKernel, runTransform and TileScheduler.run call
+    function(done,total) after each band they finish, where done/total is the fraction
+    of the operation that is finished (done is often a row number, and total the image
+    height).  If function raises an exception, the operation stops there, with the
+    image partly modified.
+
+    Parameter function: The progress function (None for none)
+    Precondition: function is None or a callable taking two ints
+    """
+    assert function is None or callable(function)
+    _PROGRESS.function = function
+
+
+class TileScheduler(object):
+    """
+    A class that runs filter kernels on bands of an image in parallel.
+
+    IMMUTABLE ATTRIBUTES (Fixed after initialization)
+        _workers:  The number of workers                       [int > 0]
+        _mode:     The kind of worker                          ['thread' or 'process']
+        _bands:    The number of bands per worker              [int > 0]
+        _executor: The worker pool (created when first needed) [Executor, or None]
+    """
+
+    # GETTERS
+    def getWorkers(self):
+        """
+        Returns: The number of workers
+        """
+        return self._workers
+
+
+    def getMode(self):
+        """
+        Returns: The kind of worker ('thread' or 'process')
+        """
+        return self._mode
+
+    # INITIALIZER
+    def __init__(self, workers=None, mode='thread', bands=2):
+        """
+        Initializer: Creates a tile scheduler.
+
+        Using a few bands per worker keeps all the workers busy even if some bands
+        take longer than others.
+
+        Parameter workers: The number of workers (None for one per core)
+        Precondition: workers is None or an int > 0
+
+        Parameter mode: The kind of worker
+        Precondition: mode is 'thread' or 'process'
+
+        Parameter bands: The number of bands per worker
+        Precondition: bands is an int > 0
+        """
+        assert workers is None or (isinstance(workers,int) and workers > 0)
+        assert mode in ('thread','process')
+        assert isinstance(bands,int) and bands > 0
+        self._workers  = workers or os.cpu_count() or 1
+        self._mode     = mode
+        self._bands    = bands
+        self._executor = None
+
+    # ADDITIONAL METHODS
+    def run(self, image, name, args):
+        """
+        Runs the kernel for operation name on image, one band at a time in parallel.
+
+        The result is exactly the same as runKernel(image,name,args).
+
+        Parameter image: The image to modify
+        Precondition: image is an Image object
+
+        Parameter name: The operation to run
+        Precondition: name is a key of KERNELS
+
+        Parameter args: The operation arguments
+        Precondition: args is a tuple of valid arguments for that operation
+        """
+        width  = image.getWidth()
+        height = image.getHeight()
+        data   = image.getData()
+        bands  = self.getBands(height,name,args)
+        if len(bands) == 1:
+            runKernel(image,name,args)
+            return
+
+        halo = HALO[name](args) if name in HALO else 0
+        stride = 3*width
+        jobs = []
+        for start, stop in bands:
+            top    = max(0,start-halo)
+            bottom = min(height,stop+halo)
+            band = data[top*stride:bottom*stride]
+            future = self._pool().submit(_run_band,name,band,width,top,height,args)
+            jobs.append((future,start,stop,top))
+        try:
+            for future, start, stop, top in jobs:
+                band = future.result()
+                offset = (start-top)*stride
+                data[start*stride:stop*stride] = band[offset:offset+(stop-start)*stride]
+                image.markDirty(start,0,stop-start,width)
+                _report(stop,height)
+        except BaseException:
+            for future, start, stop, top in jobs:
+                future.cancel()
+            raise
+
+
+    def getBands(self, height, name, args):
+        """
+        Returns: The list of (start, stop) row ranges used to split an image
+
+        Each band starts at a multiple of the alignment the operation needs.
+
+        Parameter height: The image height
+        Precondition: height is an int > 0
+
+        Parameter name: The operation to run
+        Precondition: name is a key of KERNELS
+
+        Parameter args: The operation arguments
+        Precondition: args is a tuple of valid arguments for that operation
+        """
+        align = ALIGN[name](args) if name in ALIGN else 1
+        count = self._workers*self._bands
+        rows  = -(-height//count)
+        rows  = max(align,-(-rows//align)*align)
+        return [(start,min(height,start+rows)) for start in range(0,height,rows)]
+
+
+    def measureSpeedup(self, image, name, args, repeat=3):
+        """
+        Returns: The triple (serial, parallel, speedup) for operation name on image
+
+        The values serial and parallel are the best times (in seconds) of repeat runs
+        of runKernel and run, and speedup is serial/parallel.  The runs are on copies
+        of image, so image is not modified.
+
+        Parameter image: The image to test on
+        Precondition: image is an Image object
+
+        Parameter name: The operation to run
+        Precondition: name is a key of KERNELS
+
+        Parameter args: The operation arguments
+        Precondition: args is a tuple of valid arguments for that operation
+
+        Parameter repeat: The number of times to run each version
+        Precondition: repeat is an int > 0
+        """
+        serial = parallel = None
+        for attempt in range(repeat):
+            target = image.copy()
+            start = time.perf_counter()
+            runKernel(target,name,args)
+            elapsed = time.perf_counter()-start
+            serial = elapsed if serial is None else min(serial,elapsed)
+
+            target = image.copy()
+            start = time.perf_counter()
+            self.run(target,name,args)
+            elapsed = time.perf_counter()-start
+            parallel = elapsed if parallel is None else min(parallel,elapsed)
+        return (serial,parallel,serial/parallel if parallel else float('inf'))
+
+
+    def shutdown(self):
+        """
+        Stops the workers.  The scheduler starts new ones if it is used again.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # HELPER METHODS
+    def _pool(self):
+        """
+        Returns: The worker pool, creating it if necessary
+        """
+        if self._executor is None:
+            if self._mode == 'thread':
+                self._executor = futures.ThreadPoolExecutor(self._workers)
+            else:
+                self._executor = futures.ProcessPoolExecutor(self._workers)
+        return self._executor
+
+
+# HELPER FUNCTIONS
+def _band_rows(stride, name=None, args=(), size=None):
+    """
+    Returns: The number of rows in each band when streaming an image
+
+    This is about size bytes worth of rows, but at least one row, and a multiple of
+    the alignment that operation name needs.
+
+    Parameter stride: The number of bytes per row
+    Precondition: stride is an int > 0
+
+    Parameter name: The operation to run (None for no alignment)
+    Precondition: name is None or a key of KERNELS
+
+    Parameter args: The operation arguments
+    Precondition: args is a tuple of valid arguments for that operation
+
+    Parameter size: The number of bytes per band (None for BAND_BYTES)
+    Precondition: size is None or an int > 0
+    """
+    align = ALIGN[name](args) if name in ALIGN else 1
+    rows  = max(1,(size or BAND_BYTES)//stride)
+    return max(align,rows//align*align)
+
+
+def _stream_reflect_hori(image, size):
+    """
+    Reflects a memory-mapped image around its horizontal middle, one band at a time.
+
+    Parameter image: The image to modify
+    Precondition: image is a memory-mapped Image object
+
+    Parameter size: The number of bytes per band (None for BAND_BYTES)
+    Precondition: size is None or an int > 0
+    """
+    width  = image.getWidth()
+    height = image.getHeight()
+    rows   = _band_rows(3*width,size=size)
+    for start in range(0,height,rows):
+        stop = min(height,start+rows)
+        band = bytearray(image.getRegion(start,0,stop-start,width))
+        a6kernels.reflectHori(band,width,stop-start)
+        image.setRegion(start,0,stop-start,width,band)
+        _report(stop,height)
+
+
+def _stream_reflect_vert(image, size):
+    """
+    Reflects a memory-mapped image around its vertical middle, one pair of bands at a time.
+
+    Each band in the top half is swapped with the matching band in the bottom half,
+    with the rows of both reversed.
+
+    Parameter image: The image to modify
+    Precondition: image is a memory-mapped Image object
+
+    Parameter size: The number of bytes per band (None for BAND_BYTES)
+    Precondition: size is None or an int > 0
+    """
+    width  = image.getWidth()
+    height = image.getHeight()
+    rows   = _band_rows(3*width,size=max(1,(size or BAND_BYTES)//2))
+    for start in range(0,height//2,rows):
+        stop  = min(height//2,start+rows)
+        upper = bytearray(image.getRegion(start,0,stop-start,width))
+        lower = bytearray(image.getRegion(height-stop,0,stop-start,width))
+        a6kernels.reflectVert(upper,width,stop-start)
+        a6kernels.reflectVert(lower,width,stop-start)
+        image.setRegion(start,0,stop-start,width,lower)
+        image.setRegion(height-stop,0,stop-start,width,upper)
+        _report(stop,height//2)
+
+
+def _stream_transpose(image, name, size):
+    """
+    Runs a transposing operation on a memory-mapped image, one band at a time.
+
+    Each band of rows becomes a band of columns of the result.  The band is transposed
+    (or rotated) in memory, and each of its rows is written into the matching row of a
+    new mapped file.  The new file then replaces the pixels of image.
+
+    Parameter image: The image to modify
+    Precondition: image is a memory-mapped Image object
+
+    Parameter name: The operation to run
+    Precondition: name is in TRANSPOSING
+
+    Parameter size: The number of bytes per band (None for BAND_BYTES)
+    Precondition: size is None or an int > 0
+    """
+    width  = image.getWidth()
+    height = image.getHeight()
+    source = image.getPixels()
+    target = source.sibling()
+    data   = image.getData()
+    output = target.getData()
+    stride = 3*width
+    rows   = _band_rows(stride,size=max(1,(size or BAND_BYTES)//2))
+    for start in range(0,height,rows):
+        stop = min(height,start+rows)
+        count = stop-start
+        band = bytearray(data[start*stride:stop*stride])
+        getattr(a6kernels,name)(band,width,count)
+        column = height-stop if name == 'rotateRight' else start
+        for row in range(width):
+            pos = 3*(row*height+column)
+            output[pos:pos+3*count] = band[3*row*count:3*(row+1)*count]
+        _report(stop,height)
+    source.adopt(target)
+
+
+def _run_frames(image, frames, kernel, args):
+    """
+    Runs a band kernel on each of the frames stacked in image, in turn.
+
+    Each frame is copied out, given to the kernel as a whole image, and copied back.
+    The kernel may change the size of the frames, as long as they all stay the same
+    length; it is up to the caller to update the width.
+
+    Parameter image: The image to modify
+    Precondition: image is an in-memory Image object
+
+    Parameter frames: The number of frames stacked in image
+    Precondition: frames is an int > 0 that evenly divides the image height
+
+    Parameter kernel: The kernel, called as kernel(data,width,top,height,args)
+    Precondition: kernel is a band kernel (see KERNELS)
+
+    Parameter args: The operation arguments
+    Precondition: args is a tuple of valid arguments for the kernel
+    """
+    width = image.getWidth()
+    rows  = image.getHeight()//frames
+    data  = image.getData()
+    size  = 3*width*rows
+    for k in range(frames):
+        band = data[k*size:(k+1)*size]
+        kernel(band,width,0,rows,args)
+        data[k*size:(k+1)*size] = band
+        image.markDirty(k*rows,0,rows,width)
+        _report(k+1,frames)
+
+
+def _report(done, total):
+    """
+    Calls the progress function of this thread (if any) with done and total.
+
+    Parameter done: The amount of the operation that is finished
+    Precondition: done is an int >= 0
+
+    Parameter total: The amount of the whole operation
+    Precondition: total is an int > 0
+    """
+    function = getattr(_PROGRESS,'function',None)
+    if function is not None:
+        function(done,total)
+
+
+def _run_band(name, band, width, top, height, args):
+    """
+    Returns: The band after running the kernel for operation name on it
+
+    This is the function run by each worker.
+
+    Parameter name: The operation to run
+    Precondition: name is a key of KERNELS
+
+    Parameter band: The raw bytes of the band
+    Precondition: band is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0
+
+    Parameter top: The image row that the band starts at
+    Precondition: top is an int >= 0
+
+    Parameter height: The height of the whole image
+    Precondition: height is an int > 0
+
+    Parameter args: The operation arguments
+    Precondition: args is a tuple of valid arguments for that operation
+    """
+    KERNELS[name](band,width,top,height,args)
+    return band
+
+
+def _as_image(data, width):
+    """
+    Returns: An Image object that uses data as its pixels (without copying it)
+
+    Parameter data: The raw pixel bytes
+    Precondition: data is a bytearray of interleaved RGB bytes
+
+    Parameter width: The image width
+    Precondition: width is an int > 0 that evenly divides len(data)//3
+    """
+    return a6image.Image(a6buffer.PixelBuffer(data),width)
@@ -0,0 +1,9 @@
+"""
+Shared setup for the tests of our imager application.
+
+The modules live in the folder above this one, so it is put on the import path.
+"""
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+"""
+Tests for the result cache (the module a6cache) as used by the Editor.
+"""
+import a6bench
+import a6cache
+import a6editor
+
+
+def test_no_reuse_after_direct_edit():
+    """
+    Tests that a cached result is not reused after the image is edited directly.
+
+    The second invert caches the original image, as the result of inverting twice.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(32,24))
+    editor.setCache(a6cache.ResultCache())
+    editor.increment()
+    editor.invert()
+    editor.increment()
+    editor.invert()
+    editor.undo()
+    editor.getCurrent().setPixel(0,0,(250,0,0))
+    editor.increment()
+    editor.invert()
+    assert editor.getCurrent().getPixel(0,0) == (5,255,255)
+
+
+def test_no_reuse_after_buffer_write():
+    """
+    Tests that a cached result is not reused after a write through the pixel buffer.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(32,24))
+    editor.setCache(a6cache.ResultCache())
+    editor.increment()
+    editor.invert()
+    editor.increment()
+    editor.invert()
+    editor.undo()
+    editor.getCurrent().getPixels()[0] = (250,0,0)
+    editor.getCurrent().clearDirty()
+    editor.increment()
+    editor.invert()
+    assert editor.getCurrent().getPixel(0,0) == (5,255,255)
@@ -0,0 +1,173 @@
+"""
+Tests for the edit history (the module a6history) as used by the Editor.
+"""
+import pytest
+
+import a6bench
+import a6editor
+import a6history
+
+
+def test_undo_restores_direct_write():
+    """
+    Tests that undo restores a pixel set straight through the pixel buffer.
+
+    The write is not marked dirty, so the history must not trust the dirty pixels.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(32,24))
+    editor.increment()
+    before = editor.getCurrent().getPixel(0,5)
+    editor.getCurrent().getPixels()[5] = (200,200,200)
+    editor.increment()
+    assert editor.undo()
+    assert editor.undo()
+    assert editor.getCurrent().getPixel(0,5) == before
+
+
+def test_preview_redo_keeps_redo_stack():
+    """
+    Tests that every edit undone in preview mode can be redone.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(64,48))
+    editor.setPreview((16,12))
+    for name in ('invert','reflectHori','transpose'):
+        editor.increment()
+        getattr(editor,name)()
+    expected = bytes(editor.getCurrent().getData())
+    assert [editor.undo() for k in range(3)] == [True]*3
+    assert [editor.redo() for k in range(3)] == [True]*3
+    editor.setPreview(None)
+    assert bytes(editor.getCurrent().getData()) == expected
+
+
+def test_failed_operation_is_not_replayed():
+    """
+    Tests that an operation that raised is not replayed by redo.
+
+    jail raises a ZeroDivisionError on images narrower than 58 pixels, after it has
+    drawn some of the bars.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(40,30))
+    editor.increment()
+    editor.invert()
+    editor.increment()
+    with pytest.raises(ZeroDivisionError):
+        editor.jail()
+    jailed = bytes(editor.getCurrent().getData())
+    editor.increment()
+    editor.reflectHori()
+    expected = bytes(editor.getCurrent().getData())
+    assert [editor.undo() for k in range(3)] == [True]*3
+    assert [editor.redo() for k in range(2)] == [True]*2
+    assert bytes(editor.getCurrent().getData()) == jailed
+    assert editor.getDepth() == 3
+    assert editor.getRedoDepth() == 1
+    assert editor.redo()
+    assert bytes(editor.getCurrent().getData()) == expected
+
+
+def test_failed_operation_keeps_redo_stack():
+    """
+    Tests that an operation that raised before changing any pixels is taken out of
+    the log, and does not discard the redo stack.
+
+    encode raises a ValueError on color values 26..99, before it changes any pixels.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(40,30))
+    editor.increment()
+    editor.invert()
+    editor.undo()
+    with pytest.raises(ValueError):
+        editor.encode('hi')
+    assert editor.getLog() == [()]
+    assert editor.getRedoDepth() == 1
+
+
+def test_redo_keeps_stack_when_replay_raises():
+    """
+    Tests that a redo whose replay raises leaves the history as it found it.
+
+    A failed call is never logged, so the log to replay is planted by hand.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(40,30))
+    for name in ('invert','reflectHori'):
+        editor.increment()
+        getattr(editor,name)()
+    editor.undo()
+    editor.undo()
+    editor._redo[-1] = ((('encode',('hi',)),),None)
+    with pytest.raises(ValueError):
+        editor.redo()
+    assert editor.getDepth() == 1
+    assert editor.getRedoDepth() == 2
+
+
+def test_clear_then_redo_skips_original():
+    """
+    Tests that redo after clear starts with the first edit, not a copy of the original.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(32,24))
+    states = []
+    for name in ('invert','reflectHori'):
+        editor.increment()
+        getattr(editor,name)()
+        states.append(bytes(editor.getCurrent().getData()))
+    editor.clear()
+    assert editor.getRedoDepth() == 2
+    for depth, state in enumerate(states,2):
+        assert editor.redo()
+        assert editor.getDepth() == depth
+        assert bytes(editor.getCurrent().getData()) == state
+    assert not editor.redo()
+
+
+def test_clear_keeps_edited_oldest_state():
+    """
+    Tests that clear keeps the oldest state for redo if it differs from the original.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(32,24))
+    editor.invert()
+    editor.increment()
+    editor.reflectHori()
+    expected = bytes(editor.getCurrent().getData())
+    editor.clear()
+    assert editor.getRedoDepth() == 2
+    assert editor.redo()
+    assert editor.redo()
+    assert bytes(editor.getCurrent().getData()) == expected
+
+
+def test_delta_stores_only_dirty_pixels():
+    """
+    Tests that a delta with known dirty pixels stores just the pixels that changed.
+
+    The vertical bars of jail touch every row, so whole chunks of rows would store
+    the whole image.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(400,300))
+    editor.jail()
+    later = editor.getCurrent()
+    earlier = editor.getOriginal()
+    delta = a6history.ImageDelta(earlier,later,(),later.getDirtyRanges())
+    assert delta.getKind() == 'runs'
+    assert delta.getRawSize() < 0.15*3*later.getLength()
+    restored = delta.apply(later)
+    assert bytes(restored.getData()) == bytes(earlier.getData())
+
+
+def test_undo_after_jail_uses_small_delta():
+    """
+    Tests that the history stores a small delta for jail, and undo still restores it.
+
+    The jail delta is the older one, so waitForCompression has compressed it.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(400,300))
+    editor.increment()
+    before = bytes(editor.getCurrent().getData())
+    editor.jail()
+    editor.increment()
+    editor.increment()
+    editor.waitForCompression()
+    assert editor.getUncompressedBytes() < 0.15*3*400*300
+    assert [editor.undo() for k in range(3)] == [True]*3
+    assert bytes(editor.getCurrent().getData()) == before
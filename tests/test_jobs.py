@@ -0,0 +1,52 @@
+"""
+Tests for the background jobs (the module a6jobs).
+"""
+import threading
+
+import pytest
+
+import a6bench
+import a6editor
+import a6jobs
+
+
+class CancellingText(str):
+    """
+    A payload string that cancels its job when encodeBytes converts it to bytes.
+
+    encodeBytes never reports its progress, so this is how the test cancels it while 
+    it runs.  The attribute job must be set (and then the event ready) once the job
+    is submitted.
+    """
+
+    def encode(self, *args):
+        """
+        Returns: The UTF-8 bytes of this string, after cancelling the job
+
+        Parameter args: The arguments of str.encode
+        Precondition: args are valid arguments for str.encode
+        """
+        self.ready.wait()
+        self.job.cancel()
+        return str.encode(self,*args)
+
+
+def test_cancel_operation_without_progress():
+    """
+    Tests that a job cancelled while running an operation that does not report its
+    progress is rolled back.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(32,24))
+    expected = bytes(editor.getCurrent().getData())
+    runner = a6jobs.JobRunner(editor)
+    try:
+        payload = CancellingText('cancelled')
+        payload.ready = threading.Event()
+        payload.job = runner.submit('encodeBytes',payload)
+        payload.ready.set()
+        with pytest.raises(a6jobs.JobCancelled):
+            payload.job.result()
+    finally:
+        runner.shutdown()
+    assert editor.getDepth() == 1
+    assert bytes(editor.getCurrent().getData()) == expected
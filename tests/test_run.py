@@ -0,0 +1,58 @@
+"""
+Tests for the command-line batch runner (the module a6run).
+"""
+import os
+
+import pytest
+
+import a6bench
+import a6io
+import a6run
+
+
+def _save(path, seed):
+    """
+    Saves a small synthetic image at path, creating its directory.
+
+    Parameter path: The file to write
+    Precondition: path is a str naming a .ppm file
+
+    Parameter seed: The random seed for the pixels
+    Precondition: seed is an int
+    """
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    a6io.saveImage(a6bench.makeImage(8,6,seed),path)
+
+
+def test_glob_across_directories_keeps_every_result(tmp_path):
+    """
+    Tests that images with the same name in different directories do not collide.
+    """
+    for folder, seed in (('a',1),('b',2)):
+        _save(str(tmp_path/'in'/folder/'x.ppm'),seed)
+    sources = a6run.findImages(str(tmp_path/'in'/'*'/'*'))
+    outdir = str(tmp_path/'out')
+    pixels, seconds = a6run.runBatch(sources,outdir,[('invert',())],workers=1)
+    assert pixels == 2*8*6
+    for folder in ('a','b'):
+        source = a6io.loadImage(str(tmp_path/'in'/folder/'x.ppm'))
+        result = a6io.loadImage(os.path.join(outdir,folder,'x.ppm'))
+        assert bytes(result.getData()) == bytes(255-value for value in source.getData())
+
+
+def test_one_directory_keeps_file_names(tmp_path):
+    """
+    Tests that images from a single directory are saved straight into outdir.
+    """
+    sources = [str(tmp_path/'in'/'x.ppm'), str(tmp_path/'in'/'y.ppm')]
+    targets = a6run.targetPaths(sources,'out')
+    assert targets == [os.path.join('out','x.ppm'), os.path.join('out','y.ppm')]
+
+
+def test_duplicate_sources_are_refused(tmp_path):
+    """
+    Tests that two sources that would be saved at the same path are refused.
+    """
+    source = str(tmp_path/'in'/'x.ppm')
+    with pytest.raises(ValueError):
+        a6run.targetPaths([source,os.path.join(str(tmp_path),'in','.','x.ppm')],'out')
@@ -0,0 +1,36 @@
+"""
+Tests for the binary steganography (the module a6stego).
+"""
+import a6batch
+import a6bench
+import a6editor
+import a6stego
+
+
+def test_small_image_refuses_payload():
+    """
+    Tests that an image too small for the header refuses even an empty payload.
+    """
+    editor = a6editor.Editor(a6bench.makeImage(5,4))
+    assert not editor.encodeBytes(b'')
+    assert editor.getCurrent().getLength() == 20
+
+
+def test_small_frames_refuse_payload():
+    """
+    Tests that the frames of a batch too small for the header refuse their payloads.
+    """
+    batch = a6batch.stack([a6bench.makeImage(5,4,seed) for seed in range(3)])
+    editor = a6editor.Editor(batch)
+    assert editor.encodeBytes([b'',b'',b'']) == [False]*3
+    assert editor.getCurrent().getLength() == 60
+
+
+def test_stream_skips_small_image():
+    """
+    Tests that encodeStream skips an image too small for the header.
+    """
+    datas = [bytearray(60), bytearray(3000)]
+    assert a6stego.encodeStream(datas,b'hidden') == 1
+    assert datas[0] == bytearray(60)
+    assert a6stego.decodeBytes(datas[1]) == b'hidden'